@@ -0,0 +1,401 @@
+"""
+Análisis con presupuesto de latencia y calidad adaptativa
+
+La automatización que nos llama da a cada análisis un presupuesto (p. ej.
+50 ms por timeframe). Con deadline_ms, analyze_image / analyze_frame eligen
+el nivel de calidad más alto cuyo coste previsto cabe en el presupuesto:
+
+    full         todo, resolución original
+    no_reversal  sin detect_reversal_patterns
+    no_edges     además sin Canny (edge_strength)
+    coarse       además perfil multi-horizonte con menos columnas
+    half         además imagen a la mitad (JPEG: decodificada ya reducida)
+    quarter      imagen a un cuarto y perfil de 20 columnas
+
+La tendencia se calcula en todos los niveles. El coste previsto sale de un
+modelo aprendido de las ejecuciones anteriores: milisegundos por megapíxel
+de cada detector y del decodificado (medias exponenciales), más una
+sobrecarga fija y el factor de solape de los detectores en paralelo. El
+resultado indica en "quality" el nivel usado, lo previsto y lo real.
+
+    python adaptive_quality.py m1.png m5.png m15.png --save costes.json
+    ANALYZER_COST_MODEL=costes.json python upload_capture.py
+"""
+import json
+import os
+import struct
+import threading
+import time
+
+import cv2
+
+QUALITY_TIERS = (
+    {"name": "full", "scale": 1.0, "resolutions": (20, 40, 80), "skip": ()},
+    {"name": "no_reversal", "scale": 1.0, "resolutions": (20, 40, 80), "skip": ("reversal",)},
+    {"name": "no_edges", "scale": 1.0, "resolutions": (20, 40, 80),
+     "skip": ("reversal", "edges", "edge_strength")},
+    {"name": "coarse", "scale": 1.0, "resolutions": (20, 40),
+     "skip": ("reversal", "edges", "edge_strength")},
+    {"name": "half", "scale": 0.5, "resolutions": (20, 40),
+     "skip": ("reversal", "edges", "edge_strength")},
+    {"name": "quarter", "scale": 0.25, "resolutions": (20,),
+     "skip": ("reversal", "edges", "edge_strength")},
+)
+# Valores neutros de las salidas de los detectores que se saltan
+SKIPPED_OUTPUTS = {
+    "reversal_signals": {"detected": False, "strength": 0, "trend1": 0, "trend2": 0},
+    "edge_strength": 0.0,
+}
+# Costes iniciales (ms por megapíxel) hasta que haya ejecuciones reales
+DEFAULT_COSTS = {
+    "gray": 0.8, "trend": 2.5, "volatility": 6.5, "momentum": 1.2, "candles": 0.6,
+    "reversal": 0.4, "column_profile": 2.0, "trend_profile": 1.5, "edges": 5.0,
+    "edge_strength": 0.6, "resize": 0.6,
+    "decode:png:1": 7.0, "decode:jpeg:1": 6.0, "decode:jpeg:2": 4.5, "decode:jpeg:4": 4.0,
+    "decode:other:1": 7.0,
+}
+# Coste supuesto de un detector externo sin historial (ms por megapíxel)
+UNKNOWN_DETECTOR_COST = 2.0
+# Peso de cada ejecución nueva en las medias del modelo
+COST_ALPHA = 0.2
+# Fracción del presupuesto que se planifica (margen para la varianza)
+BUDGET_MARGIN = 0.9
+# Modelo de costes guardado con --save (ver __main__)
+COST_MODEL_PATH = os.environ.get("ANALYZER_COST_MODEL")
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}
+
+
+class CostModel:
+    """Coste por megapíxel de cada paso, aprendido con medias exponenciales"""
+
+    def __init__(self, alpha=COST_ALPHA, path=None):
+        self.alpha = alpha
+        self.rates = dict(DEFAULT_COSTS)
+        self.overhead_ms = 1.0
+        # Tiempo real de los detectores / suma de sus tiempos (<1 si se solapan)
+        self.concurrency = 1.0
+        self.runs = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _blend(self, current, observed):
+        return current + self.alpha * (observed - current)
+
+    def predict(self, tier, pixels, detectors, decode_key=None):
+        """Milisegundos previstos del nivel para una imagen de pixels píxeles"""
+        mp = pixels / 1e6
+        analyzed = mp * tier["scale"] ** 2
+        with self._lock:
+            detector_ms = 0.0
+            for name in detectors:
+                if name in tier["skip"]:
+                    continue
+                rate = self.rates.get(name, UNKNOWN_DETECTOR_COST)
+                if name == "trend_profile":
+                    rate *= len(tier["resolutions"]) / 3
+                detector_ms += rate * analyzed
+            total = self.overhead_ms + self.concurrency * detector_ms
+            if decode_key is not None:
+                total += self.rates.get(decode_key, self.rates["decode:other:1"]) * mp
+            if tier["scale"] < 1 and not (decode_key or "").endswith((":2", ":4")):
+                total += self.rates["resize"] * mp
+        return total
+
+    def observe(self, timings, analyzed_pixels, resolutions, wall_ms, steps=None, overhead_ms=None):
+        """
+        Incorpora una ejecución
+        timings: segundos por detector; wall_ms: tiempo real del grafo
+        steps: {clave: (ms, megapíxeles)} de pasos fuera del grafo (decodificar, reducir)
+        """
+        mp = analyzed_pixels / 1e6
+        if mp <= 0:
+            return
+        with self._lock:
+            total_ms = 0.0
+            for name, seconds in timings.items():
+                ms = seconds * 1000
+                total_ms += ms
+                rate = ms / mp
+                if name == "trend_profile":
+                    rate *= 3 / len(resolutions)
+                self.rates[name] = self._blend(self.rates.get(name, rate), rate)
+            for key, (ms, step_mp) in (steps or {}).items():
+                if step_mp > 0:
+                    self.rates[key] = self._blend(self.rates.get(key, ms / step_mp), ms / step_mp)
+            if total_ms > 0:
+                self.concurrency = self._blend(self.concurrency, wall_ms / total_ms)
+            if overhead_ms is not None:
+                self.overhead_ms = self._blend(self.overhead_ms, max(0.0, overhead_ms))
+            self.runs += 1
+
+    def report(self):
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "overhead_ms": round(self.overhead_ms, 3),
+                "concurrency": round(self.concurrency, 3),
+                "ms_per_megapixel": {key: round(rate, 3) for key, rate in sorted(self.rates.items())},
+            }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def load(self, path):
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        with self._lock:
+            self.rates.update(saved.get("ms_per_megapixel", {}))
+            self.overhead_ms = saved.get("overhead_ms", self.overhead_ms)
+            self.concurrency = saved.get("concurrency", self.concurrency)
+            self.runs = saved.get("runs", 0)
+
+
+_cost_model = None
+_cost_model_lock = threading.Lock()
+
+
+def cost_model():
+    """Modelo de costes del proceso (cargado de ANALYZER_COST_MODEL si existe)"""
+    global _cost_model
+    with _cost_model_lock:
+        if _cost_model is None:
+            _cost_model = CostModel(path=COST_MODEL_PATH)
+    return _cost_model
+
+
+def choose_tier(model, budget_ms, pixels, detectors_for=None, decode_key_for=None):
+    """
+    Primer nivel (de mejor a peor) cuyo coste previsto cabe en el presupuesto
+    Si ninguno cabe, el más barato. Devuelve (nivel, ms previstos)
+    detectors_for(nivel): detectores que ejecuta (por defecto tier_detectors)
+    """
+    detectors_for = detectors_for or tier_detectors
+    plan = BUDGET_MARGIN * budget_ms
+    predicted = None
+    for tier in QUALITY_TIERS:
+        decode_key = decode_key_for(tier) if decode_key_for else None
+        predicted = model.predict(tier, pixels, detectors_for(tier), decode_key)
+        if predicted <= plan:
+            return tier, predicted
+    return QUALITY_TIERS[-1], predicted
+
+
+def image_size(path):
+    """
+    (ancho, alto) leyendo solo la cabecera (PNG, BMP, JPEG) o None
+    Sirve para elegir el nivel, y con él la resolución de decodificado,
+    antes de decodificar. Una cabecera truncada también da None
+    """
+    try:
+        return read_header_size(path)
+    except struct.error:
+        return None
+
+
+def read_header_size(path):
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:2] == b"BM" and len(head) >= 26:
+            width, height = struct.unpack("<ii", head[18:26])
+            return width, abs(height)
+        if head[:2] != b"\xff\xd8":
+            return None
+        # JPEG: recorrer los segmentos hasta el SOF
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                f.read(3)
+                height, width = struct.unpack(">HH", f.read(4))
+                return width, height
+            length = struct.unpack(">H", f.read(2))[0]
+            if length < 2:
+                return None
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def decode_key(path, tier):
+    """Clave de coste del decodificado del nivel (JPEG decodifica ya reducido)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in JPEG_EXTENSIONS:
+        return f"decode:jpeg:{int(round(1 / tier['scale']))}"
+    return "decode:png:1" if ext == ".png" else "decode:other:1"
+
+
+def bytes_decode_key(data):
+    """Clave de coste del decodificado a escala completa de una imagen en memoria"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "decode:png:1"
+    return "decode:jpeg:1" if data[:2] == b"\xff\xd8" else "decode:other:1"
+
+
+def decode_for_tier(path, tier):
+    """Decodifica la imagen a la escala del nivel; devuelve (imagen, reducida_ya)"""
+    factor = int(round(1 / tier["scale"]))
+    if os.path.splitext(path)[1].lower() in JPEG_EXTENSIONS and factor in REDUCED_FLAGS:
+        return cv2.imread(path, REDUCED_FLAGS[factor]), True
+    return cv2.imread(path), False
+
+
+def tier_targets(tier):
+    """
+    Salidas que el nivel pide al grafo, detectores externos y salidas que se
+    salta. trend_profile no se pide: se calcula aparte con las resoluciones
+    del nivel a partir de column_profile
+    """
+    import image_analyzer as ia
+
+    skipped = set(tier["skip"])
+    external = [d for d in ia.REGISTRY if d.name not in ia.BUILTIN_DETECTORS]
+    skipped_outputs = {o for d in ia.REGISTRY if d.name in skipped for o in d.outputs}
+    targets = [o for o in ia.RESULT_INPUTS if o not in skipped_outputs and o != "trend_profile"]
+    targets += ["column_profile"] + [o for d in external for o in d.outputs]
+    return targets, external, skipped_outputs
+
+
+def tier_detectors(tier):
+    """Detectores que ejecuta el nivel: el plan de sus salidas más trend_profile"""
+    import image_analyzer as ia
+
+    targets = tier_targets(tier)[0]
+    return [d.name for d in ia.REGISTRY.plan({"img"}, targets)] + ["trend_profile"]
+
+
+def analyze_frame_within(img, deadline_ms, started=None, tier=None, predicted=None,
+                         steps=None, reduced=False, waited_ms=0.0):
+    """
+    analyze_frame dentro de un presupuesto de deadline_ms desde started
+    tier/predicted: nivel ya elegido (analyze_image_within lo elige antes de
+    decodificar); steps: pasos ya medidos {clave: (ms, megapíxeles)};
+    reduced: la imagen ya viene a la escala del nivel
+    waited_ms: tiempo en cola desde started; cuenta en el presupuesto pero
+    no en el modelo de coste
+    """
+    import image_analyzer as ia
+
+    started = time.perf_counter() if started is None else started
+    model = cost_model()
+    h, w = img.shape[:2]
+    if tier is None:
+        remaining = deadline_ms - (time.perf_counter() - started) * 1000
+        tier, predicted = choose_tier(model, remaining, h * w)
+    steps = dict(steps or {})
+
+    if tier["scale"] < 1 and not reduced:
+        resize_started = time.perf_counter()
+        img = cv2.resize(img, None, fx=tier["scale"], fy=tier["scale"], interpolation=cv2.INTER_AREA)
+        steps["resize"] = ((time.perf_counter() - resize_started) * 1000, h * w / 1e6)
+    ah, aw = img.shape[:2]
+
+    skipped = set(tier["skip"])
+    targets, external, skipped_outputs = tier_targets(tier)
+
+    timings = {}
+    executor = ia.get_executor() if ia.PARALLEL_DETECTORS else None
+    graph_started = time.perf_counter()
+    values = ia.REGISTRY.run({"img": img}, targets=targets, executor=executor, timings=timings)
+    graph_ms = (time.perf_counter() - graph_started) * 1000
+
+    # Granularidad de columnas del nivel para el perfil multi-horizonte
+    profile_started = time.perf_counter()
+    profiles = ia.profiles_from_cumsum(values["column_profile"], tier["resolutions"])
+    values["trend_profile"] = ia.trend_profile_from_profiles(profiles, ah, aw, tier["resolutions"])
+    timings["trend_profile"] = time.perf_counter() - profile_started
+
+    for output, neutral in SKIPPED_OUTPUTS.items():
+        if output in skipped_outputs:
+            values[output] = neutral
+
+    plugins = {}
+    strength_adjustment = 0.0
+    for detector in external:
+        for output in detector.outputs:
+            plugins[output] = values[output]
+        if detector.strength is not None:
+            strength_adjustment += detector.strength(values[detector.outputs[0]])
+
+    result = ia.build_analysis_result(
+        values["trend_data"], values["volatility_data"], values["momentum_data"],
+        values["candle_analysis"], values["reversal_signals"], values["trend_profile"],
+        values["edge_strength"], ah, aw,
+        strength_adjustment=strength_adjustment, plugins=plugins
+    )
+    if "edge_strength" in skipped_outputs:
+        result["edge_strength"] = None
+        result["norm_pct"] = None
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    steps_ms = sum(ms for ms, _ in steps.values())
+    model.observe(timings, ah * aw, tier["resolutions"], graph_ms + timings["trend_profile"] * 1000,
+                  steps=steps, overhead_ms=elapsed_ms - waited_ms - steps_ms - graph_ms - timings["trend_profile"] * 1000)
+
+    result["quality"] = {
+        "tier": tier["name"],
+        "budget_ms": deadline_ms,
+        "predicted_ms": round(predicted, 2),
+        "elapsed_ms": round(elapsed_ms, 2),
+        "within_budget": elapsed_ms <= deadline_ms,
+        "scale": tier["scale"],
+        "resolutions": list(tier["resolutions"]),
+        "skipped": sorted(skipped),
+    }
+    return result
+
+
+def analyze_image_within(image_path, deadline_ms):
+    """
+    analyze_image con presupuesto: el nivel se elige con el tamaño de la
+    cabecera, antes de decodificar, para poder decodificar ya reducido
+    """
+    started = time.perf_counter()
+    size = image_size(image_path)
+    tier = predicted = None
+    if size is not None:
+        tier, predicted = choose_tier(
+            cost_model(), deadline_ms, size[0] * size[1],
+            decode_key_for=lambda t: decode_key(image_path, t)
+        )
+
+    decode_started = time.perf_counter()
+    if tier is not None:
+        img, reduced = decode_for_tier(image_path, tier)
+    else:
+        img, reduced = cv2.imread(image_path), False
+    if img is None:
+        raise ValueError(f"Unable to read image: {image_path}")
+    decode_ms = (time.perf_counter() - decode_started) * 1000
+
+    full_mp = (size[0] * size[1] if size else img.shape[0] * img.shape[1]) / 1e6
+    key = decode_key(image_path, tier) if tier is not None else decode_key(image_path, QUALITY_TIERS[0])
+    return analyze_frame_within(img, deadline_ms, started, tier, predicted,
+                                {key: (decode_ms, full_mp)}, reduced)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Modelo de costes del análisis con presupuesto")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--deadline", type=float, default=1e6,
+                        help="Presupuesto por análisis en ms (por defecto sin límite: aprende el nivel completo)")
+    parser.add_argument("--runs", type=int, default=5, help="Análisis por imagen")
+    parser.add_argument("--save", help="Guardar el modelo aprendido (para ANALYZER_COST_MODEL)")
+    args = parser.parse_args()
+
+    for path in args.images:
+        for run in range(args.runs):
+            quality = analyze_image_within(path, args.deadline)["quality"]
+        print(f"{os.path.basename(path)}: {quality['tier']} · previsto {quality['predicted_ms']:.1f} ms · "
+              f"real {quality['elapsed_ms']:.1f} ms (presupuesto {quality['budget_ms']:g} ms)")
+
+    print(json.dumps(cost_model().report(), indent=2))
+    if args.save:
+        cost_model().save(args.save)
+        print(f"💾 Modelo guardado en: {args.save}")
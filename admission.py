@@ -0,0 +1,123 @@
+"""
+Control de admisión para el servidor de análisis
+
+Rechaza rápido en lugar de encolar sin límite:
+- cuerpo demasiado grande -> 413 antes de leerlo
+- cliente por encima de su cubeta de tokens -> 429 con Retry-After
+- demasiados análisis en curso en el proceso -> 429 con Retry-After
+
+Así un cliente que satura con subidas grandes recibe rechazos baratos y el
+resto de análisis mantiene su latencia. Los límites son por proceso: con
+gunicorn cada worker aplica los suyos.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Tamaño máximo del cuerpo de una petición (MB)
+MAX_BODY_MB = float(os.environ.get("ANALYZER_MAX_BODY_MB", 32))
+# Peticiones de análisis simultáneas por proceso
+MAX_IN_FLIGHT = int(os.environ.get("ANALYZER_MAX_IN_FLIGHT", 2 * (os.cpu_count() or 1)))
+# Cubeta de tokens por cliente: peticiones por segundo sostenidas y ráfaga
+CLIENT_RATE = float(os.environ.get("ANALYZER_CLIENT_RATE", 2))
+CLIENT_BURST = float(os.environ.get("ANALYZER_CLIENT_BURST", 10))
+# Clientes recordados (los menos recientes se olvidan)
+MAX_CLIENTS = 10000
+
+
+class TokenBucket:
+    """rate tokens por segundo hasta un máximo de burst"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now, cost=1.0):
+        """0 si hay tokens; si no, segundos hasta que los haya"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class AdmissionController:
+    """Límite global de análisis en curso + cubetas por cliente + métricas"""
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, rate=CLIENT_RATE, burst=CLIENT_BURST,
+                 max_body_bytes=int(MAX_BODY_MB * 1024 * 1024), max_clients=MAX_CLIENTS):
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst
+        self.max_body_bytes = max_body_bytes
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {"admitted": 0, "too_large": 0, "rate_limited": 0, "overloaded": 0,
+                      "peak_in_flight": 0}
+
+    def record(self, reason):
+        """Cuenta un rechazo detectado fuera del controlador"""
+        with self._lock:
+            self.stats[reason] += 1
+
+    def check_size(self, content_length):
+        """False si el cuerpo declarado supera el máximo"""
+        if content_length is not None and content_length > self.max_body_bytes:
+            self.record("too_large")
+            return False
+        return True
+
+    def rate_limit(self, client):
+        """0 si el cliente puede pasar; si no, segundos de espera sugeridos"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            wait = bucket.take(now)
+            if wait:
+                self.stats["rate_limited"] += 1
+            return wait
+
+    def acquire(self):
+        """Reserva un hueco de análisis sin esperar; False si no hay"""
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.stats["overloaded"] += 1
+                return False
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(
+                in_flight=self.in_flight,
+                max_in_flight=self.max_in_flight,
+                clients=len(self._buckets),
+                client_rate=self.rate,
+                client_burst=self.burst,
+                max_body_mb=round(self.max_body_bytes / (1024 * 1024), 2),
+            )
+        stats["rejected"] = stats["too_large"] + stats["rate_limited"] + stats["overloaded"]
+        return stats
@@ -0,0 +1,481 @@
+"""
+Calibración de umbrales de image_analyzer
+
+1. extract: analiza una sola vez un conjunto de capturas etiquetadas y guarda
+   los valores previos a los umbrales (ángulo, R², varianzas, desplazamientos)
+   en una matriz de características persistida (.npz). Las capturas que no
+   cambiaron se reutilizan de la caché.
+2. sweep: barre miles de combinaciones de umbrales y pesos sobre esa matriz,
+   vectorizado con NumPy y repartido en varios procesos, y reporta las mejores
+   configuraciones con sus métricas de acuerdo con las etiquetas.
+
+Formato de etiquetas (CSV, rutas relativas al propio CSV):
+
+    image,trend,market_state
+    capturas/eurusd_m5.png,alcista,alcista_volátil
+    capturas/gbpusd_m1.png,lateral,
+
+Uso:
+    python calibration.py extract etiquetas.csv
+    python calibration.py sweep --top 10 --save mejores_umbrales.json
+    ANALYZER_THRESHOLDS=mejores_umbrales.json python main.py
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from image_analyzer import (
+    REGISTRY,
+    THRESHOLDS,
+    calculate_calibrated_strength,
+    classify_market_state_realistic,
+)
+
+DEFAULT_FEATURES_FILE = "calibration_features.npz"
+
+# Columnas de la matriz de características (valores previos a los umbrales)
+FEATURES = (
+    "h",               # altura de la imagen
+    "raw_angle",       # ángulo de la regresión de tendencia
+    "raw_confidence",  # R² x 100 antes de penalizaciones
+    "consistency",     # |primeros 5 - últimos 5| puntos de la tendencia
+    "raw_score",       # score de volatilidad sin redondear
+    "score",           # score de volatilidad redondeado (entra en la fuerza)
+    "recent_change",   # último cambio entre secciones de momentum
+    "movement_diff",   # desplazamiento de las velas recientes
+    "variance",        # varianza vertical de las velas recientes
+    "trend1",          # primer tramo de la reversión
+    "trend2",          # segundo tramo de la reversión
+)
+
+TRENDS = ("lateral", "alcista", "bajista")
+MARKET_STATES = (
+    "lateral",
+    "alcista", "alcista_volátil", "alcista_fuerte",
+    "bajista", "bajista_volátil", "bajista_fuerte",
+    "indefinido",
+)
+
+# Rejilla por defecto: 5*5*4*3*3*3*3*4 = 32.400 combinaciones
+# Los umbrales que no aparecen conservan su valor de THRESHOLDS
+DEFAULT_GRID = {
+    "trend_angle": [2, 3, 5, 8, 10],
+    "trend_confidence": [20, 30, 40, 50, 60],
+    "trend_consistency_pct": [0.02, 0.03, 0.05, 0.08],
+    "candle_movement_pct": [0.03, 0.05, 0.08],
+    "candle_variance_high": [600, 800, 1000],
+    "candle_variance_medium": [200, 300, 400],
+    "weight_trend": [0.3, 0.4, 0.5],
+    "lateral_strength": [45, 50, 55, 60],
+}
+
+# Combinaciones evaluadas por bloque (acota la memoria de cada proceso)
+CHUNK_SIZE = 2048
+
+
+# ==================== EXTRACCIÓN ====================
+
+def load_labels(labels_path):
+    """Lee el CSV de etiquetas -> lista de (ruta absoluta, trend, market_state)"""
+    base = os.path.dirname(os.path.abspath(labels_path))
+    rows = []
+    with open(labels_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            path = os.path.join(base, row["image"].strip())
+            rows.append((
+                path,
+                (row.get("trend") or "").strip(),
+                (row.get("market_state") or "").strip(),
+            ))
+    return rows
+
+
+def extract_image_features(image_path):
+    """
+    Ejecuta los detectores una vez y devuelve (características, trend, estado)
+    El trend y el estado son los del analizador con los umbrales actuales
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError(f"Unable to read image: {image_path}")
+
+    values = REGISTRY.run(
+        {"img": img},
+        targets=["trend_data", "volatility_data", "momentum_data",
+                 "candle_analysis", "reversal_signals"],
+    )
+    trend = values["trend_data"]
+    volatility = values["volatility_data"]
+    momentum = values["momentum_data"]
+    candles = values["candle_analysis"]
+    reversal = values["reversal_signals"]
+
+    features = {
+        "h": img.shape[0],
+        "raw_angle": trend["raw_angle"],
+        "raw_confidence": trend["raw_confidence"],
+        "consistency": trend["consistency"],
+        "raw_score": volatility["raw_score"],
+        "score": volatility["score"],
+        "recent_change": momentum["recent_change"],
+        "movement_diff": candles["movement_diff"],
+        "variance": candles["variance"],
+        "trend1": reversal["trend1"],
+        "trend2": reversal["trend2"],
+    }
+
+    strength = calculate_calibrated_strength(trend, volatility, momentum, candles, reversal)
+    state = classify_market_state_realistic(trend, volatility, candles, strength)
+
+    return [float(features[name]) for name in FEATURES], trend["direction"], state
+
+
+def extract_features(labels_path, out_path=DEFAULT_FEATURES_FILE):
+    """
+    Construye (o actualiza) la matriz de características persistida
+    Reutiliza las filas cuya imagen no cambió (misma ruta, mtime y tamaño)
+    """
+    cached = {}
+    if os.path.exists(out_path):
+        previous = load_features(out_path)
+        if tuple(previous["feature_names"]) == FEATURES:
+            for i, path in enumerate(previous["paths"]):
+                key = (path, previous["mtimes"][i], previous["sizes"][i])
+                cached[key] = (
+                    previous["features"][i],
+                    previous["current_trend"][i],
+                    previous["current_state"][i],
+                )
+
+    paths, mtimes, sizes = [], [], []
+    rows, trend_labels, state_labels = [], [], []
+    current_trend, current_state = [], []
+    reused = 0
+
+    for path, trend_label, state_label in load_labels(labels_path):
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+
+        if key in cached:
+            features, trend, state = cached[key]
+            reused += 1
+        else:
+            features, trend, state = extract_image_features(path)
+
+        paths.append(path)
+        mtimes.append(stat.st_mtime)
+        sizes.append(stat.st_size)
+        rows.append(features)
+        trend_labels.append(trend_label)
+        state_labels.append(state_label)
+        current_trend.append(trend)
+        current_state.append(state)
+
+    np.savez_compressed(
+        out_path,
+        feature_names=np.array(FEATURES),
+        features=np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURES)),
+        paths=np.array(paths),
+        mtimes=np.array(mtimes, dtype=np.float64),
+        sizes=np.array(sizes, dtype=np.int64),
+        trend_labels=np.array(trend_labels),
+        state_labels=np.array(state_labels),
+        current_trend=np.array(current_trend),
+        current_state=np.array(current_state),
+    )
+
+    return {"images": len(paths), "reused": reused, "extracted": len(paths) - reused}
+
+
+def load_features(path=DEFAULT_FEATURES_FILE):
+    """Carga la matriz de características persistida"""
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+# ==================== MODELO VECTORIZADO ====================
+
+def classify_vectorized(features, params):
+    """
+    Réplica vectorizada de la clasificación de image_analyzer
+    features: dict nombre -> (N,)   params: dict nombre -> (P, 1)
+    Retorna códigos de trend y de estado (P, N) según TRENDS / MARKET_STATES
+    """
+    f = features
+    p = params
+    h = f["h"]
+
+    # Tendencia
+    conf = f["raw_confidence"]
+    strong_conf = conf > p["trend_confidence"]
+    trend = np.where((f["raw_angle"] > p["trend_angle"]) & strong_conf, 1,
+                     np.where((f["raw_angle"] < -p["trend_angle"]) & strong_conf, 2, 0))
+    forced_lateral = f["consistency"] < h * p["trend_consistency_pct"]
+    trend = np.where(forced_lateral, 0, trend)
+    conf = np.where(forced_lateral,
+                    np.maximum(0, conf - p["trend_consistency_penalty"]), conf)
+    conf = np.clip(conf, 0, 100)
+
+    # Volatilidad alta
+    high_vol = f["raw_score"] > p["volatility_high"]
+
+    # Momentum
+    momentum_value = f["recent_change"] * 2
+    normalized = np.minimum(100, np.abs(momentum_value / (h * p["momentum_max_change_pct"])) * 100)
+    neutral = np.abs(momentum_value) < h * p["momentum_neutral_pct"]
+    momentum_strength = np.clip(np.where(neutral, 50, np.trunc(normalized)), 0, 100)
+
+    # Velas recientes
+    consolidating = np.abs(f["movement_diff"]) < h * p["candle_movement_pct"]
+    low_activity = f["variance"] <= p["candle_variance_medium"]
+    consistency = np.where(consolidating, 40, np.where(low_activity, 30, 60))
+
+    # Reversión
+    t1, t2 = f["trend1"], f["trend2"]
+    min_move = h * p["reversal_pct"]
+    reversal = (((t1 > 0) & (t2 < 0)) | ((t1 < 0) & (t2 > 0))) & \
+        (np.abs(t1) > min_move) & (np.abs(t2) > min_move)
+
+    # Fuerza calibrada
+    total = (conf * p["weight_trend"]
+             + f["score"] * p["weight_volatility"]
+             + momentum_strength * p["weight_momentum"]
+             + consistency * p["weight_consistency"]
+             - np.where(reversal, p["reversal_penalty"], 0))
+    strength = np.round(np.clip(total, p["strength_min"], p["strength_max"]), 2)
+
+    # Estado del mercado: base alcista (1) / bajista (4) + volátil (+1) / fuerte (+2)
+    lateral = (trend == 0) | (strength < p["lateral_strength"]) | consolidating
+    variant = np.where(high_vol, np.where(strength > p["strong_strength"], 2, 1), 0)
+    state = np.where(lateral, 0, np.where(trend == 1, 1, 4) + variant)
+
+    return trend, state
+
+
+def agreement_metrics(predicted, labels, n_classes):
+    """
+    Exactitud y kappa de Cohen por combinación
+    predicted: (P, N) códigos   labels: (N,) códigos, -1 = sin etiqueta
+    """
+    mask = labels >= 0
+    n = int(mask.sum())
+    if n == 0:
+        nan = np.full(predicted.shape[0], np.nan)
+        return nan, nan
+
+    pred = predicted[:, mask]
+    true = labels[mask]
+    accuracy = (pred == true).mean(axis=1)
+
+    # Acuerdo esperado por azar: sum_k p_pred(k) * p_true(k)
+    true_freq = np.bincount(true, minlength=n_classes) / n
+    expected = np.zeros(pred.shape[0])
+    for k in range(n_classes):
+        if true_freq[k] > 0:
+            expected += (pred == k).mean(axis=1) * true_freq[k]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kappa = np.where(expected < 1, (accuracy - expected) / (1 - expected), 0.0)
+
+    return accuracy, kappa
+
+
+def encode_labels(labels, classes):
+    """Etiquetas de texto -> códigos (-1 para vacías o desconocidas)"""
+    index = {name: i for i, name in enumerate(classes)}
+    return np.array([index.get(str(label), -1) for label in labels], dtype=np.int64)
+
+
+# ==================== BARRIDO ====================
+
+def grid_size(grid):
+    size = 1
+    for values in grid.values():
+        size *= len(values)
+    return size
+
+
+def grid_params(grid, start, stop):
+    """Parámetros (P, 1) de las combinaciones [start, stop) de la rejilla"""
+    names = list(grid)
+    shape = [len(grid[name]) for name in names]
+    indices = np.unravel_index(np.arange(start, stop), shape)
+
+    params = {name: np.array([[value]], dtype=np.float64) for name, value in THRESHOLDS.items()}
+    for name, idx in zip(names, indices):
+        params[name] = np.asarray(grid[name], dtype=np.float64)[idx][:, None]
+    return params
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(features, trend_codes, state_codes, grid):
+    _WORKER_STATE.update(features=features, trend_codes=trend_codes,
+                         state_codes=state_codes, grid=grid)
+
+
+def _evaluate_chunk(bounds):
+    start, stop = bounds
+    s = _WORKER_STATE
+    trend, state = classify_vectorized(s["features"], grid_params(s["grid"], start, stop))
+    trend_acc, trend_kappa = agreement_metrics(trend, s["trend_codes"], len(TRENDS))
+    state_acc, state_kappa = agreement_metrics(state, s["state_codes"], len(MARKET_STATES))
+    return start, np.stack([trend_acc, trend_kappa, state_acc, state_kappa])
+
+
+def sweep(data, grid=None, workers=None, top=10):
+    """
+    Evalúa todas las combinaciones de la rejilla sobre la matriz de características
+    Retorna las mejores configuraciones, la línea base y el tamaño del barrido
+    """
+    grid = grid or DEFAULT_GRID
+    unknown = set(grid) - set(THRESHOLDS)
+    if unknown:
+        raise ValueError(f"Unknown thresholds in grid: {sorted(unknown)}")
+
+    features = {name: data["features"][:, i] for i, name in enumerate(data["feature_names"])}
+    trend_codes = encode_labels(data["trend_labels"], TRENDS)
+    state_codes = encode_labels(data["state_labels"], MARKET_STATES)
+    if (trend_codes < 0).all() and (state_codes < 0).all():
+        raise ValueError("No usable labels in feature matrix")
+
+    total = grid_size(grid)
+    chunks = [(start, min(total, start + CHUNK_SIZE)) for start in range(0, total, CHUNK_SIZE)]
+    metrics = np.empty((4, total))
+
+    workers = workers or os.cpu_count() or 1
+    init_args = (features, trend_codes, state_codes, grid)
+
+    if workers <= 1 or len(chunks) == 1:
+        _init_worker(*init_args)
+        results = map(_evaluate_chunk, chunks)
+        for start, chunk_metrics in results:
+            metrics[:, start:start + chunk_metrics.shape[1]] = chunk_metrics
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=init_args) as pool:
+            for start, chunk_metrics in pool.map(_evaluate_chunk, chunks):
+                metrics[:, start:start + chunk_metrics.shape[1]] = chunk_metrics
+
+    # Puntuación: media de las exactitudes disponibles, desempate por kappa
+    score = np.nanmean(metrics[[0, 2]], axis=0)
+    tie_break = np.nan_to_num(np.nanmean(metrics[[1, 3]], axis=0), nan=-1.0)
+    order = np.lexsort((-tie_break, -score))[:top]
+
+    best = []
+    for index in order:
+        params = grid_params(grid, int(index), int(index) + 1)
+        best.append({
+            "thresholds": {name: float(params[name][0, 0]) for name in grid},
+            "score": float(score[index]),
+            "trend_accuracy": float(metrics[0, index]),
+            "trend_kappa": float(metrics[1, index]),
+            "state_accuracy": float(metrics[2, index]),
+            "state_kappa": float(metrics[3, index]),
+        })
+
+    # Línea base: umbrales actuales
+    base_params = {name: np.array([[value]], dtype=np.float64) for name, value in THRESHOLDS.items()}
+    base_trend, base_state = classify_vectorized(features, base_params)
+    base_trend_acc, base_trend_kappa = agreement_metrics(base_trend, trend_codes, len(TRENDS))
+    base_state_acc, base_state_kappa = agreement_metrics(base_state, state_codes, len(MARKET_STATES))
+
+    # Verificación: el modelo vectorizado reproduce al analizador
+    model_check = int(
+        ((base_trend[0] == encode_labels(data["current_trend"], TRENDS))
+         & (base_state[0] == encode_labels(data["current_state"], MARKET_STATES))).sum()
+    )
+
+    return {
+        "combinations": total,
+        "images": int(data["features"].shape[0]),
+        "model_check": model_check,
+        "baseline": {
+            "trend_accuracy": float(base_trend_acc[0]),
+            "trend_kappa": float(base_trend_kappa[0]),
+            "state_accuracy": float(base_state_acc[0]),
+            "state_kappa": float(base_state_kappa[0]),
+        },
+        "best": best,
+    }
+
+
+def print_report(report):
+    """Imprime el resultado del barrido"""
+    def fmt(value):
+        return "  n/a" if np.isnan(value) else f"{value * 100:5.1f}%"
+
+    def fmt_kappa(value):
+        return "n/a" if np.isnan(value) else f"{value:.2f}"
+
+    print(f"\n{'='*70}")
+    print(f"🎛️  CALIBRACIÓN: {report['combinations']} combinaciones × {report['images']} capturas")
+    print(f"{'='*70}")
+    print(f"   Modelo vectorizado vs analizador: {report['model_check']}/{report['images']} coinciden")
+
+    base = report["baseline"]
+    print(f"\n📏 UMBRALES ACTUALES:")
+    print(f"   • Tendencia: {fmt(base['trend_accuracy'])} (kappa {fmt_kappa(base['trend_kappa'])})")
+    print(f"   • Estado:    {fmt(base['state_accuracy'])} (kappa {fmt_kappa(base['state_kappa'])})")
+
+    print(f"\n🏆 MEJORES CONFIGURACIONES:")
+    for rank, entry in enumerate(report["best"], 1):
+        print(f"\n   #{rank}  puntuación {fmt(entry['score'])} · "
+              f"tendencia {fmt(entry['trend_accuracy'])} · estado {fmt(entry['state_accuracy'])}")
+        changed = {k: v for k, v in entry["thresholds"].items() if v != THRESHOLDS[k]}
+        print(f"       {json.dumps(changed, ensure_ascii=False) if changed else '(sin cambios)'}")
+
+    print(f"\n{'='*70}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibración de umbrales de image_analyzer")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    extract_cmd = sub.add_parser("extract", help="Extraer características de capturas etiquetadas")
+    extract_cmd.add_argument("labels", help="CSV con columnas image,trend[,market_state]")
+    extract_cmd.add_argument("--out", default=DEFAULT_FEATURES_FILE)
+
+    sweep_cmd = sub.add_parser("sweep", help="Barrer combinaciones de umbrales")
+    sweep_cmd.add_argument("--features", default=DEFAULT_FEATURES_FILE)
+    sweep_cmd.add_argument("--grid", help="JSON con la rejilla {umbral: [valores]}")
+    sweep_cmd.add_argument("--top", type=int, default=10)
+    sweep_cmd.add_argument("--workers", type=int, default=None)
+    sweep_cmd.add_argument("--save", help="Guardar THRESHOLDS completos de la mejor configuración")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        stats = extract_features(args.labels, args.out)
+        print(f"💾 {stats['images']} capturas en {args.out} "
+              f"({stats['extracted']} analizadas, {stats['reused']} desde caché)")
+        return 0
+
+    grid = None
+    if args.grid:
+        with open(args.grid, encoding="utf-8") as f:
+            grid = json.load(f)
+
+    report = sweep(load_features(args.features), grid, args.workers, args.top)
+    print_report(report)
+
+    if args.save and report["best"]:
+        best = dict(THRESHOLDS)
+        best.update(report["best"][0]["thresholds"])
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(best, f, ensure_ascii=False, indent=2)
+        print(f"💾 Mejor configuración guardada en: {args.save}")
+        print(f"   Para usarla: ANALYZER_THRESHOLDS={args.save}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
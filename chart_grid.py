@@ -0,0 +1,367 @@
+"""
+Capturas con varios gráficos en cuadrícula (layouts de 4 a 16 paneles)
+
+analyze_image trata toda la captura como un solo gráfico. Aquí se detectan
+los separadores de la cuadrícula (líneas uniformes que cruzan toda la región
+y contrastan con lo que tienen a los lados), se corta recursivamente en
+paneles y cada panel se analiza por separado, en paralelo, como una vista
+del array decodificado (sin copias).
+
+La detección se hace una vez por layout: los rectángulos se guardan por
+tamaño de captura y en las siguientes solo se comprueba que los separadores
+siguen en su sitio.
+
+    python chart_grid.py layout.png --plans
+    python chart_grid.py layout.png --grid 2x3 --labels EURUSD:m1,EURUSD:m5,...
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from signal_plan import TIMEFRAMES, generate_trading_signals
+
+GRID = {
+    # Diferencia máxima (max - min) a lo largo de una línea para ser uniforme
+    "uniform_tolerance": 12,
+    # Grosor máximo de un separador (px)
+    "max_separator_px": 16,
+    # Diferencia mínima de gris entre el separador y sus vecinos...
+    "contrast": 10,
+    # ...en esta fracción de la línea como mínimo (sumando los dos lados)
+    "contrast_fraction": 0.5,
+    # Lado mínimo de un panel: descarta ejes de precio, barras de herramientas
+    "min_panel_px": 120,
+    # Paneles como máximo por captura
+    "max_panels": 36,
+}
+# Layouts (tamaños de captura) recordados
+GRID_CACHE_SIZE = 32
+# Paneles analizados a la vez
+PANEL_WORKERS = int(os.environ.get("ANALYZER_PANEL_WORKERS", 4))
+
+
+def to_gray(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def uniform_runs(gray, axis):
+    """
+    Tramos [inicio, fin) de líneas uniformes que cruzan toda la región
+    axis=1: columnas (separadores verticales); axis=0: filas
+    """
+    across = 0 if axis == 1 else 1
+    high = gray.max(axis=across).astype(np.int16)
+    low = gray.min(axis=across).astype(np.int16)
+    tolerance = GRID["uniform_tolerance"]
+    uniform = high - low <= tolerance
+    # Un tramo también se corta donde cambia el gris (borde del gráfico
+    # pegado al separador)
+    steps = np.flatnonzero(np.abs(np.diff(high)) > tolerance) + 1
+    bounds = np.union1d(np.flatnonzero(np.diff(np.concatenate(([False], uniform, [False])))), steps)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if uniform[start]]
+
+
+def line(gray, axis, index):
+    return gray[:, index] if axis == 1 else gray[index, :]
+
+
+def contrast_score(gray, axis, start, end):
+    """
+    Fracción de la línea en la que el tramo se distingue de la línea anterior
+    y de la siguiente (0-2). Un hueco entre velas apenas puntúa: a ambos
+    lados tiene sobre todo fondo
+    """
+    size = gray.shape[1] if axis == 1 else gray.shape[0]
+    if start == 0 or end >= size:
+        return 0.0
+    score = 0.0
+    for inner, outer in ((start, start - 1), (end - 1, end)):
+        diff = np.abs(line(gray, axis, outer).astype(np.int16) - line(gray, axis, inner).astype(np.int16))
+        score += np.count_nonzero(diff > GRID["contrast"]) / diff.size
+    return score
+
+
+def find_separators(gray, axis):
+    """
+    Separadores (inicio, fin) que dejan a cada lado al menos min_panel_px
+    Los candidatos se aceptan de más a menos contraste, así una línea interna
+    del gráfico (borde del eje de tiempo, borde del panel pegado al
+    separador) no tapa al separador de al lado
+    """
+    size = gray.shape[1] if axis == 1 else gray.shape[0]
+    minimum = GRID["min_panel_px"]
+    thickest = GRID["max_separator_px"]
+
+    scored = []
+    for start, end in uniform_runs(gray, axis):
+        if end - start > thickest or start < minimum or size - end < minimum:
+            continue
+        score = contrast_score(gray, axis, start, end)
+        # Basta un lado: el borde del panel puede tener el color del separador
+        if score >= GRID["contrast_fraction"]:
+            # A igual contraste gana la línea más plana (el separador frente
+            # al borde del gráfico que tiene pegado)
+            spread = int(np.ptp(line(gray, axis, start)))
+            scored.append((round(score, 1), -spread, start, end))
+
+    separators = []
+    for _, _, start, end in sorted(scored, reverse=True):
+        if all(start - other_end >= minimum or other_start - end >= minimum
+               for other_start, other_end in separators):
+            separators.append((start, end))
+    return sorted(separators)
+
+
+def split_region(gray, x, y, separators_out):
+    """
+    Corte recursivo (XY-cut): separa por las líneas verticales que cruzan
+    toda la región, si no por las horizontales, y repite en cada trozo
+    Devuelve rectángulos (x, y, ancho, alto) en coordenadas de la captura
+    """
+    h, w = gray.shape
+    for axis in (1, 0):
+        separators = find_separators(gray, axis)
+        if not separators:
+            continue
+
+        rects = []
+        bounds = [0] + [edge for sep in separators for edge in sep] + [w if axis == 1 else h]
+        for start, end in zip(bounds[::2], bounds[1::2]):
+            if axis == 1:
+                sub, sx, sy = gray[:, start:end], x + start, y
+            else:
+                sub, sx, sy = gray[start:end, :], x, y + start
+            rects.extend(split_region(sub, sx, sy, separators_out))
+        for start, end in separators:
+            # Posición absoluta, tramo que cruza y gris del separador
+            if axis == 1:
+                span = (y, y + h)
+                value = int(gray[h // 2, start])
+                separators_out.append((axis, x + start, x + end, span, value))
+            else:
+                span = (x, x + w)
+                value = int(gray[start, w // 2])
+                separators_out.append((axis, y + start, y + end, span, value))
+        return rects
+    return [(x, y, w, h)]
+
+
+def detect_panels(img):
+    """Rectángulos de los paneles en orden de lectura y separadores usados"""
+    separators = []
+    rects = split_region(to_gray(img), 0, 0, separators)
+    if len(rects) > GRID["max_panels"]:
+        raise ValueError(f"Too many panels detected: {len(rects)} (max {GRID['max_panels']})")
+    return reading_order(rects), separators
+
+
+def reading_order(rects):
+    """
+    Filas de arriba abajo y, dentro de cada fila, de izquierda a derecha
+    (los paneles de una fila pueden empezar a alturas algo distintas)
+    """
+    rows = []
+    for rect in sorted(rects, key=lambda r: r[1]):
+        if rows and rect[1] - rows[-1][0][1] < GRID["min_panel_px"] // 2:
+            rows[-1].append(rect)
+        else:
+            rows.append([rect])
+    return [rect for row in rows for rect in sorted(row)]
+
+
+def uniform_grid(shape, rows, cols):
+    """Rectángulos de una cuadrícula regular rows x cols (sin detección)"""
+    h, w = shape[:2]
+    ys = [round(i * h / rows) for i in range(rows + 1)]
+    xs = [round(j * w / cols) for j in range(cols + 1)]
+    return [(xs[j], ys[i], xs[j + 1] - xs[j], ys[i + 1] - ys[i])
+            for i in range(rows) for j in range(cols)]
+
+
+def parse_grid(spec):
+    """"2x3" -> (2 filas, 3 columnas)"""
+    try:
+        rows, cols = (int(part) for part in spec.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Invalid grid '{spec}': expected ROWSxCOLS, e.g. 2x2")
+    if rows < 1 or cols < 1 or rows * cols > GRID["max_panels"]:
+        raise ValueError(f"Invalid grid '{spec}': 1 to {GRID['max_panels']} panels")
+    return rows, cols
+
+
+def layout_signature(gray):
+    """
+    Posiciones de las líneas uniformes que cruzan toda la captura: si
+    aparecen o desaparecen separadores de primer nivel (2x2 -> 4x4 del mismo
+    tamaño), cambia
+    """
+    return tuple(np.packbits(np.asarray(
+        gray.max(axis=across).astype(np.int16) - gray.min(axis=across) <= GRID["uniform_tolerance"]
+    )).tobytes() for across in (0, 1))
+
+
+def separators_hold(gray, separators):
+    """¿Siguen los separadores en su sitio con el mismo gris?"""
+    tolerance = GRID["uniform_tolerance"]
+    for axis, start, _, (lo, hi), value in separators:
+        segment = gray[lo:hi, start] if axis == 1 else gray[start, lo:hi]
+        if int(segment.max()) - value > tolerance or value - int(segment.min()) > tolerance:
+            return False
+    return True
+
+
+class GridSplitter:
+    """
+    Caché LRU de layouts por tamaño de captura, seguro entre hilos
+    Con el layout en caché solo se comprueban la firma de primer nivel y los
+    píxeles de los separadores; si no coinciden, se vuelve a detectar
+    """
+
+    def __init__(self, capacity=GRID_CACHE_SIZE):
+        self.capacity = capacity
+        # (alto, ancho) -> (rectángulos, separadores, firma)
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "detections": 0, "stale": 0}
+
+    def panels(self, img):
+        """Rectángulos (x, y, ancho, alto) de los paneles de img"""
+        key = img.shape[:2]
+        with self._lock:
+            self.stats["lookups"] += 1
+            cached = self._layouts.get(key)
+            if cached is not None:
+                self._layouts.move_to_end(key)
+
+        gray = to_gray(img)
+        signature = layout_signature(gray)
+        if cached is not None and cached[2] == signature and separators_hold(gray, cached[1]):
+            with self._lock:
+                self.stats["hits"] += 1
+            return list(cached[0])
+
+        rects, separators = detect_panels(gray)
+        with self._lock:
+            self.stats["detections"] += 1
+            if cached is not None:
+                self.stats["stale"] += 1
+            self._layouts[key] = (tuple(rects), tuple(separators), signature)
+            self._layouts.move_to_end(key)
+            while len(self._layouts) > self.capacity:
+                self._layouts.popitem(last=False)
+        return rects
+
+    def clear(self):
+        with self._lock:
+            self._layouts.clear()
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["layouts"] = len(self._layouts)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        return stats
+
+
+def panel_view(img, rect):
+    """Vista del panel sobre el array de la captura (no copia píxeles)"""
+    x, y, w, h = rect
+    return img[y:y + h, x:x + w]
+
+
+def analyze_panels(img, rects, analyze=None, executor=None):
+    """
+    Analiza cada panel en paralelo
+    Devuelve [(rectángulo, análisis o None, error o None)] en el orden de rects
+    """
+    if analyze is None:
+        from image_analyzer import analyze_frame as analyze
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=PANEL_WORKERS, thread_name_prefix="panel")
+    try:
+        futures = [executor.submit(analyze, panel_view(img, rect)) for rect in rects]
+        results = []
+        for rect, future in zip(rects, futures):
+            try:
+                results.append((rect, future.result(), None))
+            except Exception as e:
+                results.append((rect, None, e))
+        return results
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def parse_labels(labels, count):
+    """
+    Etiquetas de los paneles en orden de lectura: "EURUSD:m5", "m5" o
+    "EURUSD"; los que no tienen etiqueta son "panel1", "panel2"...
+    Devuelve [(etiqueta, símbolo, timeframe o None)]
+    """
+    names = [part.strip() for part in labels.split(",")] if labels else []
+    parsed = []
+    for i in range(count):
+        name = names[i] if i < len(names) and names[i] else f"panel{i + 1}"
+        symbol, _, timeframe = name.rpartition(":")
+        timeframe = timeframe.lower()
+        if timeframe not in TIMEFRAMES:
+            symbol, timeframe = name, None
+        parsed.append((name, symbol.strip() or None, timeframe))
+    return parsed
+
+
+def panel_plan(analysis, seed=None):
+    """Plan de señales de un panel suelto: su análisis hace de M1, M5 y M15"""
+    return generate_trading_signals(analysis, analysis, analysis, seed=seed)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description="Divide una captura de varios gráficos y analiza cada panel")
+    parser.add_argument("image")
+    parser.add_argument("--grid", help="Cuadrícula fija ROWSxCOLS en lugar de detectarla")
+    parser.add_argument("--labels", help="Etiquetas en orden de lectura, separadas por comas")
+    parser.add_argument("--plans", action="store_true", help="Plan de señales por panel")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--debug", help="Guarda la captura con los paneles marcados")
+    args = parser.parse_args()
+
+    img = cv2.imread(args.image)
+    if img is None:
+        raise SystemExit(f"❌ No se pudo leer: {args.image}")
+
+    started = time.perf_counter()
+    rects = uniform_grid(img.shape, *parse_grid(args.grid)) if args.grid else GridSplitter().panels(img)
+    detected = time.perf_counter()
+    results = analyze_panels(img, rects)
+    finished = time.perf_counter()
+
+    for (rect, analysis, error), (label, _, _) in zip(results, parse_labels(args.labels, len(rects))):
+        record = {"label": label, "rect": list(rect)}
+        if error is not None:
+            record["error"] = str(error)
+        else:
+            record.update(trend=analysis.get("trend"), strength=analysis.get("strength"))
+            if args.plans:
+                record["plan"] = [s["line"] for s in panel_plan(analysis, args.seed)]
+        print(json.dumps(record, ensure_ascii=False))
+
+    if args.debug:
+        marked = img.copy()
+        for i, (x, y, w, h) in enumerate(rects):
+            cv2.rectangle(marked, (x, y), (x + w - 1, y + h - 1), (0, 0, 255), 2)
+            cv2.putText(marked, str(i + 1), (x + 8, y + 28), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+        cv2.imwrite(args.debug, marked)
+
+    print(f"🧩 {len(rects)} paneles · detección {(detected - started) * 1000:.1f} ms · "
+          f"análisis {(finished - detected) * 1000:.0f} ms", file=sys.stderr)
@@ -0,0 +1,209 @@
+"""
+Registro declarativo de detectores y planificador en paralelo
+
+Cada detector declara las entradas que consume (img, gray, edges, ...) y las
+salidas que produce. El planificador construye el grafo de dependencias,
+calcula una sola vez cada intermedio compartido y ejecuta en un pool de hilos
+los detectores independientes (OpenCV y NumPy liberan el GIL, así que el
+paralelismo es real).
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Detector:
+    """Nodo del grafo: función + entradas y salidas declaradas"""
+
+    __slots__ = ("name", "func", "inputs", "outputs", "strength")
+
+    def __init__(self, name, func, inputs, outputs, strength=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        # Opcional: función(valor de la primera salida) -> puntos de fuerza
+        self.strength = strength
+
+    def __call__(self, values):
+        result = self.func(*(values[name] for name in self.inputs))
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        return dict(zip(self.outputs, result))
+
+    def __repr__(self):
+        return f"Detector({self.name!r}, {list(self.inputs)} -> {list(self.outputs)})"
+
+
+class DetectorRegistry:
+    """Registro de detectores con resolución de dependencias"""
+
+    def __init__(self):
+        self._detectors = {}
+
+    def register(self, name, inputs, outputs, strength=None):
+        """
+        Decorador para registrar un detector
+
+            @REGISTRY.register("mi_detector", inputs=["gray"], outputs=["mi_dato"])
+            def mi_detector(gray):
+                ...
+        """
+        def decorator(func):
+            self.add(Detector(name, func, inputs, outputs, strength))
+            return func
+        return decorator
+
+    def add(self, detector):
+        if detector.name in self._detectors:
+            raise ValueError(f"Detector already registered: {detector.name}")
+
+        producers = self.producers()
+        for output in detector.outputs:
+            if output in producers:
+                raise ValueError(
+                    f"Output {output!r} already produced by {producers[output].name!r}"
+                )
+
+        self._detectors[detector.name] = detector
+
+    def unregister(self, name):
+        self._detectors.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._detectors
+
+    def __iter__(self):
+        return iter(self._detectors.values())
+
+    def producers(self):
+        """Mapa salida -> detector que la produce"""
+        return {
+            output: detector
+            for detector in self._detectors.values()
+            for output in detector.outputs
+        }
+
+    def plan(self, seeds, targets=None):
+        """
+        Orden topológico de los detectores necesarios para obtener targets
+        seeds: nombres de los valores ya disponibles (p. ej. {"img"})
+        targets: salidas pedidas; None = todas las registradas
+        """
+        producers = self.producers()
+        seeds = set(seeds)
+        if targets is None:
+            targets = list(producers)
+
+        order = []
+        state = {}  # nombre -> "visiting" | "done"
+
+        def visit(value, requested_by):
+            if value in seeds:
+                return
+            detector = producers.get(value)
+            if detector is None:
+                raise ValueError(f"No detector produces {value!r} (needed by {requested_by})")
+            mark = state.get(detector.name)
+            if mark == "done":
+                return
+            if mark == "visiting":
+                raise ValueError(f"Dependency cycle through detector {detector.name!r}")
+            state[detector.name] = "visiting"
+            for name in detector.inputs:
+                visit(name, detector.name)
+            state[detector.name] = "done"
+            order.append(detector)
+
+        for target in targets:
+            visit(target, "request")
+
+        return order
+
+    def run(self, seeds, targets=None, executor=None, timings=None):
+        """
+        Ejecuta el grafo y devuelve todos los valores (semillas incluidas)
+        Sin executor se ejecuta en serie en orden topológico
+        timings: dict opcional donde se anotan los segundos de cada detector
+        """
+        values = dict(seeds)
+        order = self.plan(values, targets)
+
+        if timings is not None:
+            def call(detector, available):
+                started = time.perf_counter()
+                try:
+                    return detector(available)
+                finally:
+                    timings[detector.name] = time.perf_counter() - started
+        else:
+            def call(detector, available):
+                return detector(available)
+
+        if executor is None:
+            for detector in order:
+                values.update(call(detector, values))
+            return values
+
+        missing = {d.name: {i for i in d.inputs if i not in values} for d in order}
+        consumers = {}
+        for detector in order:
+            for name in missing[detector.name]:
+                consumers.setdefault(name, []).append(detector)
+
+        running = {}
+        started = set()
+
+        def submit_ready(candidates):
+            for detector in candidates:
+                if not missing[detector.name] and detector.name not in started:
+                    started.add(detector.name)
+                    running[executor.submit(call, detector, dict(values))] = detector
+
+        submit_ready(order)
+
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                unlocked = []
+                for future in done:
+                    detector = running.pop(future)
+                    outputs = future.result()
+                    values.update(outputs)
+                    for name in outputs:
+                        for consumer in consumers.get(name, ()):
+                            missing[consumer.name].discard(name)
+                            unlocked.append(consumer)
+                submit_ready(unlocked)
+        finally:
+            for future in running:
+                future.cancel()
+
+        return values
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    """Pool de hilos compartido por todos los análisis del proceso"""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=max_workers,
+                                               thread_name_prefix="detector")
+    return _EXECUTOR
+
+
+def _reset_executor_after_fork():
+    # Los hilos no sobreviven a fork(): el hijo crea su propio pool
+    global _EXECUTOR, _EXECUTOR_LOCK
+    _EXECUTOR = None
+    _EXECUTOR_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor_after_fork)
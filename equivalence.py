@@ -0,0 +1,362 @@
+"""
+Arnés de equivalencia diferencial entre el analizador de referencia y un
+candidato optimizado
+
+La referencia es una copia congelada del analizador: los módulos tal como
+están en una revisión de git (por defecto el merge-base con la rama
+principal, no HEAD, que ya incluye los cambios a comprobar) o en un
+directorio aparte.
+El candidato es cualquier función con la firma de analyze_image en el árbol
+de trabajo (analyze_image, analyze_image_tiled, ...). Cada implementación se
+ejecuta en su propio proceso sobre las capturas incluidas más un corpus
+generado, y se reporta la deriva por campo (coincidencia exacta para campos
+categóricos, tolerancia para numéricos) junto a la aceleración.
+
+Uso:
+    python equivalence.py
+    python equivalence.py --candidate tiled_analyzer:analyze_image_tiled
+    python equivalence.py --reference-rev baseline --gate gate.json
+
+Sale con código 1 si la deriva supera el presupuesto o la velocidad empeora.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_IMAGES = ("m1.png", "m5.png", "m15.png")
+# Ramas contra las que se busca el merge-base si no se da --reference-rev
+BASE_BRANCHES = ("@{upstream}", "origin/main", "origin/master", "main", "master")
+
+# Campos comparados por igualdad exacta
+CATEGORICAL_FIELDS = (
+    "trend", "market_state", "is_trending", "volatility", "momentum",
+    "candle_pattern", "recent_movement", "reversal_detected", "shape",
+)
+
+# Campos numéricos: (tolerancia absoluta, tolerancia relativa)
+NUMERIC_FIELDS = {
+    "strength": (0.5, 0.0),
+    "trend_angle": (1.0, 0.0),
+    "trend_confidence": (2, 0.0),
+    "volatility_score": (0.5, 0.0),
+    "momentum_strength": (2, 0.0),
+    "norm_pct": (0.0, 0.05),
+    "edge_strength": (0.0, 0.05),
+}
+
+# Presupuesto por defecto: ningún cambio en los campos de decisión,
+# hasta 5% de capturas fuera de tolerancia en el resto y sin perder velocidad
+DEFAULT_GATE = {
+    "categorical_budget": {
+        "trend": 0.0,
+        "market_state": 0.0,
+        "is_trending": 0.0,
+    },
+    "default_categorical_budget": 0.05,
+    "numeric_budget": {
+        "strength": 0.0,
+    },
+    "default_numeric_budget": 0.05,
+    "min_speedup": 0.95,
+}
+
+
+# ==================== CORPUS ====================
+
+def generate_corpus(out_dir, count=24, seed=7):
+    """
+    Genera gráficos sintéticos deterministas: tamaños, fondos, tendencias y
+    estilos variados (línea o velas), incluidas capturas muy anchas
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    sizes = [(800, 450), (1143, 590), (1280, 720), (1920, 1080), (3840, 1080)]
+    paths = []
+
+    for i in range(count):
+        w, h = sizes[i % len(sizes)]
+        dark = rng.random() < 0.5
+        background = (24, 24, 28) if dark else (250, 250, 250)
+        img = np.full((h, w, 3), background, dtype=np.uint8)
+
+        grid_color = (60, 60, 64) if dark else (225, 225, 225)
+        for y in range(0, h, max(20, h // 10)):
+            cv2.line(img, (0, y), (w - 1, y), grid_color, 1)
+        for x in range(0, w, max(40, w // 12)):
+            cv2.line(img, (x, 0), (x, h - 1), grid_color, 1)
+
+        points = 60 + int(rng.integers(0, 140))
+        drift = rng.choice([-1.0, 0.0, 1.0]) * rng.uniform(0.2, 1.5)
+        walk = np.cumsum(drift + rng.normal(0, 2.0, points))
+        walk = (walk - walk.min()) / (np.ptp(walk) or 1.0)
+        ys = (h * 0.1 + (1 - walk) * h * 0.8).astype(np.int32)
+        xs = np.linspace(10, w - 10, points).astype(np.int32)
+
+        if rng.random() < 0.5:
+            color = (255, 200, 60) if dark else (30, 30, 30)
+            pts = np.stack([xs, ys], axis=1).reshape(-1, 1, 2)
+            cv2.polylines(img, [pts], False, color, 2)
+        else:
+            body = max(2, (w // points) // 2)
+            for k in range(1, points):
+                up = ys[k] < ys[k - 1]
+                color = (80, 180, 60) if up else (60, 60, 220)
+                top, bottom = sorted((int(ys[k - 1]), int(ys[k])))
+                wick = int(rng.integers(2, 12))
+                cv2.line(img, (int(xs[k]), top - wick), (int(xs[k]), bottom + wick), color, 1)
+                cv2.rectangle(img, (int(xs[k]) - body, top), (int(xs[k]) + body, max(bottom, top + 1)),
+                              color, -1)
+
+        path = os.path.join(out_dir, f"synthetic_{i:03d}.png")
+        cv2.imwrite(path, img)
+        paths.append(path)
+
+    return paths
+
+
+# ==================== EJECUCIÓN ====================
+
+def git(*args):
+    result = subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def default_reference_rev():
+    """
+    Merge-base de HEAD con la primera rama principal que exista y no sea
+    el propio HEAD; None si no hay ninguna (hay que dar --reference-rev)
+    """
+    head = git("rev-parse", "HEAD")
+    for branch in BASE_BRANCHES:
+        base = git("merge-base", "HEAD", branch)
+        if base and base != head:
+            return base
+    return None
+
+
+def export_revision(rev, out_dir):
+    """Extrae los módulos de una revisión de git (la referencia congelada)"""
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", rev],
+        cwd=REPO_DIR, check=True, capture_output=True,
+    ).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        members = [m for m in tar.getmembers() if m.name.endswith(".py")]
+        # filter="data": sin rutas absolutas, enlaces fuera de out_dir ni permisos especiales
+        tar.extractall(out_dir, members=members, filter="data")
+    return out_dir
+
+
+def run_implementation(source_dir, spec, paths, repeat):
+    """Ejecuta module:function de source_dir en un proceso aparte"""
+    command = [sys.executable, os.path.abspath(__file__), "--worker",
+               source_dir, spec, str(repeat)] + list(paths)
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{spec} ({source_dir}) failed:\n{completed.stderr}")
+    return json.loads(completed.stdout)
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def worker(source_dir, spec, repeat, paths):
+    """Proceso hijo: importa la implementación, la calienta y la cronometra"""
+    sys.path.insert(0, source_dir)
+    module_name, func_name = spec.split(":")
+    module = __import__(module_name)
+    func = getattr(module, func_name)
+
+    if paths:
+        func(paths[0])  # calentamiento (imports perezosos, pools)
+
+    outputs = []
+    for path in paths:
+        timings = []
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(path)
+            timings.append(time.perf_counter() - start)
+        outputs.append({"path": path, "result": result,
+                        "seconds": statistics.median(timings)})
+
+    json.dump(outputs, sys.stdout, default=_json_default)
+
+
+# ==================== COMPARACIÓN ====================
+
+def compare_field(name, ref_value, cand_value):
+    """Retorna (dentro_de_tolerancia, diferencia absoluta o None)"""
+    if name in NUMERIC_FIELDS:
+        abs_tol, rel_tol = NUMERIC_FIELDS[name]
+        if ref_value is None or cand_value is None:
+            return ref_value == cand_value, None
+        diff = abs(float(cand_value) - float(ref_value))
+        limit = max(abs_tol, rel_tol * abs(float(ref_value)))
+        return diff <= limit, diff
+    return ref_value == cand_value, None
+
+
+def compare(reference, candidate):
+    """Deriva por campo entre ambas ejecuciones"""
+    fields = list(CATEGORICAL_FIELDS) + list(NUMERIC_FIELDS)
+    drift = {name: {"mismatches": 0, "max_diff": 0.0, "examples": []} for name in fields}
+
+    for ref, cand in zip(reference, candidate):
+        for name in fields:
+            ok, diff = compare_field(name, ref["result"].get(name), cand["result"].get(name))
+            entry = drift[name]
+            if diff is not None:
+                entry["max_diff"] = max(entry["max_diff"], diff)
+            if not ok:
+                entry["mismatches"] += 1
+                if len(entry["examples"]) < 3:
+                    entry["examples"].append({
+                        "image": os.path.basename(ref["path"]),
+                        "reference": ref["result"].get(name),
+                        "candidate": cand["result"].get(name),
+                    })
+
+    total = len(reference)
+    for entry in drift.values():
+        entry["rate"] = entry["mismatches"] / total if total else 0.0
+
+    ref_time = sum(r["seconds"] for r in reference)
+    cand_time = sum(c["seconds"] for c in candidate)
+
+    return {
+        "images": total,
+        "drift": drift,
+        "reference_seconds": ref_time,
+        "candidate_seconds": cand_time,
+        "speedup": ref_time / cand_time if cand_time > 0 else float("inf"),
+    }
+
+
+def check_gate(report, gate):
+    """Lista de violaciones del presupuesto (vacía = pasa)"""
+    failures = []
+    for name, entry in report["drift"].items():
+        if name in NUMERIC_FIELDS:
+            budget = gate["numeric_budget"].get(name, gate["default_numeric_budget"])
+        else:
+            budget = gate["categorical_budget"].get(name, gate["default_categorical_budget"])
+        if entry["rate"] > budget:
+            failures.append(f"{name}: drift {entry['rate']:.1%} > budget {budget:.1%}")
+
+    if report["speedup"] < gate["min_speedup"]:
+        failures.append(f"speedup {report['speedup']:.2f}x < {gate['min_speedup']:.2f}x")
+
+    return failures
+
+
+def print_report(report, failures, reference_label, candidate_label):
+    print(f"\n{'='*70}")
+    print(f"🔬 EQUIVALENCIA: {report['images']} capturas")
+    print(f"   Referencia: {reference_label}")
+    print(f"   Candidato:  {candidate_label}")
+    print(f"{'='*70}\n")
+
+    for name, entry in report["drift"].items():
+        mark = "✅" if entry["mismatches"] == 0 else "⚠️"
+        line = f"   {mark} {name:18s} {entry['mismatches']:3d} ({entry['rate']:6.1%})"
+        if name in NUMERIC_FIELDS:
+            line += f"   máx Δ {entry['max_diff']:.4g}"
+        print(line)
+        for example in entry["examples"]:
+            print(f"        · {example['image']}: {example['reference']} → {example['candidate']}")
+
+    print(f"\n⏱️  Referencia: {report['reference_seconds'] * 1000:.1f} ms · "
+          f"Candidato: {report['candidate_seconds'] * 1000:.1f} ms · "
+          f"Aceleración: {report['speedup']:.2f}x")
+
+    if failures:
+        print(f"\n❌ PRESUPUESTO EXCEDIDO:")
+        for failure in failures:
+            print(f"   • {failure}")
+    else:
+        print(f"\n✅ Dentro del presupuesto")
+
+    print(f"\n{'='*70}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Equivalencia entre analizador de referencia y candidato")
+    parser.add_argument("--reference", default="image_analyzer:analyze_image")
+    parser.add_argument("--reference-rev",
+                        help="Revisión de git con la referencia congelada (por defecto el merge-base "
+                             "con la rama principal)")
+    parser.add_argument("--reference-dir", help="Directorio con la referencia (en lugar de git)")
+    parser.add_argument("--candidate", default="image_analyzer:analyze_image")
+    parser.add_argument("--candidate-dir", default=REPO_DIR)
+    parser.add_argument("--images", nargs="*", help="Capturas adicionales")
+    parser.add_argument("--generated", type=int, default=24, help="Capturas sintéticas a generar")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--gate", help="JSON que sobrescribe DEFAULT_GATE")
+    parser.add_argument("--json", help="Guardar el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    if not args.reference_dir and not args.reference_rev:
+        args.reference_rev = default_reference_rev()
+        if args.reference_rev is None:
+            parser.error("no hay rama principal distinta de HEAD: indica --reference-rev o --reference-dir")
+
+    gate = json.loads(json.dumps(DEFAULT_GATE))
+    if args.gate:
+        with open(args.gate, encoding="utf-8") as f:
+            gate.update(json.load(f))
+
+    with tempfile.TemporaryDirectory(prefix="equivalence_") as tmp:
+        paths = [os.path.join(REPO_DIR, name) for name in BUNDLED_IMAGES
+                 if os.path.exists(os.path.join(REPO_DIR, name))]
+        paths += [os.path.abspath(p) for p in (args.images or [])]
+        if args.generated:
+            corpus_dir = os.path.join(tmp, "corpus")
+            os.makedirs(corpus_dir)
+            paths += generate_corpus(corpus_dir, args.generated, args.seed)
+
+        if args.reference_dir:
+            reference_dir = os.path.abspath(args.reference_dir)
+            reference_label = f"{args.reference} @ {reference_dir}"
+        else:
+            reference_dir = export_revision(args.reference_rev, os.path.join(tmp, "reference"))
+            reference_label = f"{args.reference} @ {args.reference_rev}"
+        candidate_label = f"{args.candidate} @ {args.candidate_dir}"
+
+        reference = run_implementation(reference_dir, args.reference, paths, args.repeat)
+        candidate = run_implementation(args.candidate_dir, args.candidate, paths, args.repeat)
+
+    report = compare(reference, candidate)
+    failures = check_gate(report, gate)
+    print_report(report, failures, reference_label, candidate_label)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"report": report, "failures": failures}, f,
+                      ensure_ascii=False, indent=2, default=_json_default)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5:])
+        sys.exit(0)
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Espera de cambios en un conjunto de archivos sin consumir CPU
+
+En Linux usa inotify directamente (ctypes sobre libc, sin dependencias):
+vigila los directorios de los archivos, porque muchos programas guardan
+escribiendo un temporal y renombrándolo. En el resto de sistemas, o si
+inotify no está disponible, compara mtime y tamaño cada poll_seconds.
+
+    watcher = open_watcher(["m1.png", "m5.png"])
+    if watcher.wait(timeout=60):
+        ...  # alguno de los archivos pudo cambiar
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# Intervalo de sondeo del modo de respaldo (segundos)
+DEFAULT_POLL_SECONDS = 1.0
+# Tras el primer evento se espera esto a que terminen las escrituras
+SETTLE_SECONDS = 0.2
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def file_signature(path):
+    """(mtime_ns, tamaño) del archivo o None si no existe"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class PollingWatcher:
+    """Respaldo portátil: compara mtime y tamaño periódicamente"""
+
+    backend = "polling"
+
+    def __init__(self, paths, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.poll_seconds = poll_seconds
+        self._signatures = {p: file_signature(p) for p in self.paths}
+
+    def _changed(self):
+        current = {p: file_signature(p) for p in self.paths}
+        changed = {p for p in self.paths if current[p] != self._signatures[p]}
+        self._signatures = current
+        return changed
+
+    def wait(self, timeout=None):
+        """Bloquea hasta un cambio o timeout; devuelve las rutas cambiadas"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self._changed()
+            if changed:
+                return changed
+            remaining = self.poll_seconds if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            time.sleep(min(self.poll_seconds, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux: el proceso duerme en select() hasta que el kernel avisa"""
+
+    backend = "inotify"
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MODIFY
+
+    def __init__(self, paths):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._dirs = {}  # wd -> directorio
+        for directory in {os.path.dirname(p) for p in self.paths}:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, f"inotify_add_watch failed: {directory}")
+            self._dirs[wd] = directory
+
+    def _read_events(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                path = os.path.join(self._dirs.get(wd, ""), os.fsdecode(name))
+                if path in self.paths:
+                    changed.add(path)
+
+    def wait(self, timeout=None):
+        """Bloquea hasta un cambio o timeout; devuelve las rutas cambiadas"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return changed
+            changed = self._read_events()
+
+        # Agrupar las escrituras de un mismo guardado
+        while select.select([self.fd], [], [], SETTLE_SECONDS)[0]:
+            changed |= self._read_events()
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(paths, poll_seconds=DEFAULT_POLL_SECONDS):
+    """inotify si está disponible, si no sondeo por mtime/tamaño"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths, poll_seconds)
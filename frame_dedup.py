@@ -0,0 +1,151 @@
+"""
+Deduplicación perceptual de capturas casi idénticas
+
+Dos capturas que solo difieren en el cursor o la cruz del ratón tienen bytes
+distintos pero el mismo gráfico. Al ingresar cada captura se calcula una
+huella perceptual barata (dHash sobre una miniatura en gris, más otro de la
+franja derecha, donde aparecen las velas nuevas) y se busca en un índice de
+huellas recientes; si alguna está a menos de max_distance bits, se reutiliza
+una copia de su análisis en lugar de repetirlo.
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Lado de la miniatura: HASH_SIZE x HASH_SIZE bits del gráfico completo más
+# 2 x HASH_SIZE x HASH_SIZE de la franja derecha
+HASH_SIZE = 16
+# Fracción del ancho de la franja derecha (la vela en curso y las últimas)
+EDGE_FRACTION = 0.08
+# Bits distintos (de 3 x HASH_SIZE²) para considerar dos capturas la misma
+DEFAULT_MAX_DISTANCE = int(os.environ.get("ANALYZER_DEDUP_DISTANCE", 6))
+# Huellas recientes que se conservan
+DEFAULT_CAPACITY = int(os.environ.get("ANALYZER_DEDUP_CAPACITY", 256))
+
+
+def dhash_bits(gray, width, height):
+    """Miniatura de (width + 1) x height y un bit por par de vecinos (¿el de la derecha es más claro?)"""
+    small = cv2.resize(gray, (width + 1, height), interpolation=cv2.INTER_AREA)
+    return small[:, 1:] > small[:, :-1]
+
+
+def edge_fingerprint(img, hash_size=HASH_SIZE, fraction=EDGE_FRACTION):
+    """
+    dHash de la franja derecha con el doble de filas. Una vela nueva cambia
+    muy pocos píxeles del gráfico completo (el dHash global no la ve) pero
+    muchos de la franja
+    """
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    width = gray.shape[1]
+    band = gray[:, width - min(width, max(hash_size + 1, int(width * fraction))):]
+    return np.packbits(dhash_bits(band, hash_size, 2 * hash_size))
+
+
+def fingerprint(img, hash_size=HASH_SIZE):
+    """
+    dHash del gráfico completo seguido del de la franja derecha
+    (edge_fingerprint). Devuelve los bits empaquetados (3 x hash_size² / 8 bytes)
+    """
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return np.concatenate([np.packbits(dhash_bits(gray, hash_size, hash_size)),
+                           edge_fingerprint(gray, hash_size)])
+
+
+def hamming(a, b):
+    """Bits distintos entre dos huellas empaquetadas"""
+    return int(np.unpackbits(np.bitwise_xor(a, b)).sum())
+
+
+class FrameIndex:
+    """
+    Índice LRU de huellas recientes -> análisis, seguro entre hilos
+    Solo compara huellas de imágenes con las mismas dimensiones. Guarda y
+    devuelve copias: quien modifique su análisis no altera el de los demás
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, capacity=DEFAULT_CAPACITY):
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self._entries = OrderedDict()  # id -> (shape, huella, análisis)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, fp, shape):
+        """Análisis de la huella más cercana dentro de max_distance (o None)"""
+        with self._lock:
+            self.stats["lookups"] += 1
+
+            ids = [key for key, entry in self._entries.items() if entry[0] == shape]
+            if ids:
+                stacked = np.stack([self._entries[key][1] for key in ids])
+                distances = np.unpackbits(np.bitwise_xor(stacked, fp), axis=1).sum(axis=1)
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    self._entries.move_to_end(ids[best])
+                    self.stats["hits"] += 1
+                    return copy.deepcopy(self._entries[ids[best]][2]), int(distances[best])
+
+            self.stats["misses"] += 1
+            return None, None
+
+    def add(self, fp, shape, analysis):
+        with self._lock:
+            self._entries[self._next_id] = (shape, fp, copy.deepcopy(analysis))
+            self._next_id += 1
+            self.stats["stored"] += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def report(self):
+        """Estadísticas con la tasa de aciertos"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._entries)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["max_distance"] = self.max_distance
+        return stats
+
+
+def analyze_deduplicated(img, index, analyze):
+    """
+    Analiza img con analyze(img) salvo que el índice tenga una captura casi
+    idéntica. Devuelve (análisis, distancia); distancia es None si se analizó
+    """
+    fp = fingerprint(img)
+    cached, distance = index.lookup(fp, img.shape)
+    if cached is not None:
+        return cached, distance
+
+    analysis = analyze(img)
+    index.add(fp, img.shape, analysis)
+    return analysis, None
+
+
+if __name__ == "__main__":
+    import sys
+
+    paths = sys.argv[1:] or ["m1.png", "m5.png", "m15.png"]
+    prints = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"❌ No se pudo leer: {path}")
+            continue
+        prints.append((os.path.basename(path), fingerprint(img)))
+
+    for i, (name_a, fp_a) in enumerate(prints):
+        for name_b, fp_b in prints[i + 1:]:
+            print(f"{name_a} ↔ {name_b}: {hamming(fp_a, fp_b)} bits")
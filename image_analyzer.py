@@ -1,42 +1,153 @@
 import cv2
+import json
 import numpy as np
 import os
 from scipy import stats
 
-def analyze_image(image_path):
+from detector_registry import Detector, DetectorRegistry, get_executor
+
+# Ventanas de regresión para el perfil multi-horizonte (fracción final del gráfico)
+TREND_WINDOWS = (1.0, 0.5, 0.2, 0.1)
+# Resoluciones (número de columnas) sobre las que se calcula el perfil
+TREND_RESOLUTIONS = (20, 40, 80)
+# Umbrales y pesos de clasificación (ajustables con calibration.py)
+THRESHOLDS = {
+    # Tendencia
+    "trend_angle": 5,                  # grados mínimos para alcista/bajista
+    "trend_confidence": 40,            # R² x 100 mínimo
+    "trend_consistency_pct": 0.05,     # % de altura: por debajo -> lateral
+    "trend_consistency_penalty": 20,   # confianza restada al forzar lateral
+    # Volatilidad (score 0-100)
+    "volatility_high": 65,
+    "volatility_medium": 35,
+    # Momentum
+    "momentum_neutral_pct": 0.03,      # % de altura: por debajo -> neutral
+    "momentum_max_change_pct": 0.3,    # % de altura que equivale a 100
+    # Velas recientes
+    "candle_movement_pct": 0.05,       # % de altura: por debajo -> consolidando
+    "candle_variance_high": 800,
+    "candle_variance_medium": 300,
+    # Reversión
+    "reversal_pct": 0.03,              # % de altura mínimo de cada tramo
+    # Fuerza calibrada
+    "weight_trend": 0.4,
+    "weight_volatility": 0.2,
+    "weight_momentum": 0.25,
+    "weight_consistency": 0.15,
+    "reversal_penalty": 15,
+    "strength_min": 20,
+    "strength_max": 85,
+    # Estado del mercado
+    "lateral_strength": 55,            # fuerza mínima para no ser lateral
+    "strong_strength": 70,             # fuerza mínima para "fuerte"
+}
+
+def load_thresholds(path):
+    """
+    Sustituye THRESHOLDS por los de un JSON (p. ej. calibration.py sweep --save)
+    Los umbrales que no aparecen conservan su valor; los desconocidos son un error
+    """
+    with open(path, encoding="utf-8") as f:
+        loaded = json.load(f)
+    unknown = set(loaded) - set(THRESHOLDS)
+    if unknown:
+        raise ValueError(f"Unknown thresholds in {path}: {', '.join(sorted(unknown))}")
+    THRESHOLDS.update(loaded)
+    return THRESHOLDS
+
+# JSON de umbrales calibrados que se carga al importar el módulo
+THRESHOLDS_FILE = os.environ.get("ANALYZER_THRESHOLDS")
+if THRESHOLDS_FILE:
+    load_thresholds(THRESHOLDS_FILE)
+
+# Ejecutar en paralelo los detectores independientes (pool de hilos compartido)
+# Con una sola CPU el pool solo añade coste: se ejecutan en serie
+PARALLEL_DETECTORS = (os.cpu_count() or 1) > 1
+
+# Registro de detectores: ver register_builtin_detectors() más abajo
+REGISTRY = DetectorRegistry()
+
+def analyze_image(image_path, deadline_ms=None):
     """
     Analiza una captura de pantalla de gráfico de trading
     Extrae: tendencia, fuerza, volatilidad, momentum, patrones
     Versión calibrada para análisis realista
+    deadline_ms: presupuesto de latencia; adapta la calidad (ver adaptive_quality.py)
     """
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image not found: {image_path}")
     
+    if deadline_ms is not None:
+        from adaptive_quality import analyze_image_within
+        return analyze_image_within(image_path, deadline_ms)
+    
     img = cv2.imread(image_path)
     if img is None:
         raise ValueError(f"Unable to read image: {image_path}")
     
-    h, w = img.shape[:2]
-    
-    # 1. DETECCIÓN DE TENDENCIA MEJORADA
-    trend_data = detect_trend_advanced(img)
-    
-    # 2. ANÁLISIS DE VOLATILIDAD
-    volatility_data = analyze_volatility(img)
-    
-    # 3. DETECCIÓN DE MOMENTUM
-    momentum_data = detect_momentum(img)
-    
-    # 4. ANÁLISIS DE VELAS (último 20% del gráfico)
-    candle_analysis = analyze_recent_candles(img)
+    return analyze_frame(img)
+
+
+def decode_image(data):
+    """Decodifica en memoria una imagen (bytes PNG/JPG/BMP) a BGR"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    img = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+    if img is None:
+        raise ValueError("Unable to decode image data")
+    return img
+
+
+def analyze_frame(img, deadline_ms=None):
+    """
+    Analiza una imagen ya decodificada (BGR o gris) sin pasar por disco
+    Mismo resultado que analyze_image
+    deadline_ms: presupuesto de latencia; adapta la calidad (ver adaptive_quality.py)
+    """
+    if deadline_ms is not None:
+        from adaptive_quality import analyze_frame_within
+        return analyze_frame_within(img, deadline_ms)
     
-    # 5. DETECCIÓN DE CAMBIOS DE TENDENCIA
-    reversal_signals = detect_reversal_patterns(img)
+    h, w = img.shape[:2]
     
-    # 6. FUERZA DEL MERCADO (edge detection)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 50, 150)
-    edge_strength = float(np.sum(edges))
+    # Los detectores y sus intermedios (gray, edges, perfil por columnas)
+    # se resuelven desde el registro; cada intermedio se calcula una vez y
+    # solo si algún detector lo necesita
+    external = [d for d in REGISTRY if d.name not in BUILTIN_DETECTORS]
+    targets = list(RESULT_INPUTS) + [o for d in external for o in d.outputs]
+    executor = get_executor() if PARALLEL_DETECTORS else None
+    values = REGISTRY.run({"img": img}, targets=targets, executor=executor)
+    
+    # Salidas de detectores externos y su aporte a la fuerza
+    plugins = {}
+    strength_adjustment = 0.0
+    for detector in external:
+        for output in detector.outputs:
+            plugins[output] = values[output]
+        if detector.strength is not None:
+            strength_adjustment += detector.strength(values[detector.outputs[0]])
+    
+    return build_analysis_result(
+        values["trend_data"],
+        values["volatility_data"],
+        values["momentum_data"],
+        values["candle_analysis"],
+        values["reversal_signals"],
+        values["trend_profile"],
+        values["edge_strength"],
+        h, w,
+        strength_adjustment=strength_adjustment,
+        plugins=plugins
+    )
+
+
+def build_analysis_result(trend_data, volatility_data, momentum_data,
+                          candle_analysis, reversal_signals, trend_profile,
+                          edge_strength, h, w, strength_adjustment=0.0,
+                          plugins=None):
+    """
+    Combina la salida de los detectores en el resultado final del análisis
+    Compartido por el análisis completo y el análisis por franjas
+    """
     norm_strength = edge_strength / (h * w) if (h * w) > 0 else 0.0
     norm_pct = norm_strength * 100.0
     
@@ -46,7 +157,8 @@ def analyze_image(image_path):
         volatility_data, 
         momentum_data,
         candle_analysis,
-        reversal_signals
+        reversal_signals,
+        adjustment=strength_adjustment
     )
     
     # 8. CLASIFICACIÓN REALISTA DEL MERCADO
@@ -57,7 +169,7 @@ def analyze_image(image_path):
         strength
     )
     
-    return {
+    result = {
         # Datos principales
         "trend": trend_data["direction"],
         "strength": strength,
@@ -66,6 +178,7 @@ def analyze_image(image_path):
         # Datos detallados
         "trend_angle": trend_data["angle"],
         "trend_confidence": trend_data["confidence"],
+        "trend_profile": trend_profile,
         "volatility": volatility_data["level"],
         "volatility_score": volatility_data["score"],
         "momentum": momentum_data["direction"],
@@ -84,6 +197,12 @@ def analyze_image(image_path):
         "edge_strength": edge_strength,
         "shape": (w, h)
     }
+    
+    # Detectores registrados fuera del núcleo
+    if plugins:
+        result["plugins"] = plugins
+    
+    return result
 
 
 def detect_trend_advanced(img):
@@ -91,7 +210,7 @@ def detect_trend_advanced(img):
     Detección avanzada de tendencia con múltiples métodos
     """
     h, w = img.shape[:2]
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(img)
     
     # Método 1: Análisis por columnas (más preciso)
     # Dividir imagen en 20 columnas
@@ -109,10 +228,19 @@ def detect_trend_advanced(img):
         min_idx = np.argmin(vertical_profile)
         column_means.append(min_idx)
     
+    return classify_trend(column_means, h, w)
+
+
+def classify_trend(column_means, h, w):
+    """
+    Clasifica la tendencia a partir de la posición del precio en 20 columnas
+    """
     # Regresión lineal sobre los puntos
     x = np.arange(len(column_means))
     y = np.array(column_means)
     
+    t = THRESHOLDS
+    
     try:
         slope, intercept, r_value, p_value, std_err = stats.linregress(x, y)
         r_squared = r_value ** 2
@@ -127,9 +255,11 @@ def detect_trend_advanced(img):
         confidence = 0
     
     # Determinar dirección con umbrales más estrictos
-    if angle > 5 and confidence > 40:
+    raw_confidence = confidence
+    
+    if angle > t["trend_angle"] and confidence > t["trend_confidence"]:
         direction = "alcista"
-    elif angle < -5 and confidence > 40:
+    elif angle < -t["trend_angle"] and confidence > t["trend_confidence"]:
         direction = "bajista"
     else:
         direction = "lateral"
@@ -140,23 +270,163 @@ def detect_trend_advanced(img):
     consistency = abs(first_avg - last_avg)
     
     # Si la diferencia es pequeña, probablemente es lateral
-    if consistency < (h * 0.05):  # Menos del 5% de altura
+    if consistency < (h * t["trend_consistency_pct"]):  # Menos del 5% de altura
         direction = "lateral"
-        confidence = max(0, confidence - 20)
+        confidence = max(0, confidence - t["trend_consistency_penalty"])
     
     return {
         "direction": direction,
         "angle": round(float(angle), 2),
         "confidence": max(0, min(100, confidence)),
-        "consistency": consistency
+        "consistency": consistency,
+        # Valores previos a los umbrales (calibración)
+        "raw_angle": float(angle),
+        "raw_confidence": raw_confidence
+    }
+
+
+def column_price_profiles(gray, resolutions):
+    """
+    Posición vertical de la zona más oscura por bloques de columnas
+    Equivale al bucle por columnas de detect_trend_advanced, pero con sumas
+    acumuladas: un solo recorrido de la imagen sirve para todas las resoluciones
+    """
+    return profiles_from_cumsum(column_cumsum(gray, resolutions), resolutions)
+
+
+def block_bounds(w, n_columns):
+    """Columnas de inicio y fin de los n_columns bloques (el último llega a w)"""
+    starts = np.arange(n_columns) * (w // n_columns)
+    return starts, np.append(starts[1:], w)
+
+
+def column_cumsum(gray, resolutions=TREND_RESOLUTIONS):
+    """
+    Suma acumulada por columnas, solo en los bordes de bloque de resolutions
+    Devuelve (bordes, sumas (h, len(bordes))): sumas[:, i] es la suma de las
+    columnas anteriores a bordes[i]. Una sola pasada con reduceat en enteros
+    (exacta) en lugar de la suma acumulada de todas las columnas
+    """
+    h, w = gray.shape[:2]
+    bounds = np.unique(np.concatenate([np.concatenate(block_bounds(w, n)) for n in resolutions]
+                                      + [np.array([0, w])]))
+    sums = np.zeros((h, len(bounds)), dtype=np.int64)
+    if w > 0:
+        np.cumsum(np.add.reduceat(gray, bounds[:-1], axis=1, dtype=np.int64), axis=1, out=sums[:, 1:])
+    return bounds, sums
+
+
+def profiles_from_cumsum(cumsum, resolutions):
+    """
+    Posición del precio por bloques a partir de column_cumsum
+    resolutions debe ser un subconjunto de las usadas en column_cumsum
+    """
+    bounds, sums = cumsum
+    w = int(bounds[-1])
+    profiles = []
+    for n_columns in resolutions:
+        starts, ends = block_bounds(w, n_columns)
+        block_means = ((sums[:, np.searchsorted(bounds, ends)] - sums[:, np.searchsorted(bounds, starts)])
+                       / (ends - starts))
+        profiles.append(np.argmin(block_means, axis=0))
+    
+    return profiles
+
+
+def multi_window_regression(profiles, windows=TREND_WINDOWS):
+    """
+    Regresión lineal cerrada para muchas ventanas y resoluciones a la vez
+    profiles: lista de perfiles (uno por resolución), de longitud variable
+    windows: fracciones finales del perfil (1.0 = gráfico completo)
+    Retorna matrices (resoluciones x ventanas) de slope, intercept y r_squared
+    """
+    lengths = np.array([len(p) for p in profiles])
+    n_max = int(lengths.max())
+    
+    # Alinear perfiles a la derecha: el último punto de todos cae en n_max - 1
+    y = np.zeros((len(profiles), n_max), dtype=np.float64)
+    for r, profile in enumerate(profiles):
+        y[r, n_max - len(profile):] = profile
+    
+    # Puntos por ventana (mínimo 3 para que R² tenga sentido)
+    counts = np.maximum(3, np.rint(np.outer(lengths, windows))).astype(int)
+    counts = np.minimum(counts, lengths[:, None])
+    
+    # Máscara (resolución, ventana, punto) de los puntos incluidos
+    positions = np.arange(n_max)
+    mask = positions[None, None, :] >= (n_max - counts)[:, :, None]
+    
+    # x local de cada resolución: 0..n-1 dentro de su propio perfil
+    x = positions[None, :] - (n_max - lengths)[:, None]
+    x = np.broadcast_to(x[:, None, :], mask.shape)
+    ym = np.broadcast_to(y[:, None, :], mask.shape)
+    
+    n = counts.astype(np.float64)
+    sx = np.sum(x * mask, axis=2)
+    sy = np.sum(ym * mask, axis=2)
+    sxx = np.sum(x * x * mask, axis=2)
+    sxy = np.sum(x * ym * mask, axis=2)
+    syy = np.sum(ym * ym * mask, axis=2)
+    
+    cov_xy = n * sxy - sx * sy
+    var_x = n * sxx - sx * sx
+    var_y = n * syy - sy * sy
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(var_x > 0, cov_xy / var_x, 0.0)
+        r_squared = np.where((var_x > 0) & (var_y > 0),
+                             (cov_xy * cov_xy) / (var_x * var_y), 0.0)
+    intercept = (sy - slope * sx) / n
+    
+    return {
+        "slope": slope,
+        "intercept": intercept,
+        "r_squared": r_squared,
+        "points": counts
     }
 
 
+def detect_trend_profile(gray, resolutions=TREND_RESOLUTIONS, windows=TREND_WINDOWS):
+    """
+    Perfil de tendencia multi-horizonte (pendiente y R² por ventana y resolución)
+    Recibe la imagen ya en escala de grises
+    """
+    h, w = gray.shape[:2]
+    profiles = column_price_profiles(gray, resolutions)
+    return trend_profile_from_profiles(profiles, h, w, resolutions, windows)
+
+
+def trend_profile_from_profiles(profiles, h, w, resolutions=TREND_RESOLUTIONS,
+                                windows=TREND_WINDOWS):
+    """
+    Ajusta todas las ventanas sobre perfiles ya calculados (una por resolución)
+    """
+    fit = multi_window_regression(profiles, windows)
+    
+    # Reescalar la pendiente a la resolución base de 20 columnas para que el
+    # ángulo sea comparable con trend_angle (mismo ajuste por aspecto)
+    scale = np.array(resolutions, dtype=np.float64)[:, None] / 20
+    angles = -np.degrees(np.arctan(fit["slope"] * scale * (h / w)))
+    
+    profile = []
+    for r, n_columns in enumerate(resolutions):
+        for j, window in enumerate(windows):
+            profile.append({
+                "columns": int(n_columns),
+                "window_pct": int(round(window * 100)),
+                "angle": round(float(angles[r, j]), 2),
+                "slope": round(float(fit["slope"][r, j]), 4),
+                "r_squared": round(float(fit["r_squared"][r, j]), 4)
+            })
+    
+    return profile
+
+
 def analyze_volatility(img):
     """
     Análisis mejorado de volatilidad
     """
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(img)
     h, w = gray.shape
     
     # Método 1: Desviación estándar por filas
@@ -166,22 +436,31 @@ def analyze_volatility(img):
     col_diffs = np.diff(np.mean(gray, axis=0))
     col_volatility = np.std(col_diffs)
     
+    return classify_volatility(np.mean(row_std), col_volatility)
+
+
+def classify_volatility(row_std_mean, col_volatility):
+    """
+    Clasifica la volatilidad a partir de la desviación media por filas
+    y de la dispersión de las diferencias entre columnas
+    """
     # Combinar ambos métodos
-    combined = (np.mean(row_std) + col_volatility) / 2
+    combined = (row_std_mean + col_volatility) / 2
     
     # Normalizar de forma más conservadora
     normalized = min(100, (combined / 30) * 100)  # Ajustado para ser más realista
     
-    if normalized > 65:
+    if normalized > THRESHOLDS["volatility_high"]:
         level = "alta"
-    elif normalized > 35:
+    elif normalized > THRESHOLDS["volatility_medium"]:
         level = "media"
     else:
         level = "baja"
     
     return {
         "level": level,
-        "score": round(float(normalized), 2)
+        "score": round(float(normalized), 2),
+        "raw_score": float(normalized)
     }
 
 
@@ -190,7 +469,7 @@ def detect_momentum(img):
     Detección mejorada de momentum
     """
     h, w = img.shape[:2]
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(img)
     
     # Dividir en 4 secciones
     quarter = w // 4
@@ -208,6 +487,13 @@ def detect_momentum(img):
         min_idx = np.argmin(vertical_profile)
         positions.append(min_idx)
     
+    return classify_momentum(positions, h)
+
+
+def classify_momentum(positions, h):
+    """
+    Clasifica el momentum a partir de la posición del precio en 4 secciones
+    """
     # Calcular cambio entre secciones
     changes = [positions[i+1] - positions[i] for i in range(3)]
     avg_change = np.mean(changes)
@@ -217,11 +503,11 @@ def detect_momentum(img):
     momentum_value = recent_change * 2  # Dar más peso al cambio reciente
     
     # Normalizar a 0-100
-    max_change = h * 0.3  # 30% de la altura como máximo
+    max_change = h * THRESHOLDS["momentum_max_change_pct"]  # 30% de la altura como máximo
     normalized = min(100, abs(momentum_value / max_change) * 100)
     
     # Determinar dirección (invertido porque Y crece hacia abajo)
-    if abs(momentum_value) < (h * 0.03):  # Menos del 3% = neutral
+    if abs(momentum_value) < (h * THRESHOLDS["momentum_neutral_pct"]):  # Menos del 3% = neutral
         direction = "neutral"
         strength = 50
     elif momentum_value < 0:  # Subiendo
@@ -243,7 +529,7 @@ def analyze_recent_candles(img):
     Analiza las últimas velas (20% derecho del gráfico)
     """
     h, w = img.shape[:2]
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(img)
     
     # Enfocarse en el 20% más reciente
     recent = gray[:, int(w * 0.8):]
@@ -258,10 +544,17 @@ def analyze_recent_candles(img):
     left_pos = np.argmin(np.mean(left_half, axis=1))
     right_pos = np.argmin(np.mean(right_half, axis=1))
     
+    return classify_recent_candles(vertical_variance, left_pos, right_pos, h)
+
+
+def classify_recent_candles(vertical_variance, left_pos, right_pos, h):
+    """
+    Clasifica movimiento y patrón de las últimas velas
+    """
     movement_diff = left_pos - right_pos
     
     # Clasificar movimiento
-    if abs(movement_diff) < (h * 0.05):
+    if abs(movement_diff) < (h * THRESHOLDS["candle_movement_pct"]):
         movement = "consolidando"
     elif movement_diff < 0:
         movement = "subiendo"
@@ -269,9 +562,9 @@ def analyze_recent_candles(img):
         movement = "bajando"
     
     # Clasificar patrón
-    if vertical_variance > 800:
+    if vertical_variance > THRESHOLDS["candle_variance_high"]:
         pattern = "alta_volatilidad"
-    elif vertical_variance > 300:
+    elif vertical_variance > THRESHOLDS["candle_variance_medium"]:
         pattern = "consolidación"
     else:
         pattern = "baja_actividad"
@@ -279,7 +572,8 @@ def analyze_recent_candles(img):
     return {
         "pattern": pattern,
         "movement": movement,
-        "variance": vertical_variance
+        "variance": vertical_variance,
+        "movement_diff": movement_diff
     }
 
 
@@ -288,7 +582,7 @@ def detect_reversal_patterns(img):
     Detecta posibles reversiones de tendencia
     """
     h, w = img.shape[:2]
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(img)
     
     # Analizar últimos 30%
     recent = gray[:, int(w * 0.7):]
@@ -304,6 +598,13 @@ def detect_reversal_patterns(img):
     pos2 = np.argmin(np.mean(part2, axis=1))
     pos3 = np.argmin(np.mean(part3, axis=1))
     
+    return classify_reversal(pos1, pos2, pos3, h)
+
+
+def classify_reversal(pos1, pos2, pos3, h):
+    """
+    Detecta una reversión a partir de la posición del precio en tres tramos
+    """
     # Detectar cambio de dirección
     trend1 = pos2 - pos1  # Primera mitad
     trend2 = pos3 - pos2  # Segunda mitad
@@ -311,28 +612,34 @@ def detect_reversal_patterns(img):
     # Reversión si cambian de signo
     reversal = False
     if (trend1 > 0 and trend2 < 0) or (trend1 < 0 and trend2 > 0):
-        if abs(trend1) > (h * 0.03) and abs(trend2) > (h * 0.03):
+        min_move = h * THRESHOLDS["reversal_pct"]
+        if abs(trend1) > min_move and abs(trend2) > min_move:
             reversal = True
     
     return {
         "detected": reversal,
-        "strength": abs(trend2 - trend1) if reversal else 0
+        "strength": abs(trend2 - trend1) if reversal else 0,
+        "trend1": trend1,
+        "trend2": trend2
     }
 
 
 def calculate_calibrated_strength(trend_data, volatility_data, momentum_data,
-                                  candle_analysis, reversal_signals):
+                                  candle_analysis, reversal_signals, adjustment=0.0):
     """
     Calcula fuerza con calibración realista
+    adjustment: puntos aportados por detectores registrados externamente
     """
     # Base: confianza de la tendencia (peso 40%)
-    base = trend_data["confidence"] * 0.4
+    t = THRESHOLDS
+    
+    base = trend_data["confidence"] * t["weight_trend"]
     
     # Volatilidad (peso 20%)
-    vol_component = volatility_data["score"] * 0.2
+    vol_component = volatility_data["score"] * t["weight_volatility"]
     
     # Momentum (peso 25%)
-    momentum_component = momentum_data["strength"] * 0.25
+    momentum_component = momentum_data["strength"] * t["weight_momentum"]
     
     # Consistencia de velas recientes (peso 15%)
     if candle_analysis["movement"] == "consolidando":
@@ -342,18 +649,19 @@ def calculate_calibrated_strength(trend_data, volatility_data, momentum_data,
     else:
         consistency = 60
     
-    consistency_component = consistency * 0.15
+    consistency_component = consistency * t["weight_consistency"]
     
     # Penalización por reversión
     reversal_penalty = 0
     if reversal_signals["detected"]:
-        reversal_penalty = -15
+        reversal_penalty = -t["reversal_penalty"]
     
     # Calcular total
     total = base + vol_component + momentum_component + consistency_component + reversal_penalty
+    total += adjustment
     
     # Limitar a rango realista
-    return round(float(max(20, min(85, total))), 2)
+    return round(float(max(t["strength_min"], min(t["strength_max"], total))), 2)
 
 
 def classify_market_state_realistic(trend_data, volatility_data, 
@@ -369,12 +677,15 @@ def classify_market_state_realistic(trend_data, volatility_data,
     # 1. Dirección es lateral
     # 2. Fuerza < 55
     # 3. Movimiento reciente es "consolidando"
-    if direction == "lateral" or strength < 55 or movement == "consolidando":
+    strong = THRESHOLDS["strong_strength"]
+    
+    if (direction == "lateral" or strength < THRESHOLDS["lateral_strength"]
+            or movement == "consolidando"):
         return "lateral"
     
     # Alcista
     if direction == "alcista":
-        if volatility == "alta" and strength > 70:
+        if volatility == "alta" and strength > strong:
             return "alcista_fuerte"
         elif volatility == "alta":
             return "alcista_volátil"
@@ -383,7 +694,7 @@ def classify_market_state_realistic(trend_data, volatility_data,
     
     # Bajista
     if direction == "bajista":
-        if volatility == "alta" and strength > 70:
+        if volatility == "alta" and strength > strong:
             return "bajista_fuerte"
         elif volatility == "alta":
             return "bajista_volátil"
@@ -393,6 +704,65 @@ def classify_market_state_realistic(trend_data, volatility_data,
     return "indefinido"
 
 
+def to_gray(img):
+    """Convierte a gris salvo que la imagen ya lo esté"""
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def detect_edges(gray):
+    """Mapa de bordes de Canny"""
+    return cv2.Canny(gray, 50, 150)
+
+
+def detect_trace(gray):
+    """Fila más oscura de cada columna (traza del precio píxel a píxel)"""
+    return np.argmin(gray, axis=0)
+
+
+def edge_strength_from_edges(edges):
+    """Fuerza de bordes: suma del mapa de Canny"""
+    return float(np.sum(edges))
+
+
+def trend_profile_from_cumsum(cumsum):
+    """Perfil multi-horizonte a partir de column_cumsum"""
+    bounds, sums = cumsum
+    h, w = sums.shape[0], int(bounds[-1])
+    profiles = profiles_from_cumsum(cumsum, TREND_RESOLUTIONS)
+    return trend_profile_from_profiles(profiles, h, w)
+
+
+def register_builtin_detectors(registry):
+    """
+    Intermedios compartidos y detectores del núcleo
+    Intermedios: gray, edges, column_profile (suma acumulada por columnas)
+    y trace (fila más oscura de cada columna, para detectores externos)
+    """
+    registry.add(Detector("gray", to_gray, ["img"], ["gray"]))
+    registry.add(Detector("edges", detect_edges, ["gray"], ["edges"]))
+    registry.add(Detector("column_profile", column_cumsum, ["gray"], ["column_profile"]))
+    registry.add(Detector("trace", detect_trace, ["gray"], ["trace"]))
+    
+    registry.add(Detector("trend", detect_trend_advanced, ["gray"], ["trend_data"]))
+    registry.add(Detector("volatility", analyze_volatility, ["gray"], ["volatility_data"]))
+    registry.add(Detector("momentum", detect_momentum, ["gray"], ["momentum_data"]))
+    registry.add(Detector("candles", analyze_recent_candles, ["gray"], ["candle_analysis"]))
+    registry.add(Detector("reversal", detect_reversal_patterns, ["gray"], ["reversal_signals"]))
+    registry.add(Detector("trend_profile", trend_profile_from_cumsum,
+                          ["column_profile"], ["trend_profile"]))
+    registry.add(Detector("edge_strength", edge_strength_from_edges,
+                          ["edges"], ["edge_strength"]))
+
+
+register_builtin_detectors(REGISTRY)
+BUILTIN_DETECTORS = frozenset(detector.name for detector in REGISTRY)
+# Salidas del núcleo que consume build_analysis_result
+RESULT_INPUTS = ("trend_data", "volatility_data", "momentum_data", "candle_analysis",
+                 "reversal_signals", "trend_profile", "edge_strength")
+
+
 def diagnose_image(image_path):
     """Diagnóstico mejorado"""
     print(f"\n{'='*70}")
@@ -405,6 +775,11 @@ def diagnose_image(image_path):
     print(f"   • Dirección: {result['trend']} ({result['trend_angle']}°)")
     print(f"   • Confianza: {result['trend_confidence']}%")
     
+    print(f"\n🧭 PERFIL MULTI-HORIZONTE (ángulo° / R²):")
+    for entry in result['trend_profile']:
+        print(f"   • {entry['columns']:3d} col · últimos {entry['window_pct']:3d}%: "
+              f"{entry['angle']:7.2f}° / {entry['r_squared']:.2f}")
+    
     print(f"\n⚡ MOMENTUM:")
     print(f"   • Dirección: {result['momentum']}")
     print(f"   • Fuerza: {result['momentum_strength']}%")
@@ -425,12 +800,28 @@ def diagnose_image(image_path):
     return result
 
 
-if __name__ == "__main__":
-    test_images = ["m1.png", "m5.png", "m15.png"]
-    
-    for img_path in test_images:
+def diagnose_images(paths):
+    for img_path in paths:
         if os.path.exists(img_path):
             try:
                 diagnose_image(img_path)
             except Exception as e:
-                print(f"❌ Error: {e}")
\ No newline at end of file
+                print(f"❌ Error: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from contextlib import nullcontext
+    from profiler import DEFAULT_INTERVAL_MS, profiled
+
+    parser = argparse.ArgumentParser(description="Diagnóstico de capturas")
+    parser.add_argument("images", nargs="*", default=["m1.png", "m5.png", "m15.png"])
+    parser.add_argument("--profile", metavar="OUT",
+                        help="Perfilar el diagnóstico por muestreo (.json = traza Chrome, si no pilas colapsadas)")
+    parser.add_argument("--profile-interval", type=float, default=DEFAULT_INTERVAL_MS,
+                        help="Milisegundos entre muestras del perfilador")
+    args = parser.parse_args()
+
+    profiling = profiled(args.profile, args.profile_interval) if args.profile else nullcontext()
+    with profiling:
+        diagnose_images(args.images)
\ No newline at end of file
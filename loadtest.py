@@ -0,0 +1,421 @@
+"""
+Prueba de carga HTTP del servidor de análisis (upload_capture)
+
+Simula traders concurrentes contra /upload, /status y /analyze, en proceso
+(servidor werkzeug multihilo en un puerto libre) o contra un servidor ya
+levantado. Cada usuario virtual se identifica con su propia X-Forwarded-For,
+así el límite por cliente se comporta como con traders reales.
+
+Patrones de llegada:
+- closed: cada usuario encadena peticiones sin pausa (mide capacidad)
+- poisson: llegadas aleatorias a --rate peticiones/s (carga abierta; la
+  latencia cuenta desde la llegada programada, incluida la espera en cola)
+- burst: ráfagas de --burst-size peticiones manteniendo --rate de media
+
+Informa throughput, p50/p95/p99 por endpoint, errores, rechazos 429/413 y
+CPU/RSS del servidor a lo largo del tiempo. Con el servidor en proceso
+(sin --url) la muestra es del proceso entero: servidor y generador juntos.
+
+    python loadtest.py --duration 30 --concurrency 8 --mix upload=1,status=3,analyze=1
+    python loadtest.py --url http://127.0.0.1:5000 --server-pid 1234 --arrival poisson --rate 5
+"""
+import http.client
+import json
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+TIMEFRAMES = ("m1", "m5", "m15")
+DEFAULT_MIX = {"upload": 1, "status": 3, "analyze": 1}
+DEFAULT_SIZES = ((1143, 590),)
+# Variantes distintas por tamaño (desplazamientos del gráfico, para que la
+# deduplicación perceptual no convierta toda la prueba en aciertos)
+DEFAULT_VARIANTS = 8
+# Segundos entre muestras de CPU/RSS del servidor
+SAMPLE_SECONDS = 1.0
+PERCENTILES = (50, 95, 99)
+CLIENT_HEADER = "X-Forwarded-For"
+
+
+# ==================== CARGA ====================
+
+def make_images(sizes, variants=DEFAULT_VARIANTS, seed=0, base="m5.png"):
+    """{(w, h): [bytes PNG, ...]} a partir de una captura real desplazada"""
+    rng = np.random.default_rng(seed)
+    source = cv2.imread(os.path.join(os.path.dirname(os.path.abspath(__file__)), base))
+    if source is None:
+        raise FileNotFoundError(f"Base image not found: {base}")
+
+    images = {}
+    for w, h in sizes:
+        frame = cv2.resize(source, (w, h), interpolation=cv2.INTER_AREA)
+        images[(w, h)] = [
+            cv2.imencode(".png", np.roll(frame, int(rng.integers(0, w)), axis=1))[1].tobytes()
+            for _ in range(variants)
+        ]
+    return images
+
+
+def encode_multipart(fields, files):
+    """Cuerpo multipart/form-data: fields {nombre: valor}, files [(campo, nombre, bytes)]"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for field, filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: image/png\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def build_request(endpoint, rng, images):
+    """(método, ruta, cuerpo, cabeceras) de una petición del endpoint"""
+    if endpoint == "status":
+        return "GET", "/status", None, {}
+
+    variants = images[rng.choice(list(images))]
+    if endpoint == "upload":
+        slot = rng.choice(TIMEFRAMES)
+        body, ctype = encode_multipart({"slot": slot}, [("file", f"{slot}.png", rng.choice(variants))])
+        return "POST", "/upload", body, {"Content-Type": ctype}
+
+    if endpoint == "analyze":
+        files = [(tf, f"{tf}.png", rng.choice(variants)) for tf in TIMEFRAMES]
+        body, ctype = encode_multipart({}, files)
+        return "POST", "/analyze?compact=1", body, {"Content-Type": ctype}
+
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+class Client:
+    """Conexión keep-alive de un usuario virtual"""
+
+    def __init__(self, base_url, client_id, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.client_id = client_id
+        self.conn = None
+
+    def request(self, method, path, body, headers):
+        headers = dict(headers, **{CLIENT_HEADER: self.client_id})
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # Conexión cerrada por el servidor entre peticiones: reintentar una vez
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# ==================== MÉTRICAS DEL SERVIDOR ====================
+
+def read_process(pid):
+    """(segundos de CPU, RSS en MB) desde /proc; None si no está disponible"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    return cpu, rss_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class ProcessSampler(threading.Thread):
+    """Muestrea %CPU y RSS de un proceso cada interval segundos"""
+
+    def __init__(self, pid, interval=SAMPLE_SECONDS):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        previous = read_process(self.pid)
+        last = start
+        while previous is not None and not self.stopped.wait(self.interval):
+            current = read_process(self.pid)
+            now = time.perf_counter()
+            if current is None:
+                break
+            self.samples.append({
+                "t": round(now - start, 2),
+                "cpu_pct": round(100 * (current[0] - previous[0]) / (now - last), 1),
+                "rss_mb": round(current[1], 1),
+            })
+            previous, last = current, now
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# ==================== EJECUCIÓN ====================
+
+def arrival_times(arrival, rate, duration, burst_size, rng):
+    """Instantes de llegada (s desde el inicio) para la carga abierta"""
+    times = []
+    t = 0.0
+    if arrival == "poisson":
+        while True:
+            t += rng.expovariate(rate)
+            if t >= duration:
+                return times
+            times.append(t)
+    if arrival == "burst":
+        period = burst_size / rate
+        while t < duration:
+            times.extend([t] * burst_size)
+            t += period
+        return times
+    raise ValueError(f"Unknown arrival pattern: {arrival}")
+
+
+def run_load(base_url, duration=10.0, concurrency=4, mix=None, arrival="closed", rate=5.0,
+             burst_size=10, images=None, seed=1):
+    """
+    Ejecuta la carga y devuelve una lista de
+    {"t", "endpoint", "latency", "status"} (status None = error de conexión)
+    """
+    mix = mix or DEFAULT_MIX
+    images = images or make_images(DEFAULT_SIZES)
+    endpoints = [name for name, weight in mix.items() for _ in range(weight)]
+    results = []
+    results_lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def execute(client, rng, endpoint, scheduled):
+        method, path, body, headers = build_request(endpoint, rng, images)
+        try:
+            status = client.request(method, path, body, headers)
+        except Exception:
+            status = None
+        finished = time.perf_counter()
+        with results_lock:
+            results.append({"t": round(scheduled - start, 3), "endpoint": endpoint,
+                            "latency": finished - scheduled, "status": status})
+
+    def closed_user(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(base_url, f"10.0.{index // 250}.{index % 250 + 1}")
+        while time.perf_counter() < deadline:
+            execute(client, rng, rng.choice(endpoints), time.perf_counter())
+        client.close()
+
+    def open_user(index, arrivals):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(base_url, f"10.0.{index // 250}.{index % 250 + 1}")
+        while True:
+            scheduled = arrivals.get()
+            if scheduled is None:
+                break
+            execute(client, rng, rng.choice(endpoints), scheduled)
+        client.close()
+
+    if arrival == "closed":
+        users = [threading.Thread(target=closed_user, args=(i,)) for i in range(concurrency)]
+        for user in users:
+            user.start()
+    else:
+        arrivals = queue.Queue()
+        users = [threading.Thread(target=open_user, args=(i, arrivals)) for i in range(concurrency)]
+        for user in users:
+            user.start()
+        for offset in arrival_times(arrival, rate, duration, burst_size, random.Random(seed)):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            arrivals.put(start + offset)
+        for _ in users:
+            arrivals.put(None)
+
+    for user in users:
+        user.join()
+    return results
+
+
+def start_in_process_server(upload_folder):
+    """Levanta upload_capture en un hilo; devuelve (url, servidor)"""
+    import logging
+    from werkzeug.serving import make_server
+    import upload_capture
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    upload_capture.app.config["UPLOAD_FOLDER"] = upload_folder
+    upload_capture.CLIENT_HEADER = CLIENT_HEADER
+    server = make_server("127.0.0.1", 0, upload_capture.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+# ==================== INFORME ====================
+
+def summarize(results, duration, samples=(), combined=False):
+    """
+    Throughput, percentiles de latencia y errores por endpoint y en total
+    combined: las muestras incluyen la CPU del propio generador de carga
+    """
+    def stats_for(rows):
+        latencies = np.array([r["latency"] for r in rows if r["status"] and r["status"] < 400]) * 1000
+        statuses = [r["status"] for r in rows]
+        summary = {
+            "requests": len(rows),
+            "ok": int(sum(1 for s in statuses if s and s < 400)),
+            "throughput_rps": round(len(rows) / duration, 2),
+            "rate_limited": statuses.count(429),
+            "too_large": statuses.count(413),
+            "errors": int(sum(1 for s in statuses if s is None or (s >= 400 and s not in (413, 429)))),
+        }
+        summary["error_rate"] = round(summary["errors"] / len(rows), 4) if rows else 0.0
+        for p in PERCENTILES:
+            summary[f"p{p}_ms"] = round(float(np.percentile(latencies, p)), 1) if latencies.size else None
+        return summary
+
+    report = {
+        "duration_s": round(duration, 2),
+        "total": stats_for(results),
+        "endpoints": {
+            name: stats_for([r for r in results if r["endpoint"] == name])
+            for name in sorted({r["endpoint"] for r in results})
+        },
+        "server": list(samples),
+        "server_scope": "server+client" if combined else "server",
+    }
+    if samples:
+        report["server_peak"] = {
+            "cpu_pct": max(s["cpu_pct"] for s in samples),
+            "rss_mb": max(s["rss_mb"] for s in samples),
+        }
+    return report
+
+
+def print_report(report):
+    print("\n" + "=" * 85)
+    print(f"     🔥 PRUEBA DE CARGA · {report['duration_s']} s")
+    print("=" * 85)
+    header = f"{'endpoint':10s} {'peticiones':>10s} {'rps':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'429':>5s} {'413':>5s} {'errores':>8s}"
+    print(header)
+    print("━" * 85)
+
+    def fmt(value):
+        return f"{value:.1f}" if value is not None else "—"
+
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for name, s in rows:
+        print(f"{name:10s} {s['requests']:>10d} {s['throughput_rps']:>7.2f} {fmt(s['p50_ms']):>8s} "
+              f"{fmt(s['p95_ms']):>8s} {fmt(s['p99_ms']):>8s} {s['rate_limited']:>5d} {s['too_large']:>5d} "
+              f"{s['errors']:>8d}")
+
+    if report["server"]:
+        print("━" * 85)
+        scope = "SERVIDOR + GENERADOR (en proceso)" if report["server_scope"] == "server+client" else "SERVIDOR"
+        print(f"🖥️  {scope} (CPU % · RSS MB):")
+        for sample in report["server"]:
+            print(f"   t={sample['t']:6.1f}s  {sample['cpu_pct']:6.1f}%  {sample['rss_mb']:8.1f} MB")
+        peak = report["server_peak"]
+        print(f"   pico: {peak['cpu_pct']:.1f}% CPU · {peak['rss_mb']:.1f} MB")
+    print("=" * 85)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def parse_sizes(text):
+    return tuple(tuple(int(v) for v in size.lower().split("x")) for size in text.split(","))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor de análisis")
+    parser.add_argument("--url", help="Servidor ya levantado (por defecto, uno en proceso)")
+    parser.add_argument("--server-pid", type=int, help="PID del servidor para medir CPU/RSS")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=4, help="Usuarios virtuales")
+    parser.add_argument("--mix", default="upload=1,status=3,analyze=1",
+                        help="Pesos por endpoint: upload, status, analyze")
+    parser.add_argument("--sizes", default="1143x590", help="Tamaños de imagen, p. ej. 1143x590,1920x1080")
+    parser.add_argument("--arrival", choices=("closed", "poisson", "burst"), default="closed")
+    parser.add_argument("--rate", type=float, default=5.0, help="Peticiones/s (poisson y burst)")
+    parser.add_argument("--burst-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Guardar el informe completo en JSON")
+    args = parser.parse_args()
+
+    images = make_images(parse_sizes(args.sizes), seed=args.seed)
+    upload_folder = None
+    server = None
+
+    if args.url:
+        url = args.url
+        pid = args.server_pid
+    else:
+        upload_folder = tempfile.mkdtemp(prefix="loadtest-")
+        url, server = start_in_process_server(upload_folder)
+        pid = os.getpid()
+
+    sampler = ProcessSampler(pid) if pid else None
+    if sampler:
+        sampler.start()
+
+    print(f"🚀 {args.arrival} · {args.concurrency} usuarios · {args.duration:.0f} s · {url}", file=sys.stderr)
+    started = time.perf_counter()
+    try:
+        results = run_load(url, args.duration, args.concurrency, parse_mix(args.mix), args.arrival,
+                           args.rate, args.burst_size, images, args.seed)
+    finally:
+        elapsed = time.perf_counter() - started
+        if sampler:
+            sampler.stop()
+        if server:
+            server.shutdown()
+        if upload_folder:
+            shutil.rmtree(upload_folder, ignore_errors=True)
+
+    # En proceso no se puede separar la CPU del servidor de la del generador
+    report = summarize(results, elapsed, sampler.samples if sampler else (), combined=server is not None)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
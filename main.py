@@ -7,226 +7,167 @@ Fecha: 2026
 import json
 import os
 import sys
-from datetime import datetime, timezone, timedelta
+import time
+from datetime import timedelta
 from pathlib import Path
-import random
+
+import numpy as np
 
 # ==================== IMPORTACIONES ====================
 try:
-    from image_analyzer import analyze_image
+    from image_analyzer import analyze_frame, analyze_image
+    from tiled_analyzer import analyze_image_tiled
+    from file_watcher import DEFAULT_POLL_SECONDS, open_watcher
+    from market_state import MarketState
+    from refresh_scheduler import RefreshScheduler
+    from signal_report import FORMATS, write_report
+    from signal_plan import (CONFIG, CONFIDENCE_BASE, SIGNALS_PER_PLAN, calculate_confluence_score,
+                             generate_trading_signals, get_ecuador_time, plan_inputs)
 except ImportError as e:
-    print(f"❌ Error crítico: Falta image_analyzer.py")
+    # e.name: el módulo que falta (o del que no se pudo importar un nombre)
+    module = e.name or "desconocido"
+    here = os.path.dirname(os.path.abspath(__file__))
+    if os.path.exists(os.path.join(here, f"{module}.py")):
+        print(f"❌ Error crítico: no se pudo importar desde {module}.py")
+    else:
+        print(f"❌ Error crítico: Falta el módulo {module}")
     print(f"   Detalle: {e}")
     sys.exit(1)
 
 # ==================== CONFIGURACIÓN ====================
-CONFIG = {
+# Las claves del plan (intervalo, confianzas, zona horaria) están en
+# signal_plan.CONFIG; este es el mismo diccionario con las de la CLI
+CONFIG.update({
     "images": {
         "m1": "m1.png",
         "m5": "m5.png",
         "m15": "m15.png"
     },
     "log_file": "signals.log",
-    "interval_minutes": 5,
     "total_hours": 2,
-    "signals_per_hour": 12,
-    "timezone_offset": -5,
-    "min_confidence": 65,
-    "max_confidence": 88,
-}
+    # Techo de memoria (MB) para analizar por franjas capturas muy anchas
+    # None = análisis completo en memoria
+    "max_memory_mb": None,
+    # Segundos entre refrescos de cada timeframe en el daemon; los que falten
+    # usan sus minutos × ANALYZER_REFRESH_BASE_SECONDS (ver refresh_scheduler)
+    "refresh_seconds": {},
+})
 
 # ==================== FUNCIONES AUXILIARES ====================
 
-def get_ecuador_time():
-    """Obtiene la hora actual en Ecuador (GMT-5)"""
-    utc_now = datetime.now(timezone.utc)
-    ecuador_tz = timezone(timedelta(hours=CONFIG["timezone_offset"]))
-    return utc_now.astimezone(ecuador_tz)
+def analyze_capture(filepath):
+    """Analiza una captura, por franjas si hay techo de memoria configurado"""
+    if CONFIG["max_memory_mb"] is not None:
+        return analyze_image_tiled(filepath, max_memory_mb=CONFIG["max_memory_mb"])
+    return analyze_image(filepath)
 
-def extract_trend_direction(trend_str):
-    """
-    Extrae dirección de tendencia de forma robusta
-    Retorna: UP, DOWN, o NEUTRAL
-    """
-    if not trend_str:
-        return "NEUTRAL"
-    
-    trend = str(trend_str).lower()
-    
-    # Palabras clave para tendencia alcista
-    bullish_keywords = ["alcista", "up", "bull", "subiendo", "positivo"]
-    if any(word in trend for word in bullish_keywords):
-        return "UP"
-    
-    # Palabras clave para tendencia bajista
-    bearish_keywords = ["bajista", "down", "bear", "bajando", "negativo"]
-    if any(word in trend for word in bearish_keywords):
-        return "DOWN"
-    
-    return "NEUTRAL"
+# ==================== SIMULACIÓN MONTE CARLO ====================
 
-def calculate_confluence_score(m1_dir, m5_dir, m15_dir, signal_type):
+def simulate_signal_plans(m1_data, m5_data, m15_data, n_plans=200_000, seed=None):
     """
-    Calcula el score de confluencia entre timeframes
-    Retorna: número de timeframes alineados (0-3)
+    Genera n_plans planes a la vez como arrays (n_plans, 24), con la misma
+    aritmética que generate_trading_signals pero con un generador NumPy:
+    - dominant: la señal sigue a la dominante
+    - buy: la señal es COMPRA
+    - confidence: confianza final (entero)
     """
-    aligned_count = 0
-    
-    if signal_type == "COMPRA":
-        if m1_dir == "UP": aligned_count += 1
-        if m5_dir == "UP": aligned_count += 1
-        if m15_dir == "UP": aligned_count += 1
-    elif signal_type == "VENTA":
-        if m1_dir == "DOWN": aligned_count += 1
-        if m5_dir == "DOWN": aligned_count += 1
-        if m15_dir == "DOWN": aligned_count += 1
-    
-    return aligned_count
+    inputs = plan_inputs(m1_data, m5_data, m15_data)
+    directions = inputs["directions"]
+    dominant_signal = inputs["dominant_signal"]
+    opposite_signal = "VENTA" if dominant_signal == "COMPRA" else "COMPRA"
+
+    rng = np.random.default_rng(seed)
+    shape = (n_plans, SIGNALS_PER_PLAN)
+    dominant = rng.random(shape) < CONFIG["dominant_probability"]
+    variance = rng.uniform(*CONFIG["confidence_variance"], size=shape)
+
+    # La confianza base solo depende de si la señal es la dominante o no
+    base_dominant = CONFIDENCE_BASE[calculate_confluence_score(*directions, dominant_signal)]
+    base_opposite = CONFIDENCE_BASE[calculate_confluence_score(*directions, opposite_signal)]
+    confidence_base = np.where(dominant, float(base_dominant), float(base_opposite))
+
+    i = np.arange(SIGNALS_PER_PLAN)
+    strength_bonus = (inputs["avg_strength"] - 40) / 40 * 8
+    middle_index = 11.5
+    position_bonus = (1 - (np.abs(i - middle_index) / middle_index)) * 5
+    time_degradation = -(i / 24) * 3
+
+    final_confidence = confidence_base + strength_bonus + position_bonus + time_degradation + variance
+    np.clip(final_confidence, CONFIG["min_confidence"], CONFIG["max_confidence"], out=final_confidence)
 
-# ==================== GENERADOR DE SEÑALES ====================
+    return {
+        "dominant": dominant,
+        "buy": dominant if dominant_signal == "COMPRA" else ~dominant,
+        "confidence": final_confidence.astype(np.int16),
+        "dominant_signal": dominant_signal,
+    }
 
-def generate_trading_signals(m1_data, m5_data, m15_data):
+def summarize_simulation(simulation, high_confidence=80, percentiles=(5, 25, 50, 75, 95)):
     """
-    Genera señales de trading para las próximas 2 horas (24 SEÑALES)
-    Sistema inteligente con variación garantizada
+    Estadísticas de la simulación:
+    - reparto esperado COMPRA/VENTA
+    - percentiles de confianza por señal (a partir de histogramas enteros)
+    - probabilidad de N señales de confianza alta en cada hora
     """
-    signals = []
-    base_time = get_ecuador_time()
-    
-    # ========== ANÁLISIS DE TENDENCIAS ==========
-    m1_direction = extract_trend_direction(m1_data.get("trend", "neutral"))
-    m5_direction = extract_trend_direction(m5_data.get("trend", "neutral"))
-    m15_direction = extract_trend_direction(m15_data.get("trend", "neutral"))
-    
-    # ========== NORMALIZACIÓN DE FUERZAS ==========
-    m1_strength = max(30, min(80, float(m1_data.get("strength", 50))))
-    m5_strength = max(30, min(80, float(m5_data.get("strength", 50))))
-    m15_strength = max(30, min(80, float(m15_data.get("strength", 50))))
-    
-    avg_strength = (m1_strength + m5_strength + m15_strength) / 3
-    
-    # ========== DETERMINACIÓN DE SEÑAL DOMINANTE ==========
-    trend_score = 0
-    
-    if m15_direction == "UP":
-        trend_score += 5
-    elif m15_direction == "DOWN":
-        trend_score -= 5
-    
-    if m5_direction == "UP":
-        trend_score += 3
-    elif m5_direction == "DOWN":
-        trend_score -= 3
-    
-    if m1_direction == "UP":
-        trend_score += 2
-    elif m1_direction == "DOWN":
-        trend_score -= 2
-    
-    dominant_signal = "COMPRA" if trend_score >= 0 else "VENTA"
-    
-    # ========== GENERAR 24 SEÑALES PARA 2 HORAS ==========
-    for i in range(24):  # ← ARREGLADO: Ahora genera 24 señales
-        # Calcular tiempo de la señal
-        minutes_offset = i * CONFIG["interval_minutes"]
-        signal_time = base_time + timedelta(minutes=minutes_offset)
-        time_str = signal_time.strftime('%H:%M')
-        
-        # ========== TIPO DE SEÑAL ==========
-        if random.random() < 0.65:
-            signal_type = dominant_signal
-        else:
-            signal_type = "VENTA" if dominant_signal == "COMPRA" else "COMPRA"
-        
-        # ========== CALCULAR CONFLUENCIA ==========
-        aligned_count = calculate_confluence_score(
-            m1_direction, m5_direction, m15_direction, signal_type
-        )
-        
-        # ========== CONFIANZA BASE ==========
-        if aligned_count == 3:
-            confidence_base = 83
-        elif aligned_count == 2:
-            confidence_base = 75
-        elif aligned_count == 1:
-            confidence_base = 69
-        else:
-            confidence_base = 66
-        
-        # ========== AJUSTES DE CONFIANZA ==========
-        strength_normalized = (avg_strength - 40) / 40
-        strength_bonus = strength_normalized * 8
-        
-        middle_index = 11.5  # Medio de 24 señales (0-23)
-        position_factor = 1 - (abs(i - middle_index) / middle_index)
-        position_bonus = position_factor * 5
-        
-        time_degradation = -(i / 24) * 3
-        random_variance = random.uniform(-2, 3)
-        
-        # ========== CONFIANZA FINAL ==========
-        final_confidence = (
-            confidence_base + 
-            strength_bonus + 
-            position_bonus + 
-            time_degradation + 
-            random_variance
-        )
-        
-        final_confidence = int(max(
-            CONFIG["min_confidence"], 
-            min(CONFIG["max_confidence"], final_confidence)
-        ))
-        
-        # ========== RECOMENDACIÓN DE TIMING ==========
-        timing_index = i % 12
-        
-        if timing_index in [0, 3, 6, 9]:
-            timing = "✅ Entra inmediatamente"
-            timing_emoji = "✅"
-        elif timing_index in [1, 4, 7, 10]:
-            timing = "📊 Momento aceptable"
-            timing_emoji = "📊"
-        elif timing_index in [2, 5, 8]:
-            timing = "⏳ Espera retroceso"
-            timing_emoji = "⏳"
-        else:
-            timing = "⚠️ Opera con precaución"
-            timing_emoji = "⚠️"
-        
-        # ========== INDICADOR VISUAL DE CONFLUENCIA ==========
-        if aligned_count == 3:
-            confluence_visual = " ✅✅✅"
-        elif aligned_count == 2:
-            confluence_visual = " ✅✅"
-        elif aligned_count == 1:
-            confluence_visual = " ✅"
-        else:
-            confluence_visual = ""
-        
-        signal_emoji = "📈" if signal_type == "COMPRA" else "📉"
-        
-        # ========== CREAR OBJETO DE SEÑAL ==========
-        signal_object = {
-            "time": time_str,
-            "timestamp": signal_time.isoformat(),
-            "signal": signal_type,
-            "confidence": final_confidence,
-            "aligned_count": aligned_count,
-            "confluence_pct": round((aligned_count / 3) * 100, 1),
-            "timing": timing,
-            "timing_emoji": timing_emoji,
-            "line": f"{time_str} {signal_emoji} {signal_type:6s} — {final_confidence}%{confluence_visual} | {timing}",
-            "metadata": {
-                "avg_strength": round(avg_strength, 1),
-                "position_index": i,
-                "hour": 1 if i < 12 else 2
-            }
+    confidence = simulation["confidence"]
+    n_plans, n_signals = confidence.shape
+    low, high = CONFIG["min_confidence"], CONFIG["max_confidence"]
+    levels = high - low + 1
+
+    # Histograma por señal en una sola pasada: (señal, confianza) -> recuento
+    flat = (confidence - low).astype(np.int64) + np.arange(n_signals) * levels
+    histogram = np.bincount(flat.ravel(), minlength=n_signals * levels).reshape(n_signals, levels)
+    cdf = np.cumsum(histogram, axis=1) / n_plans
+    slot_percentiles = {
+        p: (np.argmax(cdf >= p / 100, axis=1) + low).tolist() for p in percentiles
+    }
+
+    is_high = confidence >= high_confidence
+    per_hour = n_signals // 2
+    hours = {}
+    for hour, block in enumerate((is_high[:, :per_hour], is_high[:, per_hour:]), start=1):
+        counts = np.bincount(block.sum(axis=1), minlength=per_hour + 1) / n_plans
+        hours[hour] = {
+            "mean": round(float(np.dot(np.arange(per_hour + 1), counts)), 3),
+            "distribution": counts.round(5).tolist(),
+            "at_least": np.cumsum(counts[::-1])[::-1].round(5).tolist(),
         }
-        
-        signals.append(signal_object)
-    
-    return signals
+
+    buy_pct = float(simulation["buy"].mean()) * 100
+    return {
+        "plans": n_plans,
+        "dominant_signal": simulation["dominant_signal"],
+        "buy_pct": round(buy_pct, 2),
+        "sell_pct": round(100 - buy_pct, 2),
+        "mean_confidence": (histogram @ np.arange(low, high + 1) / n_plans).round(2).tolist(),
+        "percentiles": slot_percentiles,
+        "high_confidence": high_confidence,
+        "high_per_hour": hours,
+    }
+
+def print_simulation(summary):
+    """Imprime el informe de la simulación"""
+    print("\n" + "="*85)
+    print(f"     🎲 SIMULACIÓN MONTE CARLO · {summary['plans']:,} planes")
+    print("="*85)
+    print(f"\n💹 Reparto esperado: 📈 COMPRA {summary['buy_pct']:.1f}% · "
+          f"📉 VENTA {summary['sell_pct']:.1f}% (dominante: {summary['dominant_signal']})")
+
+    percentiles = summary["percentiles"]
+    keys = sorted(percentiles)
+    print("\n📈 CONFIANZA POR SEÑAL (percentiles):")
+    print("   #   " + " ".join(f"p{p:<4d}" for p in keys) + " media")
+    for i, mean in enumerate(summary["mean_confidence"]):
+        values = " ".join(f"{percentiles[p][i]:<5d}" for p in keys)
+        print(f"   {i + 1:<3d} {values} {mean:.1f}")
+
+    print(f"\n🔥 SEÑALES CON CONFIANZA ≥ {summary['high_confidence']}% POR HORA:")
+    for hour, stats in summary["high_per_hour"].items():
+        print(f"   Hora {hour}: media {stats['mean']:.2f}")
+        for n, p in enumerate(stats["at_least"]):
+            if n and p >= 0.0005:
+                print(f"      ≥{n:2d}: {p:7.2%}")
+    print("="*85)
 
 # ==================== VISUALIZACIÓN ====================
 
@@ -268,96 +209,12 @@ def print_header():
     print("="*85)
     print()
 
-def display_signals(signals):
-    """Muestra las señales organizadas por hora"""
-    
-    print("🎯 SEÑALES PARA LAS PRÓXIMAS 2 HORAS:\n")
-    
-    hour1 = [s for s in signals if s['metadata']['hour'] == 1]
-    hour2 = [s for s in signals if s['metadata']['hour'] == 2]
-    
-    print("━" * 85)
-    print("⏰ PRIMERA HORA (12 señales)")
-    print("━" * 85)
-    display_hour_signals(hour1)
-    
-    print("\n━" * 85)
-    print("⏰ SEGUNDA HORA (12 señales)")
-    print("━" * 85)
-    display_hour_signals(hour2)
-    
-    print_summary(signals)
-
-def display_hour_signals(hour_signals):
-    """Muestra señales de una hora específica"""
-    
-    high = [s for s in hour_signals if s['confidence'] >= 80]
-    medium = [s for s in hour_signals if 70 <= s['confidence'] < 80]
-    acceptable = [s for s in hour_signals if s['confidence'] < 70]
-    
-    if high:
-        print("\n🔥 CONFIANZA ALTA (80-88%):")
-        for signal in high:
-            print(f"   {signal['line']}")
-    
-    if medium:
-        print("\n⭐ CONFIANZA BUENA (70-79%):")
-        for signal in medium:
-            print(f"   {signal['line']}")
-    
-    if acceptable:
-        print("\n📊 CONFIANZA ACEPTABLE (65-69%):")
-        for signal in acceptable:
-            print(f"   {signal['line']}")
-
-def print_summary(signals):
-    """Imprime resumen estadístico"""
-    
-    total = len(signals)
-    compras = sum(1 for s in signals if s['signal'] == 'COMPRA')
-    ventas = total - compras
-    
-    avg_conf = sum(s['confidence'] for s in signals) / total
-    min_conf = min(s['confidence'] for s in signals)
-    max_conf = max(s['confidence'] for s in signals)
-    
-    high = sum(1 for s in signals if s['confidence'] >= 80)
-    medium = sum(1 for s in signals if 70 <= s['confidence'] < 80)
-    acceptable = sum(1 for s in signals if s['confidence'] < 70)
-    
-    immediate = sum(1 for s in signals if "inmediatamente" in s['timing'].lower())
-    wait = sum(1 for s in signals if "espera" in s['timing'].lower())
-    caution = sum(1 for s in signals if "precaución" in s['timing'].lower())
-    normal = total - immediate - wait - caution
-    
-    print("\n" + "="*85)
-    print("     📋 RESUMEN ESTADÍSTICO")
-    print("="*85)
-    
-    print(f"\n📊 TOTAL: {total} señales (2 horas)")
-    print(f"   • Hora 1: 12 señales")
-    print(f"   • Hora 2: 12 señales")
-    
-    print(f"\n💹 DISTRIBUCIÓN:")
-    print(f"   • 📈 COMPRA: {compras} ({compras*100//total}%)")
-    print(f"   • 📉 VENTA: {ventas} ({ventas*100//total}%)")
-    
-    print(f"\n📈 CONFIANZA:")
-    print(f"   • Promedio: {avg_conf:.1f}%")
-    print(f"   • Rango: {min_conf}%-{max_conf}%")
-    
-    print(f"\n🎯 POR NIVEL:")
-    print(f"   • 🔥 Alta: {high} ({high*100//total}%)")
-    print(f"   • ⭐ Buena: {medium} ({medium*100//total}%)")
-    print(f"   • 📊 Aceptable: {acceptable} ({acceptable*100//total}%)")
-    
-    print(f"\n⏱️  TIMING:")
-    print(f"   • ✅ Inmediato: {immediate}")
-    print(f"   • 📊 Aceptable: {normal}")
-    print(f"   • ⏳ Esperar: {wait}")
-    print(f"   • ⚠️ Precaución: {caution}")
-    
-    print("\n" + "="*85)
+def display_signals(signals, report_format="terminal", report_out=None):
+    """Muestra las señales organizadas por hora (ver signal_report)"""
+    write_report(signals, report_format, report_out,
+                 title="🎯 SEÑALES PARA LAS PRÓXIMAS 2 HORAS")
+    if report_out:
+        print(f"\n📝 Informe {report_format} guardado en: {report_out}")
 
 def save_to_log(signals):
     """Guarda señales en log"""
@@ -381,9 +238,124 @@ def save_to_log(signals):
         print(f"\n⚠️ Error al guardar: {e}")
         return False
 
+# ==================== MODO DAEMON ====================
+
+def diff_plans(old_signals, new_signals):
+    """Líneas que cambian entre dos planes, emparejadas por hora de la señal"""
+    old_by_time = {s["time"]: s for s in old_signals}
+    new_times = {s["time"] for s in new_signals}
+    lines = []
+
+    for signal in new_signals:
+        old = old_by_time.get(signal["time"])
+        if old is None:
+            lines.append(f"+ {signal['line']}")
+        elif (old["signal"], old["confidence"], old["timing"]) != (
+                signal["signal"], signal["confidence"], signal["timing"]):
+            lines.append(f"~ {signal['line']}   (antes: {old['signal']} {old['confidence']}%)")
+
+    for signal in old_signals:
+        if signal["time"] not in new_times:
+            lines.append(f"- {signal['line']}")
+
+    return lines
+
+def run_daemon(hours=None, poll_seconds=DEFAULT_POLL_SECONDS, seed=None):
+    """
+    Vigila CONFIG["images"] y regenera el plan cuando se re-analiza alguna
+    captura o cada interval_minutes; imprime solo las diferencias con el plan
+    anterior. Cada timeframe se re-analiza a su propia cadencia
+    (refresh_scheduler), o antes si su gráfico cambia de verdad. El plan se genera con las medias de cada timeframe
+    (market_state), no con la última captura suelta. Con seed, los planes
+    son reproducibles y solo cambian al cambiar las medias o la ventana.
+    Termina tras total_hours (0 = sin límite) o con Ctrl+C
+    """
+    try:
+        import schedule
+    except ImportError:
+        raise SystemExit("❌ El modo daemon requiere schedule: pip install schedule")
+
+    hours = CONFIG["total_hours"] if hours is None else hours
+    deadline = time.monotonic() + hours * 3600 if hours else None
+    timeframes = list(CONFIG["images"])
+
+    due = {"interval": False}
+    job = schedule.every(CONFIG["interval_minutes"]).minutes.do(lambda: due.update(interval=True))
+    watcher = open_watcher(list(CONFIG["images"].values()), poll_seconds)
+
+    # Con análisis en memoria, la huella de la excepción on-change sale del
+    # mismo frame; por franjas no se decodifica entera y no hay excepción
+    in_memory = CONFIG["max_memory_mb"] is None
+    scheduler = RefreshScheduler(CONFIG["images"], analyze_capture, CONFIG["refresh_seconds"],
+                                 analyze_frame=analyze_frame if in_memory else None)
+    cadences = " · ".join(f"{tf.upper()} {seconds:g}s" for tf, seconds in scheduler.cadences.items())
+
+    print(f"👀 Vigilando {', '.join(CONFIG['images'].values())} ({watcher.backend}) · "
+          f"plan cada {CONFIG['interval_minutes']} min · "
+          f"{f'{hours} h' if hours else 'sin límite'}")
+    print(f"🔁 Refresco: {cadences}")
+
+    latest = {}
+    market = MarketState()
+    plan = []
+    waiting_reported = False
+
+    try:
+        while True:
+            changed = scheduler.poll(wait=True)
+            for timeframe in changed:
+                analysis = scheduler.analysis(timeframe)
+                previous = latest.get(timeframe)
+                if previous is not None:
+                    print(f"🔄 {timeframe.upper()}: {previous.get('trend')} {previous.get('strength', 0):.1f}% "
+                          f"→ {analysis.get('trend')} {analysis.get('strength', 0):.1f}%")
+                latest[timeframe] = analysis
+                market.update(timeframe, analysis)
+            missing = [tf.upper() for tf in timeframes if tf not in latest]
+
+            if missing:
+                if not waiting_reported:
+                    print(f"⏳ Esperando capturas: {', '.join(missing)}")
+                    waiting_reported = True
+            elif changed or due["interval"]:
+                reason = f"cambio en {', '.join(tf.upper() for tf in changed)}" if changed else "intervalo"
+                new_plan = generate_trading_signals(*(market.snapshot(tf) for tf in timeframes), seed=seed)
+                lines = diff_plans(plan, new_plan)
+
+                stamp = get_ecuador_time().strftime('%H:%M:%S')
+                print(f"\n🕐 {stamp} · plan regenerado ({reason}) · {len(lines)} cambios")
+                for line in lines:
+                    print(f"   {line}")
+
+                save_to_log(new_plan)
+                plan = new_plan
+            due["interval"] = False
+
+            timeout = min(schedule.idle_seconds(), scheduler.idle_seconds())
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                timeout = min(timeout, remaining)
+
+            if timeout > 0:
+                paths = watcher.wait(timeout)
+                if paths:
+                    scheduler.notify(paths)
+            schedule.run_pending()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        schedule.cancel_job(job)
+
+    report = scheduler.report()
+    print(f"\n👋 Daemon detenido · {report['refreshes']} análisis para "
+          f"{report['changes']} versiones de capturas ({report['saved']} evitados)")
+
 # ==================== FUNCIÓN PRINCIPAL ====================
 
-def main():
+def main(report_format="terminal", report_out=None):
     """Función principal"""
     
     print_header()
@@ -401,9 +373,9 @@ def main():
     print("🔍 Analizando capturas...")
     
     try:
-        m1_data = analyze_image(CONFIG["images"]["m1"])
-        m5_data = analyze_image(CONFIG["images"]["m5"])
-        m15_data = analyze_image(CONFIG["images"]["m15"])
+        m1_data = analyze_capture(CONFIG["images"]["m1"])
+        m5_data = analyze_capture(CONFIG["images"]["m5"])
+        m15_data = analyze_capture(CONFIG["images"]["m15"])
         
         print("✅ Análisis completado\n")
         
@@ -434,7 +406,7 @@ def main():
         
         signals = generate_trading_signals(m1_data, m5_data, m15_data)
         
-        display_signals(signals)
+        display_signals(signals, report_format, report_out)
         save_to_log(signals)
         
         print("\n✅ 24 señales listas para 2 horas")
@@ -447,5 +419,43 @@ def main():
         traceback.print_exc()
         sys.exit(1)
 
+def run_cli(args):
+    if args.simulate:
+        analyses = [analyze_capture(CONFIG["images"][tf]) for tf in ("m1", "m5", "m15")]
+        started = time.perf_counter()
+        summary = summarize_simulation(simulate_signal_plans(*analyses, args.simulate, args.seed))
+        elapsed = time.perf_counter() - started
+        print_simulation(summary)
+        print(f"⏱️  {args.simulate:,} planes en {elapsed * 1000:.0f} ms")
+    elif args.daemon:
+        run_daemon(args.hours, args.poll, args.seed)
+    else:
+        main(args.format, args.out)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    from contextlib import nullcontext
+    from profiler import DEFAULT_INTERVAL_MS, profiled
+
+    parser = argparse.ArgumentParser(description="Bot de señales de trading")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Vigilar las capturas y regenerar el plan al cambiar")
+    parser.add_argument("--hours", type=float,
+                        help="Duración del daemon en horas (0 = sin límite)")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_SECONDS,
+                        help="Segundos entre comprobaciones si no hay inotify")
+    parser.add_argument("--simulate", type=int, metavar="N",
+                        help="Simular N planes y mostrar su distribución")
+    parser.add_argument("--format", choices=FORMATS, default="terminal",
+                        help="Formato del informe de señales")
+    parser.add_argument("--out", help="Guardar el informe en un archivo")
+    parser.add_argument("--seed", type=int, help="Semilla de la simulación o de los planes del daemon")
+    parser.add_argument("--profile", metavar="OUT",
+                        help="Perfilar la ejecución por muestreo (.json = traza Chrome, si no pilas colapsadas)")
+    parser.add_argument("--profile-interval", type=float, default=DEFAULT_INTERVAL_MS,
+                        help="Milisegundos entre muestras del perfilador")
+    args = parser.parse_args()
+
+    profiling = profiled(args.profile, args.profile_interval) if args.profile else nullcontext()
+    with profiling:
+        run_cli(args)
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+Estado de mercado acumulado por timeframe entre capturas sucesivas
+
+Cada análisis es independiente: una sola captura ruidosa puede invertir la
+señal dominante. Aquí cada timeframe mantiene medias exponenciales (EWMA) de
+la dirección de la tendencia, la fuerza y la volatilidad, actualizadas en
+O(1) por captura, y un buffer circular de tamaño fijo con los valores
+recientes. El generador de señales lee el estado suavizado en lugar del
+último análisis suelto.
+
+Sin path el estado vive en el proceso. Con path se guarda en un JSON que
+comparten todos los procesos (p. ej. los workers de gunicorn): cada
+actualización lo relee si otro proceso lo cambió, bloquea el archivo
+(fcntl, POSIX) y lo sustituye de forma atómica; las lecturas solo lo
+releen si cambió.
+"""
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl  # opcional: bloqueo entre procesos (POSIX)
+except ImportError:
+    fcntl = None
+
+MARKET_STATE = {
+    # Peso de la captura nueva en las medias exponenciales
+    "alpha": 0.3,
+    # |dirección media| mínima para considerar la tendencia alcista/bajista
+    "trend_threshold": 0.35,
+    # Capturas recientes conservadas por timeframe
+    "history": 32,
+}
+
+DIRECTION_SCORES = {"alcista": 1.0, "bajista": -1.0}
+
+
+def direction_score(trend):
+    """+1 alcista, -1 bajista, 0 lateral (admite 'alcista_fuerte', etc.)"""
+    trend = str(trend or "").lower()
+    for word, score in DIRECTION_SCORES.items():
+        if word in trend:
+            return score
+    return 0.0
+
+
+class RingBuffer:
+    """Últimos capacity registros en arrays NumPy de tamaño fijo"""
+
+    FIELDS = ("timestamp", "direction", "strength", "volatility")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, len(self.FIELDS)), dtype=np.float64)
+        self.count = 0
+
+    def push(self, values):
+        self.data[self.count % self.capacity] = values
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def latest(self):
+        """Registros en orden cronológico (del más antiguo al más reciente)"""
+        if self.count <= self.capacity:
+            return self.data[:self.count].copy()
+        start = self.count % self.capacity
+        return np.concatenate((self.data[start:], self.data[:start]))
+
+
+class TimeframeState:
+    """Medias exponenciales y recientes de un timeframe"""
+
+    def __init__(self, alpha=None, history=None):
+        self.alpha = MARKET_STATE["alpha"] if alpha is None else alpha
+        self.history = RingBuffer(MARKET_STATE["history"] if history is None else history)
+        self.direction = 0.0
+        self.strength = 0.0
+        self.volatility = 0.0
+        self.samples = 0
+        self.last = None
+
+    def update(self, analysis, timestamp=None):
+        """Incorpora un análisis nuevo en O(1)"""
+        direction = direction_score(analysis.get("trend"))
+        strength = float(analysis.get("strength", 0.0))
+        volatility = float(analysis.get("volatility_score", 0.0))
+
+        if self.samples == 0:
+            self.direction, self.strength, self.volatility = direction, strength, volatility
+        else:
+            a = self.alpha
+            self.direction += a * (direction - self.direction)
+            self.strength += a * (strength - self.strength)
+            self.volatility += a * (volatility - self.volatility)
+
+        self.samples += 1
+        self.last = analysis
+        self.history.push((timestamp or time.time(), direction, strength, volatility))
+
+    def snapshot(self):
+        """Análisis suavizado con las claves que usa el generador de señales"""
+        threshold = MARKET_STATE["trend_threshold"]
+        if self.direction >= threshold:
+            trend = "alcista"
+        elif self.direction <= -threshold:
+            trend = "bajista"
+        else:
+            trend = "lateral"
+        return {
+            "trend": trend,
+            "strength": round(self.strength, 2),
+            "volatility_score": round(self.volatility, 2),
+            "direction_score": round(self.direction, 3),
+            "samples": self.samples,
+            "last_trend": self.last.get("trend") if self.last else None,
+        }
+
+    def to_dict(self):
+        """Estado serializable (del análisis anterior solo se guarda la tendencia)"""
+        return {
+            "alpha": self.alpha,
+            "capacity": self.history.capacity,
+            "direction": self.direction,
+            "strength": self.strength,
+            "volatility": self.volatility,
+            "samples": self.samples,
+            "last_trend": self.last.get("trend") if self.last else None,
+            "history": self.history.latest().tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data["alpha"], data["capacity"])
+        state.direction = data["direction"]
+        state.strength = data["strength"]
+        state.volatility = data["volatility"]
+        state.samples = data["samples"]
+        if data["last_trend"] is not None:
+            state.last = {"trend": data["last_trend"]}
+        for row in data["history"]:
+            state.history.push(row)
+        return state
+
+
+class MarketState:
+    """
+    Estado por timeframe (o símbolo:timeframe), seguro entre hilos
+    path: JSON compartido entre procesos (None = estado propio del proceso)
+    """
+
+    def __init__(self, alpha=None, history_size=None, path=None):
+        self.alpha = alpha
+        self.history_size = history_size
+        self.path = path
+        self._states = {}
+        self._version = None  # (inodo, mtime, tamaño) del JSON cargado
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Relee el JSON compartido si cambió desde la última carga"""
+        if self.path is None:
+            return
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            self._states, self._version = {}, None
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            version = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if version != self._version:
+                data = json.load(f)
+                self._states = {key: TimeframeState.from_dict(state) for key, state in data.items()}
+                self._version = version
+
+    def _save(self):
+        """Sustituye el JSON de forma atómica (los lectores nunca ven uno a medias)"""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=".market_state-", suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({key: state.to_dict() for key, state in self._states.items()}, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            raise
+        st = os.stat(self.path)
+        self._version = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    @contextlib.contextmanager
+    def _reading(self):
+        with self._lock:
+            self._load()
+            yield
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """Sección exclusiva entre hilos y, con path, entre procesos"""
+        with self._lock:
+            if self.path is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # Bajo el bloqueo siempre se relee: la versión podría repetirse
+                # si otro proceso reutilizó el inodo en el mismo tick de reloj
+                self._version = None
+                self._load()
+                yield
+                self._save()
+
+    def update(self, key, analysis, timestamp=None, only_if_new=False):
+        """
+        Incorpora el análisis y devuelve el estado suavizado de key
+        only_if_new: solo lo incorpora si key aún no tiene historial
+        """
+        with self._reading():
+            state = self._states.get(key)
+            if only_if_new and state is not None:
+                return state.snapshot()
+        with self._writing():
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = TimeframeState(self.alpha, self.history_size)
+            elif only_if_new:
+                return state.snapshot()
+            state.update(analysis, timestamp)
+            return state.snapshot()
+
+    def clear(self):
+        """Olvida todo el historial (también el del JSON compartido)"""
+        with self._writing():
+            self._states = {}
+
+    def snapshot(self, key):
+        with self._reading():
+            state = self._states.get(key)
+            return state.snapshot() if state else None
+
+    def history(self, key):
+        """Array (n, 4): timestamp, dirección, fuerza, volatilidad"""
+        with self._reading():
+            state = self._states.get(key)
+            return state.history.latest() if state else np.empty((0, len(RingBuffer.FIELDS)))
+
+    def report(self):
+        with self._reading():
+            return {key: state.snapshot() for key, state in self._states.items()}
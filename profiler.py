@@ -0,0 +1,276 @@
+"""
+Perfilador por muestreo para diagnosticar latencia sin reiniciar
+
+Un hilo de fondo toma cada interval_ms las pilas de todos los hilos del
+proceso (sys._current_frames) y las cuenta. No instrumenta nada: el coste
+es recorrer unas pocas pilas por muestra, así que puede activarse sobre
+tráfico real. Las llamadas a los detectores de image_analyzer se etiquetan
+con su nombre ("detector:trend"), lo que da el reparto de tiempo por
+detector aunque corran en el pool de hilos.
+
+Salidas:
+- collapsed: "hilo;marco;marco N" por línea (flamegraph.pl, speedscope)
+- chrome: JSON de eventos de traza (chrome://tracing, Perfetto)
+- json: resumen con muestras por detector y funciones más calientes
+
+    python main.py --profile perfil.folded
+    python image_analyzer.py m1.png --profile traza.json
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Milisegundos entre muestras
+DEFAULT_INTERVAL_MS = float(os.environ.get("ANALYZER_PROFILE_INTERVAL_MS", 5))
+FORMATS = ("collapsed", "chrome", "json")
+# Marcos hoja de un hilo parado esperando trabajo: esas muestras se descartan
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+    ("connection.py", "_recv"),
+    ("connection.py", "wait"),
+}
+# Funciones más calientes que incluye el resumen
+TOP_FUNCTIONS = 20
+
+
+def detector_call_code():
+    from detector_registry import Detector
+    return Detector.__call__.__code__
+
+
+class SamplingProfiler:
+    """
+    Muestreo de pilas en un hilo de fondo
+    Con max_requests se detiene solo tras ese número de peticiones
+    (ver count_request), o al agotar duration
+    """
+
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS, include_idle=False,
+                 keep_timeline=True, max_requests=None):
+        self.interval = interval_ms / 1000.0
+        self.include_idle = include_idle
+        self.keep_timeline = keep_timeline
+        self.max_requests = max_requests
+        self.stacks = Counter()       # (hilo, marcos) -> muestras
+        self.timeline = []            # (t, id de hilo, marcos) para la traza
+        self.thread_names = {}
+        self.samples = 0
+        self.requests = 0
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        self._labels = {}             # código -> etiqueta
+        self._detector_code = detector_call_code()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- muestreo ----------
+
+    def label(self, frame):
+        code = frame.f_code
+        if code is self._detector_code:
+            detector = frame.f_locals.get("self")
+            return f"detector:{getattr(detector, 'name', '?')}"
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = self._labels[code] = f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        return label
+
+    def idle(self, frame):
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+    def sample(self):
+        now = time.perf_counter()
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        taken = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (not self.include_idle and self.idle(frame)):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            taken.append((ident, names.get(ident, str(ident)), tuple(stack)))
+
+        with self._lock:
+            self.samples += 1
+            for ident, name, stack in taken:
+                self.thread_names[ident] = name
+                self.stacks[(name, stack)] += 1
+                if self.keep_timeline:
+                    self.timeline.append((now - self.started, ident, stack))
+
+    def run(self, duration):
+        deadline = self.started + duration if duration else None
+        while not self.done.is_set():
+            self.sample()
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            self.done.wait(self.interval)
+        self.finished = time.perf_counter()
+        self.done.set()
+
+    def start(self, duration=None):
+        """Empieza a muestrear; duration en segundos (None = hasta stop())"""
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self.run, args=(duration,),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def wait(self, timeout=None):
+        """Espera a que termine (duración o peticiones) y lo detiene"""
+        self.done.wait(timeout)
+        return self.stop()
+
+    def count_request(self):
+        """Una petición atendida; al llegar a max_requests se detiene"""
+        with self._lock:
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self.done.set()
+
+    # ---------- exportación ----------
+
+    def collapsed(self):
+        """Formato de pilas colapsadas de flamegraph.pl"""
+        with self._lock:
+            items = sorted(self.stacks.items())
+        return "".join(f"{name};{';'.join(stack)} {count}\n" for (name, stack), count in items)
+
+    def chrome_trace(self):
+        """
+        Eventos B/E de Chrome: en cada muestra se cierran los marcos que ya no
+        están en la pila del hilo y se abren los nuevos
+        """
+        pid = os.getpid()
+        with self._lock:
+            timeline = list(self.timeline)
+            names = dict(self.thread_names)
+        end = ((self.finished or time.perf_counter()) - self.started) * 1e6
+
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in names.items()]
+        open_stacks = {}
+        last_seen = {}
+        for t, tid, stack in timeline:
+            ts = t * 1e6
+            previous = open_stacks.get(tid, ())
+            # Un hilo que no aparece en la muestra anterior estaba inactivo
+            if previous and last_seen.get(tid) is not None and ts - last_seen[tid] > 2.5 * self.interval * 1e6:
+                events.extend(self._close(previous, 0, last_seen[tid] + self.interval * 1e6, pid, tid))
+                previous = ()
+            common = 0
+            while common < min(len(previous), len(stack)) and previous[common] == stack[common]:
+                common += 1
+            events.extend(self._close(previous, common, ts, pid, tid))
+            events.extend({"name": frame, "ph": "B", "ts": ts, "pid": pid, "tid": tid}
+                          for frame in stack[common:])
+            open_stacks[tid] = stack
+            last_seen[tid] = ts
+        for tid, stack in open_stacks.items():
+            events.extend(self._close(stack, 0, min(end, last_seen[tid] + self.interval * 1e6), pid, tid))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    @staticmethod
+    def _close(stack, keep, ts, pid, tid):
+        return [{"name": frame, "ph": "E", "ts": ts, "pid": pid, "tid": tid}
+                for frame in reversed(stack[keep:])]
+
+    def summary(self):
+        """Muestras por detector y funciones con más tiempo propio"""
+        with self._lock:
+            items = list(self.stacks.items())
+            samples, requests = self.samples, self.requests
+        duration = (self.finished or time.perf_counter()) - self.started
+        interval_ms = self.interval * 1000
+
+        detectors = Counter()
+        leaves = Counter()
+        total = 0
+        for (_, stack), count in items:
+            total += count
+            leaves[stack[-1]] += count
+            # El detector más interno de la pila se lleva la muestra
+            for frame in reversed(stack):
+                if frame.startswith("detector:"):
+                    detectors[frame.split(":", 1)[1]] += count
+                    break
+
+        def shares(counter, limit=None):
+            # Listas ordenadas de más a menos muestras (los dict JSON se reordenan)
+            return [{"name": name, "samples": count,
+                     "pct": round(count * 100 / total, 1) if total else 0.0,
+                     "ms": round(count * interval_ms, 1)}
+                    for name, count in counter.most_common(limit)]
+
+        return {
+            "duration_s": round(duration, 3),
+            "interval_ms": interval_ms,
+            "samples": samples,
+            "thread_samples": total,
+            "requests": requests,
+            "detectors": shares(detectors),
+            "top_functions": shares(leaves, TOP_FUNCTIONS),
+        }
+
+    def export(self, fmt="collapsed"):
+        """Texto del perfil en el formato pedido"""
+        if fmt == "collapsed":
+            return self.collapsed()
+        if fmt == "chrome":
+            return json.dumps(self.chrome_trace())
+        if fmt == "json":
+            return json.dumps(self.summary(), ensure_ascii=False, indent=2)
+        raise ValueError(f"Unknown profile format: {fmt}")
+
+
+def format_for_path(path):
+    """.json -> traza de Chrome; cualquier otra extensión -> collapsed"""
+    return "chrome" if path.lower().endswith(".json") else "collapsed"
+
+
+def print_summary(summary, out=sys.stderr):
+    lines = [f"🔬 Perfil: {summary['samples']} muestras en {summary['duration_s']:.2f} s "
+             f"(cada {summary['interval_ms']:g} ms)"]
+    if summary["detectors"]:
+        lines.append("   Detectores:")
+        lines.extend(f"   • {entry['name']:15s} {entry['pct']:5.1f}%  ~{entry['ms']:.0f} ms"
+                     for entry in summary["detectors"])
+    lines.append("   Funciones más calientes (tiempo propio):")
+    lines.extend(f"   • {entry['pct']:5.1f}%  {entry['name']}" for entry in summary["top_functions"][:8])
+    out.write("\n".join(lines) + "\n")
+
+
+@contextmanager
+def profiled(path, interval_ms=DEFAULT_INTERVAL_MS):
+    """Perfila el bloque y guarda el resultado en path (formato por extensión)"""
+    profiler = SamplingProfiler(interval_ms, keep_timeline=format_for_path(path) == "chrome").start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.export(format_for_path(path)))
+        print_summary(profiler.summary())
+        print(f"💾 Perfil guardado en: {path}", file=sys.stderr)
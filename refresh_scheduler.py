@@ -0,0 +1,365 @@
+"""
+Refresco por timeframe para capturas continuas
+
+Un gráfico M15 cambia mucho menos que uno M1, así que no tiene sentido
+analizar los tres cada vez que se reescribe una captura. Cada timeframe
+tiene su cadencia (por defecto sus minutos × REFRESH_BASE_SECONDS: M1 cada
+minuto, M15 cada cuarto de hora) y una prioridad (la cadencia más corta
+primero). Al vencer, el timeframe solo se re-analiza si su archivo cambió.
+
+Excepción (on-change): si una captura cambia antes de su turno se compara
+la huella de su franja derecha (frame_dedup.edge_fingerprint, donde
+aparecen las velas nuevas) con la del último análisis; si difiere en más de
+OVERRIDE_DISTANCE bits el gráfico cambió de verdad y el refresco se
+adelanta. La huella del análisis sale del mismo frame decodificado
+(analyze_frame); sin analyze_frame no hay excepción. Los análisis corren en un pool de hilos compartido que atiende
+primero el plazo más cercano (EDF).
+
+    scheduler = RefreshScheduler({"m1": "m1.png", ...}, analyze_capture, analyze_frame=analyze_frame)
+    refreshed = scheduler.poll(wait=True)   # timeframes re-analizados
+"""
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, wait as wait_futures
+
+import cv2
+
+from file_watcher import file_signature
+from frame_dedup import edge_fingerprint, hamming
+
+# Segundos entre refrescos de M1; cada timeframe refresca cada sus minutos × esto
+REFRESH_BASE_SECONDS = float(os.environ.get("ANALYZER_REFRESH_BASE_SECONDS", 60))
+# Bits distintos de la huella de la franja derecha (de 512) que adelantan un
+# refresco; "none" = sin excepción
+OVERRIDE_DISTANCE = os.environ.get("ANALYZER_REFRESH_OVERRIDE_DISTANCE", "4")
+OVERRIDE_DISTANCE = None if OVERRIDE_DISTANCE.lower() in ("", "none") else int(OVERRIDE_DISTANCE)
+# Hilos del pool compartido
+REFRESH_WORKERS = int(os.environ.get("ANALYZER_REFRESH_WORKERS", os.cpu_count() or 1))
+# Plazo de cada refresco, como fracción de su cadencia
+DEADLINE_FRACTION = 0.5
+# Minutos por unidad de timeframe ("m5", "h1", "d1")
+TIMEFRAME_UNITS = {"s": 1 / 60, "m": 1, "h": 60, "d": 1440, "w": 10080}
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def timeframe_minutes(timeframe):
+    """Minutos de un timeframe ("m15" -> 15, "H1" -> 60); 1 si no se reconoce"""
+    match = re.fullmatch(r"([smhdw])(\d+)|(\d+)([smhdw])", timeframe.strip().lower())
+    if not match:
+        return 1
+    unit, count = (match.group(1), match.group(2)) if match.group(1) else (match.group(4), match.group(3))
+    return int(count) * TIMEFRAME_UNITS[unit]
+
+
+def default_cadence(timeframe):
+    return timeframe_minutes(timeframe) * REFRESH_BASE_SECONDS
+
+
+def read_frame(path):
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError(f"No se pudo leer: {path}")
+    return img
+
+
+# ==================== POOL POR PLAZO ====================
+
+class DeadlinePool:
+    """
+    Pool de hilos que atiende primero el trabajo con el plazo más cercano
+    (plazos en segundos de time.monotonic); a igual plazo, menor prioridad
+    """
+
+    def __init__(self, workers=REFRESH_WORKERS):
+        self._heap = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._closed = False
+        self.stats = {"submitted": 0, "completed": 0, "late": 0}
+        self._threads = [threading.Thread(target=self._work, name=f"refresh-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, deadline, priority, func, *args):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("DeadlinePool cerrado")
+            heapq.heappush(self._heap, (deadline, priority, next(self._seq), future, func, args))
+            self.stats["submitted"] += 1
+            self._cond.notify()
+        return future
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                deadline, _, _, future, func, args = heapq.heappop(self._heap)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            with self._cond:
+                self.stats["completed"] += 1
+                if time.monotonic() > deadline:
+                    self.stats["late"] += 1
+
+    def queued(self):
+        with self._cond:
+            return len(self._heap)
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def shared_pool():
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_pool_lock:
+            if _shared_pool is None:
+                _shared_pool = DeadlinePool()
+    return _shared_pool
+
+
+def reset_shared_pool():
+    # Los hilos no sobreviven a fork()
+    global _shared_pool, _shared_pool_lock
+    _shared_pool = None
+    _shared_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_shared_pool)
+
+
+# ==================== PLANIFICADOR ====================
+
+class RefreshScheduler:
+    """
+    Decide qué timeframe re-analizar y cuándo
+    sources: timeframe -> ruta de la captura; analyze(ruta) -> análisis
+    analyze_frame(img) -> análisis: si se da (y hay override_distance), cada
+    refresco decodifica una vez y saca del mismo frame la huella de la excepción
+    cadences: timeframe -> segundos (por defecto default_cadence)
+    """
+
+    def __init__(self, sources, analyze, cadences=None, pool=None, analyze_frame=None,
+                 override_distance=OVERRIDE_DISTANCE, clock=time.monotonic):
+        self.sources = dict(sources)
+        self.analyze = analyze
+        self.analyze_frame = analyze_frame
+        self.pool = pool or shared_pool()
+        # Sin analyze_frame no hay huella con la que comparar
+        self.override_distance = override_distance if analyze_frame is not None else None
+        self.clock = clock
+        cadences = cadences or {}
+        self.cadences = {tf: float(cadences.get(tf) or default_cadence(tf)) for tf in self.sources}
+        # 0 = la cadencia más corta
+        self.priorities = {tf: rank for rank, tf in
+                           enumerate(sorted(self.sources, key=lambda tf: self.cadences[tf]))}
+        now = clock()
+        self.next_due = dict.fromkeys(self.sources, now)
+        self.state = {}       # timeframe -> {"signature", "fingerprint", "analysis", "refreshed_at", "seq"}
+        self.pending = {}     # timeframe -> (firma, future)
+        self.stats = {tf: {"refreshes": 0, "changes": 0, "unchanged": 0, "overrides": 0,
+                           "errors": 0} for tf in self.sources}
+        self.errors = {}      # timeframe -> {"error", "seq"} del último intento, si falló
+        self._seen = {}       # timeframe -> última firma vista en disco
+        self._refreshed = []
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # ---------- estado ----------
+
+    def analysis(self, timeframe):
+        entry = self.state.get(timeframe)
+        return entry["analysis"] if entry else None
+
+    def analyses(self):
+        with self._lock:
+            return {tf: entry["analysis"] for tf, entry in self.state.items()}
+
+    def _observe(self, timeframe, signature):
+        # Cuenta cada versión distinta del archivo (lo que analizaría el modo ingenuo)
+        if signature is not None and self._seen.get(timeframe) != signature:
+            self._seen[timeframe] = signature
+            self.stats[timeframe]["changes"] += 1
+
+    # ---------- refresco ----------
+
+    def _submit(self, timeframe, now, deadline):
+        """Lanza el análisis si el archivo cambió desde el último; devuelve el future o None"""
+        signature = file_signature(self.sources[timeframe])
+        self._observe(timeframe, signature)
+        if signature is None:
+            return None
+        pending = self.pending.get(timeframe)
+        if pending is not None and pending[0] == signature:
+            return pending[1]
+        if signature == self.state.get(timeframe, {}).get("signature"):
+            self.stats[timeframe]["unchanged"] += 1
+            return None
+        future = self.pool.submit(deadline, self.priorities[timeframe], self._refresh,
+                                  timeframe, signature, next(self._seq))
+        self.pending[timeframe] = (signature, future)
+        return future
+
+    def _refresh(self, timeframe, signature, seq):
+        path = self.sources[timeframe]
+        try:
+            if self.override_distance is None:
+                analysis, fp = self.analyze(path), None
+            else:
+                img = read_frame(path)
+                analysis, fp = self.analyze_frame(img), edge_fingerprint(img)
+        except Exception as e:
+            # Archivo a medio escribir o corrupto: se conserva el análisis anterior
+            print(f"⚠️ {timeframe.upper()}: no se pudo analizar ({e})")
+            with self._lock:
+                self.stats[timeframe]["errors"] += 1
+                self._drop_pending(timeframe, signature)
+                # Un fallo más antiguo que el análisis guardado ya no importa
+                if seq < self.state.get(timeframe, {}).get("seq", 0):
+                    return None
+                if seq > self.errors.get(timeframe, {}).get("seq", 0):
+                    self.errors[timeframe] = {"error": str(e), "seq": seq}
+            return str(e)
+
+        with self._lock:
+            stats = self.stats[timeframe]
+            stats["refreshes"] += 1
+            self._drop_pending(timeframe, signature)
+            # Un análisis más antiguo que el guardado no lo pisa
+            if seq < self.state.get(timeframe, {}).get("seq", 0):
+                return None
+            if seq > self.errors.get(timeframe, {}).get("seq", 0):
+                self.errors.pop(timeframe, None)
+            self.state[timeframe] = {"signature": signature, "fingerprint": fp, "analysis": analysis,
+                                     "refreshed_at": self.clock(), "seq": seq}
+            self._refreshed.append(timeframe)
+        return None
+
+    def _drop_pending(self, timeframe, signature):
+        pending = self.pending.get(timeframe)
+        if pending is not None and pending[0] == signature:
+            del self.pending[timeframe]
+
+    def _drain(self, futures, wait):
+        if wait and futures:
+            wait_futures(futures)
+        with self._lock:
+            refreshed, self._refreshed = list(dict.fromkeys(self._refreshed)), []
+        return refreshed
+
+    def poll(self, wait=False):
+        """
+        Lanza los timeframes vencidos y devuelve los refrescados desde la
+        llamada anterior; con wait espera a los que acaba de lanzar
+        """
+        now = self.clock()
+        futures = []
+        with self._lock:
+            for timeframe, due in self.next_due.items():
+                if now < due or timeframe in self.pending:
+                    continue
+                self.next_due[timeframe] = now + self.cadences[timeframe]
+                future = self._submit(timeframe, now, now + self.cadences[timeframe] * DEADLINE_FRACTION)
+                if future is not None:
+                    futures.append(future)
+        return self._drain(futures, wait)
+
+    def refresh(self, timeframes=None, wait=True, errors=None):
+        """
+        Re-analiza ya, sin esperar a la cadencia, los timeframes (todos por
+        defecto) cuyo archivo cambió; devuelve los refrescados
+        errors: dict opcional donde se anotan, con wait, los fallos de los
+        análisis de esta llamada (no los de otras ni los ya superados)
+        """
+        now = self.clock()
+        futures = {}
+        with self._lock:
+            for timeframe in timeframes or self.sources:
+                future = self._submit(timeframe, now, now + self.cadences[timeframe] * DEADLINE_FRACTION)
+                if future is not None:
+                    futures[timeframe] = future
+                self.next_due[timeframe] = now + self.cadences[timeframe]
+        refreshed = self._drain(list(futures.values()), wait)
+        if errors is not None:
+            for timeframe, future in futures.items():
+                if future.done() and future.result() is not None:
+                    errors[timeframe] = future.result()
+        return refreshed
+
+    def notify(self, paths=None):
+        """
+        Excepción on-change: de los archivos cambiados (todos si paths es
+        None), adelanta al momento el refresco de los que cambian de verdad
+        """
+        changed = None if paths is None else {os.path.abspath(p) for p in paths}
+        now = self.clock()
+        overridden = []
+        for timeframe, path in self.sources.items():
+            if changed is not None and os.path.abspath(path) not in changed:
+                continue
+            with self._lock:
+                entry = self.state.get(timeframe)
+                signature = file_signature(path)
+                self._observe(timeframe, signature)
+                if (signature is None or self.next_due[timeframe] <= now or timeframe in self.pending
+                        or (entry is not None and signature == entry["signature"])):
+                    continue
+                if entry is None:
+                    # Captura que faltaba: no hay nada que comparar
+                    self.next_due[timeframe] = now
+                    overridden.append(timeframe)
+                    continue
+                last = entry["fingerprint"]
+                if self.override_distance is None or last is None:
+                    continue
+            try:
+                distance = hamming(edge_fingerprint(read_frame(path)), last)
+            except Exception:
+                continue
+            if distance > self.override_distance:
+                with self._lock:
+                    self.next_due[timeframe] = now
+                    self.stats[timeframe]["overrides"] += 1
+                overridden.append(timeframe)
+        return overridden
+
+    def idle_seconds(self):
+        """Segundos hasta el próximo timeframe vencido"""
+        with self._lock:
+            return max(0.0, min(self.next_due.values()) - self.clock()) if self.next_due else None
+
+    def report(self):
+        with self._lock:
+            timeframes = {tf: {"cadence_s": self.cadences[tf], "priority": self.priorities[tf], **stats}
+                          for tf, stats in self.stats.items()}
+        refreshes = sum(s["refreshes"] for s in timeframes.values())
+        changes = sum(s["changes"] for s in timeframes.values())
+        return {
+            "timeframes": timeframes,
+            "refreshes": refreshes,
+            "changes": changes,
+            # Análisis evitados frente a re-analizar cada versión de cada captura
+            "saved": max(0, changes - refreshes),
+            "pool": dict(self.pool.stats, queued=self.pool.queued()),
+        }
\ No newline at end of file
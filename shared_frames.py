@@ -0,0 +1,207 @@
+"""
+Entrega de imágenes decodificadas a procesos de análisis por memoria compartida
+
+Serializar con pickle arrays BGR de varios MB entre el proceso web y los
+procesos de análisis domina el coste de IPC. Aquí cada imagen se copia una
+vez a un segmento de multiprocessing.shared_memory y al worker solo viaja un
+descriptor pequeño (nombre, forma, dtype); el worker analiza directamente una
+vista NumPy sobre el segmento, sin copias.
+
+Los segmentos se reutilizan desde un pool (por clase de tamaño) y su vida se
+controla con conteo de referencias: vuelven al pool cuando nadie los usa.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Segmentos libres que se conservan para reutilizar
+MAX_FREE_SEGMENTS = 8
+# Granularidad de las clases de tamaño (los segmentos se redondean a esto)
+SEGMENT_ALIGNMENT = 1024 * 1024
+# Procesos de análisis por defecto
+DEFAULT_PROCESSES = os.cpu_count() or 1
+
+
+class SharedFrame:
+    """Segmento de memoria compartida con conteo de referencias"""
+
+    __slots__ = ("segment", "shape", "dtype", "refs", "_pool")
+
+    def __init__(self, segment, pool):
+        self.segment = segment
+        self.shape = None
+        self.dtype = None
+        self.refs = 1
+        self._pool = pool
+
+    @property
+    def name(self):
+        return self.segment.name
+
+    @property
+    def size(self):
+        return self.segment.size
+
+    def array(self):
+        """Vista NumPy sobre el segmento (sin copia)"""
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self.segment.buf)
+
+    def descriptor(self):
+        """Lo único que viaja al worker"""
+        return {"name": self.name, "shape": tuple(self.shape), "dtype": str(self.dtype)}
+
+    def retain(self):
+        self._pool.retain(self)
+        return self
+
+    def release(self):
+        self._pool.release(self)
+
+
+class SegmentPool:
+    """Pool de segmentos reutilizables, seguro entre hilos"""
+
+    def __init__(self, max_free=MAX_FREE_SEGMENTS):
+        self.max_free = max_free
+        self._free = []
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "unlinked": 0, "in_use": 0}
+
+    def acquire(self, nbytes):
+        """Segmento de al menos nbytes (reutilizado si hay uno libre que sirva)"""
+        size = max(SEGMENT_ALIGNMENT, -(-nbytes // SEGMENT_ALIGNMENT) * SEGMENT_ALIGNMENT)
+
+        with self._lock:
+            # El menor segmento libre que alcance
+            candidates = [f for f in self._free if f.size >= nbytes]
+            if candidates:
+                frame = min(candidates, key=lambda f: f.size)
+                self._free.remove(frame)
+                frame.refs = 1
+                self.stats["reused"] += 1
+                self.stats["in_use"] += 1
+                return frame
+
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        with self._lock:
+            self.stats["created"] += 1
+            self.stats["in_use"] += 1
+        return SharedFrame(segment, self)
+
+    def put(self, img):
+        """Copia una imagen decodificada a un segmento y lo devuelve"""
+        frame = self.acquire(img.nbytes)
+        frame.shape = img.shape
+        frame.dtype = img.dtype
+        np.copyto(frame.array(), img)
+        return frame
+
+    def retain(self, frame):
+        with self._lock:
+            if frame.refs <= 0:
+                raise ValueError(f"Segment already released: {frame.name}")
+            frame.refs += 1
+
+    def release(self, frame):
+        with self._lock:
+            if frame.refs <= 0:
+                raise ValueError(f"Segment already released: {frame.name}")
+            frame.refs -= 1
+            if frame.refs > 0:
+                return
+            self.stats["in_use"] -= 1
+            if len(self._free) < self.max_free:
+                self._free.append(frame)
+                return
+            self.stats["unlinked"] += 1
+
+        frame.segment.close()
+        frame.segment.unlink()
+
+    def close(self):
+        """Libera todos los segmentos libres (los que están en uso siguen vivos)"""
+        with self._lock:
+            free, self._free = self._free, []
+        for frame in free:
+            frame.segment.close()
+            frame.segment.unlink()
+            self.stats["unlinked"] += 1
+
+
+# ==================== LADO DEL WORKER ====================
+
+def attach(descriptor):
+    """
+    Abre en este proceso un segmento creado por otro. Se cierra tras cada
+    análisis (ver _analyze_descriptor): si el worker lo mantuviera mapeado,
+    la memoria no se liberaría aunque el dueño hiciera unlink
+    """
+    try:
+        return shared_memory.SharedMemory(name=descriptor["name"], track=False)
+    except TypeError:
+        # Python < 3.13 siempre registra el segmento; los workers del pool
+        # comparten el resource_tracker del proceso dueño, así que el
+        # registro duplicado es inocuo y el dueño lo retira al hacer unlink
+        return shared_memory.SharedMemory(name=descriptor["name"])
+
+
+def frame_view(segment, descriptor):
+    """Vista NumPy (sin copia) de la imagen del segmento"""
+    return np.ndarray(descriptor["shape"], dtype=np.dtype(descriptor["dtype"]), buffer=segment.buf)
+
+
+def _init_worker():
+    # Importar y calentar el analizador una vez por proceso
+    import image_analyzer
+    image_analyzer.PARALLEL_DETECTORS = False
+    image_analyzer.analyze_frame(np.full((64, 128, 3), 255, dtype=np.uint8))
+
+
+def _analyze_descriptor(descriptor):
+    from image_analyzer import analyze_frame
+
+    segment = attach(descriptor)
+    try:
+        return analyze_frame(frame_view(segment, descriptor))
+    finally:
+        segment.close()
+
+
+class SharedFrameAnalyzer:
+    """
+    Pool de procesos de análisis alimentado por memoria compartida
+
+        analyzer = SharedFrameAnalyzer(processes=4)
+        future = analyzer.submit(img)      # img: ndarray BGR decodificado
+        result = future.result()
+    """
+
+    def __init__(self, processes=DEFAULT_PROCESSES, max_free=MAX_FREE_SEGMENTS):
+        self.segments = SegmentPool(max_free)
+        self.executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker)
+
+    def submit(self, img):
+        """Copia img a memoria compartida y la analiza en un proceso"""
+        frame = self.segments.put(img)
+        try:
+            return self.submit_frame(frame)
+        finally:
+            frame.release()
+
+    def submit_frame(self, frame):
+        """Analiza un segmento ya cargado; el futuro retiene una referencia"""
+        frame.retain()
+        try:
+            future = self.executor.submit(_analyze_descriptor, frame.descriptor())
+        except Exception:
+            frame.release()
+            raise
+        future.add_done_callback(lambda _: frame.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+        self.segments.close()
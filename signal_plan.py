@@ -0,0 +1,310 @@
+"""
+Generación del plan de señales a partir de los análisis de M1, M5 y M15
+
+Sin dependencias de la CLI ni del servidor: lo usan main.py, upload_capture.py,
+chart_grid.py y video_ingest.py. CONFIG es el mismo diccionario que main.CONFIG (main.py le
+añade sus claves), así que ajustar uno ajusta el otro.
+"""
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+
+# ==================== CONFIGURACIÓN ====================
+CONFIG = {
+    "interval_minutes": 5,
+    "signals_per_hour": 12,
+    "timezone_offset": -5,
+    "min_confidence": 65,
+    "max_confidence": 88,
+    # Probabilidad de que una señal siga a la dominante
+    "dominant_probability": 0.65,
+    # Variación aleatoria de la confianza (uniforme entre ambos valores)
+    "confidence_variance": (-2, 3),
+}
+
+# Timeframes que se combinan en una señal
+TIMEFRAMES = ("m1", "m5", "m15")
+
+# Confianza base según timeframes alineados con la señal (0-3)
+CONFIDENCE_BASE = {3: 83, 2: 75, 1: 69, 0: 66}
+# Señales por plan (2 horas, una cada 5 minutos)
+SIGNALS_PER_PLAN = 24
+
+# Plantillas de plan memoizadas (ver cached_plan_template)
+PLAN_CACHE_SIZE = 256
+PLAN_CACHE = OrderedDict()
+PLAN_CACHE_LOCK = threading.Lock()
+PLAN_CACHE_STATS = {"hits": 0, "misses": 0}
+
+# ==================== FUNCIONES AUXILIARES ====================
+
+def get_ecuador_time():
+    """Obtiene la hora actual en Ecuador (GMT-5)"""
+    utc_now = datetime.now(timezone.utc)
+    ecuador_tz = timezone(timedelta(hours=CONFIG["timezone_offset"]))
+    return utc_now.astimezone(ecuador_tz)
+
+def extract_trend_direction(trend_str):
+    """
+    Extrae dirección de tendencia de forma robusta
+    Retorna: UP, DOWN, o NEUTRAL
+    """
+    if not trend_str:
+        return "NEUTRAL"
+    
+    trend = str(trend_str).lower()
+    
+    # Palabras clave para tendencia alcista
+    bullish_keywords = ["alcista", "up", "bull", "subiendo", "positivo"]
+    if any(word in trend for word in bullish_keywords):
+        return "UP"
+    
+    # Palabras clave para tendencia bajista
+    bearish_keywords = ["bajista", "down", "bear", "bajando", "negativo"]
+    if any(word in trend for word in bearish_keywords):
+        return "DOWN"
+    
+    return "NEUTRAL"
+
+def calculate_confluence_score(m1_dir, m5_dir, m15_dir, signal_type):
+    """
+    Calcula el score de confluencia entre timeframes
+    Retorna: número de timeframes alineados (0-3)
+    """
+    aligned_count = 0
+    
+    if signal_type == "COMPRA":
+        if m1_dir == "UP": aligned_count += 1
+        if m5_dir == "UP": aligned_count += 1
+        if m15_dir == "UP": aligned_count += 1
+    elif signal_type == "VENTA":
+        if m1_dir == "DOWN": aligned_count += 1
+        if m5_dir == "DOWN": aligned_count += 1
+        if m15_dir == "DOWN": aligned_count += 1
+    
+    return aligned_count
+
+# ==================== GENERADOR DE SEÑALES ====================
+
+def plan_inputs(m1_data, m5_data, m15_data):
+    """
+    Lo que el plan toma de los análisis: direcciones, fuerza media y señal
+    dominante (común al generador y a la simulación Monte Carlo)
+    """
+    # ========== ANÁLISIS DE TENDENCIAS ==========
+    m1_direction = extract_trend_direction(m1_data.get("trend", "neutral"))
+    m5_direction = extract_trend_direction(m5_data.get("trend", "neutral"))
+    m15_direction = extract_trend_direction(m15_data.get("trend", "neutral"))
+    
+    # ========== NORMALIZACIÓN DE FUERZAS ==========
+    m1_strength = max(30, min(80, float(m1_data.get("strength", 50))))
+    m5_strength = max(30, min(80, float(m5_data.get("strength", 50))))
+    m15_strength = max(30, min(80, float(m15_data.get("strength", 50))))
+    
+    avg_strength = (m1_strength + m5_strength + m15_strength) / 3
+    
+    # ========== DETERMINACIÓN DE SEÑAL DOMINANTE ==========
+    trend_score = 0
+    
+    if m15_direction == "UP":
+        trend_score += 5
+    elif m15_direction == "DOWN":
+        trend_score -= 5
+    
+    if m5_direction == "UP":
+        trend_score += 3
+    elif m5_direction == "DOWN":
+        trend_score -= 3
+    
+    if m1_direction == "UP":
+        trend_score += 2
+    elif m1_direction == "DOWN":
+        trend_score -= 2
+    
+    dominant_signal = "COMPRA" if trend_score >= 0 else "VENTA"
+    
+    return {
+        "directions": (m1_direction, m5_direction, m15_direction),
+        "avg_strength": avg_strength,
+        "dominant_signal": dominant_signal,
+    }
+
+def build_plan_template(inputs, rng=random):
+    """
+    Parte del plan que no depende de la hora: tipo, confianza, confluencia y
+    timing de las 24 señales. rng: módulo random o un random.Random sembrado
+    """
+    template = []
+    m1_direction, m5_direction, m15_direction = inputs["directions"]
+    avg_strength = inputs["avg_strength"]
+    dominant_signal = inputs["dominant_signal"]
+    
+    # ========== GENERAR 24 SEÑALES PARA 2 HORAS ==========
+    for i in range(SIGNALS_PER_PLAN):  # ← ARREGLADO: Ahora genera 24 señales
+        # ========== TIPO DE SEÑAL ==========
+        if rng.random() < CONFIG["dominant_probability"]:
+            signal_type = dominant_signal
+        else:
+            signal_type = "VENTA" if dominant_signal == "COMPRA" else "COMPRA"
+        
+        # ========== CALCULAR CONFLUENCIA ==========
+        aligned_count = calculate_confluence_score(
+            m1_direction, m5_direction, m15_direction, signal_type
+        )
+        
+        # ========== CONFIANZA BASE ==========
+        confidence_base = CONFIDENCE_BASE[aligned_count]
+        
+        # ========== AJUSTES DE CONFIANZA ==========
+        strength_normalized = (avg_strength - 40) / 40
+        strength_bonus = strength_normalized * 8
+        
+        middle_index = 11.5  # Medio de 24 señales (0-23)
+        position_factor = 1 - (abs(i - middle_index) / middle_index)
+        position_bonus = position_factor * 5
+        
+        time_degradation = -(i / 24) * 3
+        random_variance = rng.uniform(*CONFIG["confidence_variance"])
+        
+        # ========== CONFIANZA FINAL ==========
+        final_confidence = (
+            confidence_base + 
+            strength_bonus + 
+            position_bonus + 
+            time_degradation + 
+            random_variance
+        )
+        
+        final_confidence = int(max(
+            CONFIG["min_confidence"], 
+            min(CONFIG["max_confidence"], final_confidence)
+        ))
+        
+        # ========== RECOMENDACIÓN DE TIMING ==========
+        timing_index = i % 12
+        
+        if timing_index in [0, 3, 6, 9]:
+            timing = "✅ Entra inmediatamente"
+            timing_emoji = "✅"
+        elif timing_index in [1, 4, 7, 10]:
+            timing = "📊 Momento aceptable"
+            timing_emoji = "📊"
+        elif timing_index in [2, 5, 8]:
+            timing = "⏳ Espera retroceso"
+            timing_emoji = "⏳"
+        else:
+            timing = "⚠️ Opera con precaución"
+            timing_emoji = "⚠️"
+        
+        # ========== INDICADOR VISUAL DE CONFLUENCIA ==========
+        if aligned_count == 3:
+            confluence_visual = " ✅✅✅"
+        elif aligned_count == 2:
+            confluence_visual = " ✅✅"
+        elif aligned_count == 1:
+            confluence_visual = " ✅"
+        else:
+            confluence_visual = ""
+        
+        signal_emoji = "📈" if signal_type == "COMPRA" else "📉"
+        
+        template.append({
+            "signal": signal_type,
+            "confidence": final_confidence,
+            "aligned_count": aligned_count,
+            "confluence_pct": round((aligned_count / 3) * 100, 1),
+            "timing": timing,
+            "timing_emoji": timing_emoji,
+            "line_tail": f"{signal_emoji} {signal_type:6s} — {final_confidence}%{confluence_visual} | {timing}",
+            "metadata": {
+                "avg_strength": round(avg_strength, 1),
+                "position_index": i,
+                "hour": 1 if i < 12 else 2
+            }
+        })
+    
+    return tuple(template)
+
+def stamp_plan(template, base_time):
+    """Crea los objetos de señal de una plantilla a partir de base_time"""
+    signals = []
+    step = timedelta(minutes=CONFIG["interval_minutes"])
+    for i, entry in enumerate(template):
+        # Calcular tiempo de la señal
+        signal_time = base_time + i * step
+        time_str = f"{signal_time.hour:02d}:{signal_time.minute:02d}"
+        
+        # ========== CREAR OBJETO DE SEÑAL ==========
+        signals.append({
+            "time": time_str,
+            "timestamp": signal_time.isoformat(),
+            "signal": entry["signal"],
+            "confidence": entry["confidence"],
+            "aligned_count": entry["aligned_count"],
+            "confluence_pct": entry["confluence_pct"],
+            "timing": entry["timing"],
+            "timing_emoji": entry["timing_emoji"],
+            "line": f"{time_str} {entry['line_tail']}",
+            "metadata": dict(entry["metadata"])
+        })
+    
+    return signals
+
+def plan_bucket(base_time):
+    """Ventana de interval_minutes a la que pertenece base_time"""
+    return int(base_time.timestamp() // (CONFIG["interval_minutes"] * 60))
+
+def plan_window_start(base_time):
+    """Inicio de la ventana de plan_bucket: el sello común de toda la ventana"""
+    seconds = plan_bucket(base_time) * CONFIG["interval_minutes"] * 60
+    return datetime.fromtimestamp(seconds, base_time.tzinfo)
+
+def cached_plan_template(inputs, seed, bucket):
+    """
+    Plantilla memoizada por (entradas del plan, semilla, ventana de tiempo)
+    Dentro de una ventana, las peticiones repetidas solo re-sellan las horas
+    """
+    key = (inputs["directions"], inputs["avg_strength"], inputs["dominant_signal"], seed, bucket)
+    with PLAN_CACHE_LOCK:
+        template = PLAN_CACHE.get(key)
+        if template is not None:
+            PLAN_CACHE.move_to_end(key)
+            PLAN_CACHE_STATS["hits"] += 1
+            return template
+        PLAN_CACHE_STATS["misses"] += 1
+
+    # Misma semilla y ventana -> mismo plan en cualquier proceso
+    template = build_plan_template(inputs, random.Random(f"{seed}:{bucket}"))
+    with PLAN_CACHE_LOCK:
+        PLAN_CACHE[key] = template
+        while len(PLAN_CACHE) > PLAN_CACHE_SIZE:
+            PLAN_CACHE.popitem(last=False)
+    return template
+
+def combine_signal(m1, m5, m15):
+    """Señal simple: M15 marca la dirección, la fuerza media la confianza"""
+    return {
+        "signal": "COMPRA" if str(m15.get("trend", "")).lower() == "alcista" else "VENTA",
+        "confidence": int((float(m1.get("strength", 50)) + float(m5.get("strength", 50))
+                           + float(m15.get("strength", 50))) / 3),
+        "details": {"m1": m1, "m5": m5, "m15": m15}
+    }
+
+def generate_trading_signals(m1_data, m5_data, m15_data, seed=None, base_time=None):
+    """
+    Genera señales de trading para las próximas 2 horas (24 SEÑALES)
+    Sistema inteligente con variación garantizada
+    Con seed el plan es reproducible y se memoiza por ventana de tiempo
+    Sin base_time se sella desde el inicio de la ventana actual: las
+    peticiones repetidas dentro de ella dan exactamente el mismo plan
+    """
+    base_time = base_time or plan_window_start(get_ecuador_time())
+    inputs = plan_inputs(m1_data, m5_data, m15_data)
+    
+    if seed is None:
+        template = build_plan_template(inputs)
+    else:
+        template = cached_plan_template(inputs, seed, plan_bucket(base_time))
+    
+    return stamp_plan(template, base_time)
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+Informes de señales: agregación en una sola pasada y salida con una escritura
+
+aggregate() recorre la lista de señales una vez y calcula todo lo que
+muestran los informes (grupos por hora, niveles de confianza, timing,
+dirección). Los renderizadores construyen el texto completo en memoria y
+se escribe de una vez, en terminal, Markdown o HTML. Pensado para planes
+de varios días o varios símbolos (decenas de miles de señales).
+
+    python signal_report.py signals.log --format html --out informe.html
+"""
+import html
+import json
+import sys
+
+# Niveles de confianza: (clave, mínimo, título, emoji, rango)
+TIERS = (
+    ("high", 80, "CONFIANZA ALTA", "🔥", "80-88%"),
+    ("medium", 70, "CONFIANZA BUENA", "⭐", "70-79%"),
+    ("acceptable", 0, "CONFIANZA ACEPTABLE", "📊", "65-69%"),
+)
+# Clase de timing según el emoji de la señal
+TIMING_CLASSES = {"✅": "immediate", "📊": "normal", "⏳": "wait", "⚠️": "caution"}
+TIMING_LABELS = (
+    ("immediate", "✅ Inmediato"),
+    ("normal", "📊 Aceptable"),
+    ("wait", "⏳ Esperar"),
+    ("caution", "⚠️ Precaución"),
+)
+HOUR_NAMES = {1: "PRIMERA HORA", 2: "SEGUNDA HORA"}
+FORMATS = ("terminal", "markdown", "html")
+WIDTH = 85
+
+
+def plan_hour(signal):
+    """Grupo por hora del plan (1, 2); con símbolo, por (símbolo, hora)"""
+    hour = signal["metadata"]["hour"]
+    symbol = signal.get("symbol")
+    return (symbol, hour) if symbol else hour
+
+
+def clock_hour(signal):
+    """Grupo por hora de reloj (informes de varios días)"""
+    key = signal["timestamp"][:13].replace("T", " ") + "h"
+    symbol = signal.get("symbol")
+    return (symbol, key) if symbol else key
+
+
+def tier_of(confidence):
+    for key, minimum, *_ in TIERS:
+        if confidence >= minimum:
+            return key
+    return TIERS[-1][0]
+
+
+def aggregate(signals, group_key=plan_hour):
+    """
+    Una sola pasada: totales, niveles, timing y dirección, globales y por
+    grupo; cada grupo guarda las líneas de cada nivel en orden
+    """
+    totals = {"total": 0, "buy": 0, "sell": 0, "confidence_sum": 0,
+              "min_confidence": None, "max_confidence": None}
+    tiers = dict.fromkeys((t[0] for t in TIERS), 0)
+    timing = dict.fromkeys(TIMING_CLASSES.values(), 0)
+    groups = {}
+
+    for signal in signals:
+        confidence = signal["confidence"]
+        tier = tier_of(confidence)
+
+        totals["total"] += 1
+        totals["buy" if signal["signal"] == "COMPRA" else "sell"] += 1
+        totals["confidence_sum"] += confidence
+        if totals["min_confidence"] is None or confidence < totals["min_confidence"]:
+            totals["min_confidence"] = confidence
+        if totals["max_confidence"] is None or confidence > totals["max_confidence"]:
+            totals["max_confidence"] = confidence
+        tiers[tier] += 1
+        timing[TIMING_CLASSES.get(signal.get("timing_emoji"), "normal")] += 1
+
+        key = group_key(signal)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"count": 0, "lines": {t[0]: [] for t in TIERS}}
+        group["count"] += 1
+        group["lines"][tier].append(signal["line"])
+
+    return {"totals": totals, "tiers": tiers, "timing": timing, "groups": groups}
+
+
+def group_title(key, capitalize=False):
+    """Título del grupo; capitalize solo afecta al nombre de la hora, no al símbolo"""
+    symbol, hour = key if isinstance(key, tuple) else (None, key)
+    title = HOUR_NAMES.get(hour, f"HORA {hour}")
+    if capitalize:
+        title = title.capitalize()
+    return f"{symbol} · {title}" if symbol else title
+
+
+def pct(part, total):
+    return part * 100 // total if total else 0
+
+
+def summary_rows(report):
+    """(sección, [(etiqueta, valor)]) comunes a todos los formatos"""
+    totals = report["totals"]
+    total = totals["total"]
+    average = totals["confidence_sum"] / total if total else 0.0
+    tiers = report["tiers"]
+
+    return [
+        (f"📊 TOTAL: {total} señales", [
+            (group_title(key, capitalize=True), f"{group['count']} señales")
+            for key, group in report["groups"].items()
+        ]),
+        ("💹 DISTRIBUCIÓN", [
+            ("📈 COMPRA", f"{totals['buy']} ({pct(totals['buy'], total)}%)"),
+            ("📉 VENTA", f"{totals['sell']} ({pct(totals['sell'], total)}%)"),
+        ]),
+        ("📈 CONFIANZA", [
+            ("Promedio", f"{average:.1f}%"),
+            ("Rango", f"{totals['min_confidence']}%-{totals['max_confidence']}%"),
+        ]),
+        ("🎯 POR NIVEL", [
+            ("🔥 Alta", f"{tiers['high']} ({pct(tiers['high'], total)}%)"),
+            ("⭐ Buena", f"{tiers['medium']} ({pct(tiers['medium'], total)}%)"),
+            ("📊 Aceptable", f"{tiers['acceptable']} ({pct(tiers['acceptable'], total)}%)"),
+        ]),
+        ("⏱️  TIMING", [(label, str(report["timing"][key])) for key, label in TIMING_LABELS]),
+    ]
+
+
+# ==================== RENDERIZADORES ====================
+
+def render_terminal(report, title="🎯 SEÑALES"):
+    out = [f"{title}:"]
+    for key, group in report["groups"].items():
+        out.append("\n" + "━" * WIDTH)
+        out.append(f"⏰ {group_title(key)} ({group['count']} señales)")
+        out.append("━" * WIDTH)
+        for tier, _, heading, emoji, span in TIERS:
+            lines = group["lines"][tier]
+            if lines:
+                out.append(f"\n{emoji} {heading} ({span}):")
+                out.extend(f"   {line}" for line in lines)
+
+    out.append("\n" + "=" * WIDTH)
+    out.append("     📋 RESUMEN ESTADÍSTICO")
+    out.append("=" * WIDTH)
+    for section, rows in summary_rows(report):
+        out.append(f"\n{section}" if ":" in section else f"\n{section}:")
+        out.extend(f"   • {label}: {value}" for label, value in rows)
+    out.append("\n" + "=" * WIDTH)
+    return "\n".join(out) + "\n"
+
+
+def render_markdown(report, title="🎯 SEÑALES"):
+    out = [f"# {title}", ""]
+    for key, group in report["groups"].items():
+        out.append(f"## ⏰ {group_title(key)} ({group['count']} señales)")
+        out.append("")
+        for tier, _, heading, emoji, span in TIERS:
+            lines = group["lines"][tier]
+            if lines:
+                out.append(f"### {emoji} {heading} ({span})")
+                out.append("")
+                out.extend(f"- `{line}`" for line in lines)
+                out.append("")
+
+    out.append("## 📋 Resumen estadístico")
+    out.append("")
+    for section, rows in summary_rows(report):
+        out.append(f"**{section}**")
+        out.append("")
+        out.append("| | |")
+        out.append("|---|---|")
+        out.extend(f"| {label} | {value} |" for label, value in rows)
+        out.append("")
+    return "\n".join(out)
+
+
+def render_html(report, title="🎯 SEÑALES"):
+    esc = html.escape
+    out = [
+        "<!DOCTYPE html>",
+        f'<html lang="es"><head><meta charset="UTF-8"><title>{esc(title)}</title>',
+        "<style>body{font-family:-apple-system,Segoe UI,Roboto,sans-serif;margin:24px;color:#333}"
+        "h2{border-bottom:2px solid #667eea;padding-bottom:4px}ul{font-family:monospace;list-style:none;padding-left:12px}"
+        "table{border-collapse:collapse;margin-bottom:16px}td{padding:2px 12px;border-bottom:1px solid #eee}</style>",
+        "</head><body>",
+        f"<h1>{esc(title)}</h1>",
+    ]
+    for key, group in report["groups"].items():
+        out.append(f"<h2>⏰ {esc(group_title(key))} ({group['count']} señales)</h2>")
+        for tier, _, heading, emoji, span in TIERS:
+            lines = group["lines"][tier]
+            if lines:
+                out.append(f"<h3>{emoji} {heading} ({span})</h3><ul>")
+                out.extend(f"<li>{esc(line)}</li>" for line in lines)
+                out.append("</ul>")
+
+    out.append("<h2>📋 Resumen estadístico</h2>")
+    for section, rows in summary_rows(report):
+        out.append(f"<h3>{esc(section)}</h3><table>")
+        out.extend(f"<tr><td>{esc(label)}</td><td>{esc(value)}</td></tr>" for label, value in rows)
+        out.append("</table>")
+    out.append("</body></html>")
+    return "\n".join(out) + "\n"
+
+
+RENDERERS = {"terminal": render_terminal, "markdown": render_markdown, "html": render_html}
+
+
+def render(signals, fmt="terminal", group_key=plan_hour, **options):
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown report format: {fmt}")
+    return RENDERERS[fmt](aggregate(signals, group_key), **options)
+
+
+def write_report(signals, fmt="terminal", out=None, group_key=plan_hour, **options):
+    """Renderiza y escribe el informe completo con una sola escritura"""
+    text = render(signals, fmt, group_key, **options)
+    if out is None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    else:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text)
+    return text
+
+
+def load_signal_log(path):
+    """
+    Señales de todas las entradas de un signals.log de main.py (objetos
+    JSON concatenados, con sangría); las entradas sin "signals" se ignoran
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    signals = []
+    position = 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position >= len(text):
+            return signals
+        entry, position = decoder.raw_decode(text, position)
+        if isinstance(entry, dict):
+            signals.extend(entry.get("signals") or [])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Informe de señales de un signals.log")
+    parser.add_argument("log", nargs="?", default="signals.log")
+    parser.add_argument("--format", choices=FORMATS, default="terminal")
+    parser.add_argument("--out", help="Archivo de salida (por defecto stdout)")
+    parser.add_argument("--group", choices=("clock", "plan"), default="clock",
+                        help="Agrupar por hora de reloj o por hora del plan")
+    args = parser.parse_args()
+
+    group_key = clock_hour if args.group == "clock" else plan_hour
+    write_report(load_signal_log(args.log), args.format, args.out, group_key)
@@ -0,0 +1,109 @@
+"""
+Coalescencia de peticiones ("single flight")
+
+Si varios clientes piden a la vez el análisis de la misma imagen, solo el
+primero lo calcula; los demás esperan ese cálculo y comparten su resultado
+(o su excepción). Al terminar, la clave se libera: no es una caché, solo
+evita trabajo duplicado mientras hay un cálculo en curso.
+"""
+import copy
+import os
+import threading
+
+# Segundos que un seguidor espera al cálculo en curso ("none" = sin límite)
+DEFAULT_TIMEOUT = os.environ.get("ANALYZER_COALESCE_TIMEOUT", "30")
+DEFAULT_TIMEOUT = None if DEFAULT_TIMEOUT.lower() in ("", "none") else float(DEFAULT_TIMEOUT)
+
+
+class Flight:
+    """Cálculo en curso para una clave"""
+
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def waiter_error(error):
+    """
+    Copia de la excepción del líder para un seguidor: relanzar la misma
+    instancia desde varios hilos mezcla sus tracebacks
+    """
+    try:
+        clone = copy.copy(error)
+    except Exception:
+        clone = None
+    if type(clone) is not type(error):
+        clone = RuntimeError(f"In-flight analysis failed: {error!r}")
+    clone.__traceback__ = None
+    return clone
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes por clave
+
+        flights = SingleFlight()
+        result = flights.do(sha1, lambda: analyze_frame(img), timeout=10)
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "computed": 0, "shared": 0, "errors": 0, "timeouts": 0}
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def do(self, key, func, timeout=None):
+        """
+        Ejecuta func() salvo que ya haya un cálculo en curso para key, en cuyo
+        caso espera su resultado hasta timeout segundos (TimeoutError si no
+        llega). Las excepciones del cálculo se propagan a todos los que esperan:
+        cada seguidor recibe su propia copia, encadenada a la original
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.stats["computed"] += 1
+            else:
+                flight.waiters += 1
+                self.stats["shared"] += 1
+
+        if leader:
+            try:
+                flight.result = func()
+                return flight.result
+            except BaseException as e:
+                flight.error = e
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        timeout = self.timeout if timeout is None else timeout
+        if not flight.done.wait(timeout):
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight analysis {key!r}")
+
+        if flight.error is not None:
+            raise waiter_error(flight.error) from flight.error
+        return flight.result
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
@@ -0,0 +1,106 @@
+"""
+Pruebas de adaptive_quality: predicción por nivel, elección de nivel y cabeceras
+"""
+import time
+from pathlib import Path
+
+import cv2
+import pytest
+
+import adaptive_quality as aq
+import image_analyzer as ia
+
+HERE = Path(__file__).parent
+PIXELS = 1143 * 590
+
+
+@pytest.fixture
+def img():
+    return cv2.imread(str(HERE / "m1.png"))
+
+
+def tier(name):
+    return next(t for t in aq.QUALITY_TIERS if t["name"] == name)
+
+
+def test_tier_detectors_follow_the_plan():
+    full = aq.tier_detectors(tier("full"))
+    assert "trace" not in full
+    assert {"reversal", "edges", "edge_strength", "trend_profile"} <= set(full)
+
+    no_edges = aq.tier_detectors(tier("no_edges"))
+    assert not {"reversal", "edges", "edge_strength"} & set(no_edges)
+
+
+def test_unused_detector_does_not_inflate_prediction():
+    model = aq.CostModel()
+    detectors = aq.tier_detectors(tier("full"))
+    assert model.predict(tier("full"), PIXELS, detectors) < model.predict(
+        tier("full"), PIXELS, detectors + ["trace"])
+
+
+def test_predictions_decrease_with_tier():
+    model = aq.CostModel()
+    predicted = [model.predict(t, PIXELS, aq.tier_detectors(t)) for t in aq.QUALITY_TIERS]
+    assert predicted == sorted(predicted, reverse=True)
+
+
+def test_choose_tier_degrades_with_budget():
+    model = aq.CostModel()
+    chosen = [aq.choose_tier(model, budget, PIXELS)[0]["name"] for budget in (1e6, 17, 6, 0.1)]
+    order = [t["name"] for t in aq.QUALITY_TIERS]
+    assert chosen[0] == "full"
+    assert chosen[-1] == "quarter"
+    assert [order.index(name) for name in chosen] == sorted(order.index(name) for name in chosen)
+
+
+def test_observe_moves_rates_towards_measurements():
+    model = aq.CostModel()
+    before = model.rates["trend"]
+    for _ in range(20):
+        model.observe({"trend": 0.010}, PIXELS, (20, 40, 80), wall_ms=10)
+    assert abs(model.rates["trend"] - 10 / (PIXELS / 1e6)) < abs(before - 10 / (PIXELS / 1e6))
+
+
+def test_full_budget_matches_unbudgeted_analysis(img):
+    expected = ia.analyze_frame(img)
+    result = ia.analyze_frame(img, deadline_ms=1e6)
+    assert result.pop("quality")["tier"] == "full"
+    assert result == expected
+
+
+def test_tiny_budget_uses_cheapest_tier(img):
+    quality = ia.analyze_frame(img, deadline_ms=0.01)["quality"]
+    assert quality["tier"] == "quarter"
+    assert not quality["within_budget"]
+
+
+def test_image_size_reads_headers(tmp_path, img):
+    for ext in (".png", ".bmp", ".jpg"):
+        path = tmp_path / f"a{ext}"
+        cv2.imwrite(str(path), img)
+        assert aq.image_size(str(path)) == (img.shape[1], img.shape[0])
+
+
+@pytest.mark.parametrize("size", [3, 8, 21])
+def test_image_size_truncated_jpeg_is_none(tmp_path, img, size):
+    path = tmp_path / "a.jpg"
+    cv2.imwrite(str(path), img)
+    path.write_bytes(path.read_bytes()[:size])
+    assert aq.image_size(str(path)) is None
+
+def test_budget_runs_from_started(img):
+    started = time.perf_counter() - 0.1
+    quality = aq.analyze_frame_within(img, 50, started=started, waited_ms=100)["quality"]
+    assert quality["budget_ms"] == 50
+    assert quality["elapsed_ms"] >= 100
+    assert quality["tier"] == "quarter"
+    assert not quality["within_budget"]
+
+
+def test_bytes_decode_key(img):
+    png = cv2.imencode(".png", img)[1].tobytes()
+    jpg = cv2.imencode(".jpg", img)[1].tobytes()
+    assert aq.bytes_decode_key(png) == "decode:png:1"
+    assert aq.bytes_decode_key(jpg) == "decode:jpeg:1"
+    assert aq.bytes_decode_key(b"BM") == "decode:other:1"
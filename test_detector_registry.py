@@ -0,0 +1,153 @@
+"""
+Pruebas de detector_registry: orden topológico, errores del grafo y
+equivalencia entre ejecución en serie y en paralelo
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import pytest
+
+import detector_registry
+import image_analyzer as ia
+from detector_registry import Detector, DetectorRegistry
+
+HERE = Path(__file__).parent
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.fixture
+def registry():
+    # img -> gray -> {edges, mean}; edges + mean -> score; img -> size
+    registry = DetectorRegistry()
+    registry.add(Detector("score", lambda edges, mean: edges * 10 + mean, ["edges", "mean"], ["score"]))
+    registry.add(Detector("edges", lambda gray: gray * 2, ["gray"], ["edges"]))
+    registry.add(Detector("mean", lambda gray: gray + 1, ["gray"], ["mean"]))
+    registry.add(Detector("gray", lambda img: img - 1, ["img"], ["gray"]))
+    registry.add(Detector("size", lambda img: (img, -img), ["img"], ["width", "height"]))
+    return registry
+
+
+def names(order):
+    return [detector.name for detector in order]
+
+
+def test_plan_runs_producers_before_consumers(registry):
+    order = names(registry.plan({"img"}))
+    assert sorted(order) == ["edges", "gray", "mean", "score", "size"]
+    for detector in registry:
+        for value in detector.inputs:
+            if value != "img":
+                producer = registry.producers()[value].name
+                assert order.index(producer) < order.index(detector.name)
+
+
+def test_plan_only_includes_what_targets_need(registry):
+    assert names(registry.plan({"img"}, ["edges"])) == ["gray", "edges"]
+    assert names(registry.plan({"img", "gray"}, ["mean"])) == ["mean"]
+    assert names(registry.plan({"img"}, ["height"])) == ["size"]
+
+
+def test_plan_rejects_missing_producer(registry):
+    registry.add(Detector("orphan", lambda x: x, ["unknown"], ["orphan_out"]))
+    with pytest.raises(ValueError, match="unknown"):
+        registry.plan({"img"}, ["orphan_out"])
+
+
+def test_plan_rejects_cycles():
+    registry = DetectorRegistry()
+    registry.add(Detector("a", lambda b: b, ["b"], ["a"]))
+    registry.add(Detector("b", lambda a: a, ["a"], ["b"]))
+    with pytest.raises(ValueError, match="cycle"):
+        registry.plan({"img"})
+
+
+def test_add_rejects_duplicate_names_and_outputs(registry):
+    with pytest.raises(ValueError, match="already registered"):
+        registry.add(Detector("gray", lambda img: img, ["img"], ["other"]))
+    with pytest.raises(ValueError, match="already produced"):
+        registry.add(Detector("gray2", lambda img: img, ["img"], ["gray"]))
+
+
+def test_register_decorator_and_unregister():
+    registry = DetectorRegistry()
+
+    @registry.register("double", inputs=["img"], outputs=["double"])
+    def double(img):
+        return img * 2
+
+    assert "double" in registry
+    assert registry.run({"img": 3})["double"] == 6
+    registry.unregister("double")
+    assert "double" not in registry
+
+
+def test_parallel_matches_serial(registry, executor):
+    serial = registry.run({"img": 5})
+    parallel = registry.run({"img": 5}, executor=executor)
+    assert parallel == serial
+    assert serial["score"] == (4 * 2) * 10 + (4 + 1)
+    assert (serial["width"], serial["height"]) == (5, -5)
+
+
+def test_parallel_runs_independent_detectors_concurrently(executor):
+    # edges y mean solo terminan si ambos están en marcha a la vez
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(gray):
+        barrier.wait()
+        return gray
+
+    registry = DetectorRegistry()
+    registry.add(Detector("edges", branch, ["img"], ["edges"]))
+    registry.add(Detector("mean", branch, ["img"], ["mean"]))
+    values = registry.run({"img": 1}, executor=executor)
+    assert values["edges"] == values["mean"] == 1
+
+
+def test_parallel_propagates_detector_errors(registry, executor):
+    registry.unregister("mean")
+    registry.add(Detector("mean", lambda gray: 1 / 0, ["gray"], ["mean"]))
+    with pytest.raises(ZeroDivisionError):
+        registry.run({"img": 5}, executor=executor)
+
+
+def test_timings_cover_every_planned_detector(registry, executor):
+    timings = {}
+    registry.run({"img": 5}, targets=["score"], executor=executor, timings=timings)
+    assert set(timings) == {"gray", "edges", "mean", "score"}
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+@pytest.mark.parametrize("capture", ["m1.png", "m5.png", "m15.png"])
+def test_analyze_frame_parallel_matches_serial(monkeypatch, capture):
+    img = cv2.imread(str(HERE / capture))
+    monkeypatch.setattr(ia, "PARALLEL_DETECTORS", True)
+    parallel = ia.analyze_frame(img)
+    monkeypatch.setattr(ia, "PARALLEL_DETECTORS", False)
+    assert ia.analyze_frame(img) == parallel
+
+
+def test_get_executor_creates_a_single_pool(monkeypatch):
+    monkeypatch.setattr(detector_registry, "_EXECUTOR", None)
+    barrier = threading.Barrier(8, timeout=5)
+    pools = []
+
+    def first_call():
+        barrier.wait()
+        pools.append(detector_registry.get_executor())
+
+    threads = [threading.Thread(target=first_call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(pool) for pool in pools}) == 1
+    pools[0].shutdown()
@@ -0,0 +1,191 @@
+"""
+Pruebas de refresh_scheduler: cadencias, excepción on-change y orden por plazo
+"""
+import shutil
+import threading
+from concurrent.futures import wait
+from pathlib import Path
+
+import cv2
+import pytest
+
+from refresh_scheduler import DeadlinePool, RefreshScheduler, timeframe_minutes
+
+HERE = Path(__file__).parent
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def captures(tmp_path):
+    paths = {}
+    for tf in ("m1", "m5", "m15"):
+        paths[tf] = str(tmp_path / f"{tf}.png")
+        shutil.copy(HERE / f"{tf}.png", paths[tf])
+    return paths
+
+
+@pytest.fixture
+def pool():
+    pool = DeadlinePool(workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def make_scheduler(captures, pool, clock, calls):
+    def analyze_frame(img):
+        calls.append(img.shape)
+        return {"trend": "ALCISTA", "strength": 50.0}
+
+    return RefreshScheduler(captures, analyze_frame=analyze_frame, analyze=None,
+                            pool=pool, clock=clock)
+
+
+def rewrite(path, draw):
+    img = cv2.imread(path)
+    draw(img)
+    cv2.imwrite(path, img)
+
+
+def right_edge_candle(img):
+    h, w = img.shape[:2]
+    x = int(w * 0.985)
+    cv2.rectangle(img, (x - 4, int(h * 0.2)), (x + 4, int(h * 0.8)), (0, 200, 0), -1)
+
+
+def cursor(img):
+    h, w = img.shape[:2]
+    cv2.circle(img, (w // 2, h // 2), 5, (255, 255, 255), -1)
+
+
+def test_timeframe_minutes():
+    assert timeframe_minutes("m15") == 15
+    assert timeframe_minutes("H1") == 60
+    assert timeframe_minutes("desconocido") == 1
+
+
+def test_cadence_and_priority_follow_timeframe(captures, pool):
+    scheduler = make_scheduler(captures, pool, FakeClock(), [])
+    assert scheduler.cadences["m1"] < scheduler.cadences["m5"] < scheduler.cadences["m15"]
+    assert scheduler.priorities == {"m1": 0, "m5": 1, "m15": 2}
+
+
+def test_unchanged_files_are_not_reanalyzed(captures, pool):
+    clock, calls = FakeClock(), []
+    scheduler = make_scheduler(captures, pool, clock, calls)
+
+    assert sorted(scheduler.poll(wait=True)) == ["m1", "m15", "m5"]
+    clock.now += scheduler.cadences["m15"]
+    assert scheduler.poll(wait=True) == []
+    assert len(calls) == 3
+    assert scheduler.report()["timeframes"]["m15"]["unchanged"] == 1
+
+
+def test_change_waits_for_cadence_without_override(captures, pool):
+    clock, calls = FakeClock(), []
+    scheduler = make_scheduler(captures, pool, clock, calls)
+    scheduler.poll(wait=True)
+
+    # Un cursor en mitad del gráfico no toca la franja derecha
+    rewrite(captures["m15"], cursor)
+    assert scheduler.notify([captures["m15"]]) == []
+    assert scheduler.poll(wait=True) == []
+
+    clock.now += scheduler.cadences["m15"]
+    assert "m15" in scheduler.poll(wait=True)
+
+
+def test_right_edge_candle_triggers_override(captures, pool):
+    clock, calls = FakeClock(), []
+    scheduler = make_scheduler(captures, pool, clock, calls)
+    scheduler.poll(wait=True)
+
+    clock.now += 1
+    rewrite(captures["m15"], right_edge_candle)
+    assert scheduler.notify([captures["m15"]]) == ["m15"]
+    assert scheduler.poll(wait=True) == ["m15"]
+    assert scheduler.report()["timeframes"]["m15"]["overrides"] == 1
+
+
+def test_without_analyze_frame_no_fingerprint_is_taken(captures, pool):
+    clock, paths = FakeClock(), []
+    scheduler = RefreshScheduler(captures, lambda path: paths.append(path) or {}, pool=pool, clock=clock)
+    scheduler.poll(wait=True)
+
+    assert sorted(paths) == sorted(captures.values())
+    assert all(entry["fingerprint"] is None for entry in scheduler.state.values())
+    rewrite(captures["m1"], right_edge_candle)
+    assert scheduler.notify([captures["m1"]]) == []
+
+
+def test_refresh_only_reanalyzes_changed_files(captures, pool):
+    clock, calls = FakeClock(), []
+    scheduler = make_scheduler(captures, pool, clock, calls)
+    scheduler.refresh()
+
+    rewrite(captures["m5"], cursor)
+    assert scheduler.refresh() == ["m5"]
+    assert len(calls) == 4
+
+
+def test_deadline_pool_runs_earliest_deadline_first():
+    pool = DeadlinePool(workers=1)
+    gate = threading.Event()
+    order = []
+    try:
+        pool.submit(0, 0, gate.wait)
+        futures = [pool.submit(deadline, priority, order.append, name)
+                   for deadline, priority, name in ((5, 0, "c"), (1, 1, "b"), (1, 0, "a"), (3, 0, "x"))]
+        gate.set()
+        wait(futures)
+    finally:
+        pool.shutdown()
+    assert order == ["a", "b", "x", "c"]
+
+
+def test_deadline_pool_propagates_errors():
+    pool = DeadlinePool(workers=1)
+    try:
+        future = pool.submit(0, 0, int, "no es un número")
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+    finally:
+        pool.shutdown()
+
+def test_refresh_reports_its_own_errors(captures, pool):
+    clock, calls = FakeClock(), []
+    scheduler = make_scheduler(captures, pool, clock, calls)
+    scheduler.refresh()
+
+    Path(captures["m5"]).write_bytes(b"\x89PNG a medias")
+    errors = {}
+    assert scheduler.refresh(errors=errors) == []
+    assert list(errors) == ["m5"]
+    assert "m5" in scheduler.errors
+
+    # Una llamada que no analiza m5 no hereda su fallo
+    errors = {}
+    scheduler.refresh(["m1"], errors=errors)
+    assert errors == {}
+
+    shutil.copy(HERE / "m5.png", captures["m5"])
+    rewrite(captures["m5"], cursor)
+    assert scheduler.refresh(errors=errors) == ["m5"]
+    assert errors == {} and scheduler.errors == {}
+
+
+def test_stale_failure_does_not_override_newer_analysis(captures, pool):
+    clock, calls = FakeClock(), []
+    scheduler = make_scheduler(captures, pool, clock, calls)
+    scheduler.refresh()
+
+    Path(captures["m1"]).write_bytes(b"")
+    assert scheduler._refresh("m1", ("viejo",), 0) is None
+    assert scheduler.errors == {}
+    assert scheduler.analysis("m1") is not None
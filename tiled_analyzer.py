@@ -0,0 +1,262 @@
+"""
+Análisis por franjas verticales para capturas muy anchas
+(multi-monitor, 10k+ píxeles de ancho)
+
+En lugar de mantener la imagen BGR completa, varias copias en gris y el mapa
+de bordes de Canny, recorre la imagen en franjas verticales y acumula solo las
+estadísticas por fila y por columna que necesitan los detectores. El ancho de
+cada franja se calcula a partir de un techo de memoria configurable.
+
+Los perfiles por columnas y la tendencia coinciden con el análisis completo.
+Dos diferencias conocidas:
+- Con una ruta de imagen se decodifica directamente en gris (luma del
+  decodificador), lo que puede mover la volatilidad en centésimas.
+- Canny por franjas pierde la histéresis entre franjas: edge_strength y
+  norm_pct son aproximados con franjas estrechas (no afectan a la fuerza).
+"""
+import cv2
+import numpy as np
+import os
+
+from image_analyzer import (
+    TREND_RESOLUTIONS,
+    TREND_WINDOWS,
+    build_analysis_result,
+    classify_momentum,
+    classify_recent_candles,
+    classify_reversal,
+    classify_trend,
+    classify_volatility,
+    trend_profile_from_profiles,
+)
+
+# Techo de memoria por defecto para las franjas (MB)
+DEFAULT_MAX_MEMORY_MB = 64
+# Bytes de trabajo estimados por píxel de franja: BGR, gris, suma acumulada
+# float64, cuadrados float64 y buffers internos de Canny
+BYTES_PER_PIXEL = 32
+# Ancho mínimo de franja, aunque el techo de memoria sea muy bajo
+MIN_STRIP_WIDTH = 32
+# Solape a cada lado de la franja para que Canny vea el contexto del borde
+EDGE_OVERLAP = 8
+
+
+def open_image_source(source):
+    """
+    Abre la fuente de la imagen sin decodificar copias innecesarias
+    - ndarray (incluido np.memmap): se usa tal cual, BGR o gris
+    - .npy: se mapea en memoria, solo se leen las franjas que se procesan
+    - resto de formatos: OpenCV decodifica directamente en gris
+    """
+    if isinstance(source, np.ndarray):
+        return source
+
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Image not found: {source}")
+
+    if source.lower().endswith(".npy"):
+        return np.load(source, mmap_mode="r")
+
+    img = cv2.imread(source, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"Unable to read image: {source}")
+    return img
+
+
+def detector_intervals(w):
+    """
+    Rangos de columnas [inicio, fin) cuyo perfil vertical necesita cada detector
+    Replican exactamente los cortes de image_analyzer
+    """
+    intervals = {}
+
+    # Tendencia: 20 columnas, la última se lleva el resto
+    col_width = w // 20
+    intervals["trend"] = [
+        (i * col_width, i * col_width + col_width if i < 19 else w)
+        for i in range(20)
+    ]
+
+    # Momentum: 4 secciones
+    quarter = w // 4
+    intervals["momentum"] = [
+        (0, quarter), (quarter, 2 * quarter), (2 * quarter, 3 * quarter), (3 * quarter, w)
+    ]
+
+    # Velas recientes: último 20%, completo y por mitades
+    start = int(w * 0.8)
+    half = (w - start) // 2
+    intervals["candles"] = [(start, w), (start, start + half), (start + half, w)]
+
+    # Reversión: último 30% en tres tramos
+    start = int(w * 0.7)
+    third = (w - start) // 3
+    intervals["reversal"] = [
+        (start, start + third), (start + third, start + 2 * third), (start + 2 * third, w)
+    ]
+
+    # Perfil multi-horizonte: una lista de bloques por resolución
+    for n_columns in TREND_RESOLUTIONS:
+        col_width = w // n_columns
+        starts = [i * col_width for i in range(n_columns)]
+        ends = starts[1:] + [w]
+        intervals[f"profile_{n_columns}"] = list(zip(starts, ends))
+
+    return intervals
+
+
+def strip_width_for(h, w, n_intervals, max_memory_mb):
+    """
+    Ancho de franja que respeta el techo de memoria
+    Descuenta primero los acumuladores fijos (por fila y por columna)
+    """
+    budget = max_memory_mb * 1024 * 1024
+    fixed = h * (n_intervals + 2) * 8 + w * 8
+    per_column = h * BYTES_PER_PIXEL
+    width = (budget - fixed) // per_column - 2 * EDGE_OVERLAP
+    return int(max(MIN_STRIP_WIDTH, min(w, width)))
+
+
+def accumulate_column_stats(image, intervals, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Recorre la imagen en franjas verticales y acumula:
+    - suma y suma de cuadrados por fila (desviación por filas)
+    - media por columna (diferencias entre columnas)
+    - suma por fila de cada rango de columnas (perfiles verticales)
+    - suma del mapa de bordes de Canny
+    """
+    h, w = image.shape[:2]
+    starts = np.array([a for a, _ in intervals], dtype=np.int64)
+    ends = np.array([b for _, b in intervals], dtype=np.int64)
+
+    row_sum = np.zeros(h, dtype=np.float64)
+    row_sumsq = np.zeros(h, dtype=np.float64)
+    col_mean = np.zeros(w, dtype=np.float64)
+    block_sums = np.zeros((h, len(intervals)), dtype=np.float64)
+    edge_strength = 0.0
+
+    strip_width = strip_width_for(h, w, len(intervals), max_memory_mb)
+
+    for s0 in range(0, w, strip_width):
+        s1 = min(w, s0 + strip_width)
+        e0 = max(0, s0 - EDGE_OVERLAP)
+        e1 = min(w, s1 + EDGE_OVERLAP)
+
+        strip = np.ascontiguousarray(image[:, e0:e1])
+        if strip.ndim == 3:
+            strip = cv2.cvtColor(strip, cv2.COLOR_BGR2GRAY)
+
+        # Bordes: Canny sobre la franja con solape, contando solo el núcleo
+        edges = cv2.Canny(strip, 50, 150)
+        edge_strength += float(np.sum(edges[:, s0 - e0:s1 - e0]))
+        del edges
+
+        core = strip[:, s0 - e0:s1 - e0]
+
+        # Sumas acumuladas de la franja: cualquier rango sale con una resta
+        cumsum = np.zeros((h, s1 - s0 + 1), dtype=np.float64)
+        np.cumsum(core, axis=1, dtype=np.float64, out=cumsum[:, 1:])
+
+        row_sum += cumsum[:, -1]
+        row_sumsq += np.square(core, dtype=np.uint16).sum(axis=1, dtype=np.float64)
+        col_mean[s0:s1] = core.sum(axis=0, dtype=np.float64)
+
+        # Intersección de todos los rangos con la franja, en bloque
+        a = np.clip(starts, s0, s1) - s0
+        b = np.clip(ends, s0, s1) - s0
+        block_sums += cumsum[:, b] - cumsum[:, a]
+
+    col_mean /= h
+
+    return {
+        "h": h,
+        "w": w,
+        "row_sum": row_sum,
+        "row_sumsq": row_sumsq,
+        "col_mean": col_mean,
+        "block_sums": block_sums,
+        "edge_strength": edge_strength,
+        "strip_width": strip_width,
+    }
+
+
+def analyze_image_tiled(source, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Versión por franjas de analyze_image, con el mismo formato de resultado
+    source: ruta de imagen, ruta .npy o ndarray (BGR o gris, admite np.memmap)
+    """
+    image = open_image_source(source)
+    h, w = image.shape[:2]
+
+    intervals = detector_intervals(w)
+    names = list(intervals)
+    flat = [interval for name in names for interval in intervals[name]]
+
+    column_stats = accumulate_column_stats(image, flat, max_memory_mb)
+
+    # Perfil vertical medio de cada rango -> posición del precio (argmin)
+    widths = np.array([b - a for a, b in flat], dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        block_means = column_stats["block_sums"] / widths
+
+    offset = 0
+    means = {}
+    for name in names:
+        count = len(intervals[name])
+        means[name] = block_means[:, offset:offset + count]
+        offset += count
+
+    def positions(name):
+        return list(np.argmin(means[name], axis=0))
+
+    # 1. TENDENCIA
+    trend_data = classify_trend(positions("trend"), h, w)
+
+    # 2. VOLATILIDAD (desviación por filas a partir de sumas)
+    row_mean = column_stats["row_sum"] / w
+    row_var = np.maximum(column_stats["row_sumsq"] / w - row_mean * row_mean, 0.0)
+    col_volatility = np.std(np.diff(column_stats["col_mean"]))
+    volatility_data = classify_volatility(np.mean(np.sqrt(row_var)), col_volatility)
+
+    # 3. MOMENTUM
+    momentum_data = classify_momentum(positions("momentum"), h)
+
+    # 4. VELAS RECIENTES
+    _, left_pos, right_pos = positions("candles")
+    vertical_variance = np.var(means["candles"][:, 0])
+    candle_analysis = classify_recent_candles(vertical_variance, left_pos, right_pos, h)
+
+    # 5. REVERSIÓN
+    reversal_signals = classify_reversal(*positions("reversal"), h)
+
+    # 6. PERFIL MULTI-HORIZONTE
+    profiles = [np.array(positions(f"profile_{n}")) for n in TREND_RESOLUTIONS]
+    trend_profile = trend_profile_from_profiles(
+        profiles, h, w, TREND_RESOLUTIONS, TREND_WINDOWS
+    )
+
+    return build_analysis_result(
+        trend_data,
+        volatility_data,
+        momentum_data,
+        candle_analysis,
+        reversal_signals,
+        trend_profile,
+        column_stats["edge_strength"],
+        h, w
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    paths = sys.argv[1:] or ["m1.png", "m5.png", "m15.png"]
+
+    for path in paths:
+        if os.path.exists(path):
+            try:
+                result = analyze_image_tiled(path)
+                print(f"{os.path.basename(path)}: {result['trend']} · "
+                      f"fuerza {result['strength']}% · {result['market_state']}")
+            except Exception as e:
+                print(f"❌ Error: {e}")
@@ -1,14 +1,102 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, render_template_string, Response, g
+from werkzeug.exceptions import RequestEntityTooLarge
+import math
 import os
 import traceback
 import json
+import gzip
+import hashlib
+import hmac
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from admission import AdmissionController
+from market_state import MarketState
+from signal_plan import TIMEFRAMES, combine_signal
+from single_flight import SingleFlight
+
+try:
+    import msgpack  # opcional: respuestas MessagePack con Accept: application/msgpack
+except ImportError:
+    msgpack = None
+
 UPLOAD_FOLDER = os.path.dirname(__file__)
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "bmp"}
+# Análisis simultáneos por petición en /analyze
+ANALYZE_WORKERS = 4
+# Dónde se ejecuta el análisis de /analyze: "threads" (en este proceso) o
+# "processes" (pool de procesos alimentado por memoria compartida)
+ANALYSIS_BACKEND = os.environ.get("ANALYZER_BACKEND", "threads")
+ANALYSIS_PROCESSES = int(os.environ.get("ANALYZER_ANALYSIS_PROCESSES", os.cpu_count() or 1))
+# Reutilizar el análisis de capturas casi idénticas (ver frame_dedup.py);
+# opcional: una huella no garantiza que el análisis sea el mismo
+DEDUP_ENABLED = os.environ.get("ANALYZER_DEDUP", "0") == "1"
+
+# Semilla por defecto de GET /plan: todos los clientes ven el mismo plan
+# dentro de cada ventana de interval_minutes
+PLAN_SEED = int(os.environ.get("ANALYZER_PLAN_SEED", 0))
+
+# Clave de las señales de las imágenes sin símbolo en /analyze y /grid
+# (reservada: no se admite como símbolo)
+DEFAULT_SYMBOL = "default"
+
+# Medias de /upload compartidas entre workers (relativo a UPLOAD_FOLDER)
+MARKET_STATE_FILE = os.environ.get("ANALYZER_MARKET_STATE_FILE", "market_state.json")
+
+# Endpoints que analizan imágenes: pasan por el control de admisión
+ADMISSION_ENDPOINTS = ("upload", "analyze", "grid")
+# Cabecera con la IP real del cliente detrás de un proxy (p. ej. X-Forwarded-For)
+CLIENT_HEADER = os.environ.get("ANALYZER_CLIENT_HEADER")
+
+# Token de los endpoints /admin (cabecera X-Admin-Token o Authorization:
+# Bearer); sin token configurado esos endpoints no existen
+ADMIN_TOKEN = os.environ.get("ANALYZER_ADMIN_TOKEN")
+# Duración máxima de una sesión de /admin/profile (segundos)
+PROFILE_MAX_SECONDS = float(os.environ.get("ANALYZER_PROFILE_MAX_SECONDS", 60))
+
+# Respuestas más pequeñas que esto no se comprimen
+GZIP_MIN_BYTES = 1024
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Modo producción (python upload_capture.py --production): gunicorn con
+# varios procesos, cada uno con varios hilos. Todo se puede sobrescribir
+# por variables de entorno o por línea de comandos
+SERVER_CONFIG = {
+    "host": os.environ.get("ANALYZER_HOST", "0.0.0.0"),
+    "port": int(os.environ.get("ANALYZER_PORT", 5000)),
+    "workers": int(os.environ.get("ANALYZER_PROCESSES", os.cpu_count() or 1)),
+    "threads": int(os.environ.get("ANALYZER_THREADS", 4)),
+    "timeout": int(os.environ.get("ANALYZER_TIMEOUT", 60)),
+    "graceful_timeout": int(os.environ.get("ANALYZER_GRACEFUL_TIMEOUT", 30)),
+    "backlog": int(os.environ.get("ANALYZER_BACKLOG", 64)),
+}
+
+_analysis_pool = None
+_shared_analyzer = None
+_shared_analyzer_lock = threading.Lock()
+_frame_index = None
+_grid_splitter = None
+_slot_scheduler = None
+_slot_scheduler_lock = threading.Lock()
+# Última sesión de /admin/profile (en curso o terminada): {"id", "format", "profiler"}
+_profile_session = None
+_profiler_lock = threading.Lock()
+# Análisis en curso por hash de la imagen: peticiones simultáneas de la
+# misma captura esperan y comparten un único cálculo
+_flights = SingleFlight()
+_admission = AdmissionController()
+# Medias por timeframe de las capturas subidas a /upload (ver market_state())
+_market_state = None
+_market_state_lock = threading.Lock()
 
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Cuerpos sin Content-Length (chunked) también se cortan al leerlos
+app.config["MAX_CONTENT_LENGTH"] = _admission.max_body_bytes
 
 HTML_TEMPLATE = r'''
 <!DOCTYPE html>
@@ -266,6 +354,267 @@ HTML_TEMPLATE = r'''
 def allowed(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def analysis_pool():
+    global _analysis_pool
+    if _analysis_pool is None:
+        _analysis_pool = ThreadPoolExecutor(max_workers=ANALYZE_WORKERS, thread_name_prefix="analyze")
+    return _analysis_pool
+
+def shared_analyzer():
+    global _shared_analyzer
+    with _shared_analyzer_lock:
+        if _shared_analyzer is None:
+            from shared_frames import SharedFrameAnalyzer
+            _shared_analyzer = SharedFrameAnalyzer(processes=ANALYSIS_PROCESSES)
+    return _shared_analyzer
+
+def frame_index():
+    global _frame_index
+    if _frame_index is None:
+        from frame_dedup import FrameIndex
+        _frame_index = FrameIndex()
+    return _frame_index
+
+def grid_splitter():
+    global _grid_splitter
+    if _grid_splitter is None:
+        from chart_grid import GridSplitter
+        _grid_splitter = GridSplitter()
+    return _grid_splitter
+
+def slot_scheduler():
+    """
+    Refresco de las capturas de /upload: cada timeframe se re-analiza solo
+    si su archivo cambió (ver refresh_scheduler)
+    """
+    global _slot_scheduler
+    folder = app.config["UPLOAD_FOLDER"]
+    sources = {tf: os.path.join(folder, f"{tf}.png") for tf in TIMEFRAMES}
+    with _slot_scheduler_lock:
+        if _slot_scheduler is None or _slot_scheduler.sources != sources:
+            from refresh_scheduler import RefreshScheduler
+            _slot_scheduler = RefreshScheduler(sources, analyze_path)
+        return _slot_scheduler
+
+def market_state():
+    """
+    Medias por timeframe de /upload, en un JSON junto a las capturas que
+    comparten todos los workers: /plan y la señal suavizada no dependen de
+    qué proceso atienda la petición
+    """
+    global _market_state
+    path = os.path.join(app.config["UPLOAD_FOLDER"], MARKET_STATE_FILE)
+    with _market_state_lock:
+        if _market_state is None or _market_state.path != path:
+            _market_state = MarketState(path=path)
+        return _market_state
+
+def analyze_decoded(img):
+    """
+    Analiza una imagen ya decodificada con el backend configurado
+    Devuelve (análisis, distancia); la distancia solo existe si se reutilizó
+    el análisis de una captura casi idéntica
+    """
+    from image_analyzer import analyze_frame
+
+    def run(frame):
+        if ANALYSIS_BACKEND == "processes":
+            # Solo un descriptor del segmento compartido viaja al proceso
+            return shared_analyzer().submit(frame).result()
+        return analyze_frame(frame)
+
+    if not DEDUP_ENABLED:
+        return run(img), None
+
+    from frame_dedup import analyze_deduplicated
+    return analyze_deduplicated(img, frame_index(), run)
+
+def analyze_bytes(data, deadline_ms=None, started=None):
+    """
+    analyze_decoded sobre los bytes de una imagen, coalesciendo duplicados
+    Con deadline_ms la calidad se adapta al presupuesto (adaptive_quality.py):
+    ese análisis no se comparte ni se guarda para deduplicar. El presupuesto
+    corre desde started (perf_counter de la llegada de la petición): incluye
+    la espera en el pool y el decodificado
+    """
+    from image_analyzer import decode_image
+
+    if deadline_ms is not None:
+        from adaptive_quality import analyze_frame_within, bytes_decode_key
+
+        decode_started = time.perf_counter()
+        started = decode_started if started is None else started
+        img = decode_image(data)
+        decode_ms = (time.perf_counter() - decode_started) * 1000
+        h, w = img.shape[:2]
+        return analyze_frame_within(img, deadline_ms, started=started,
+                                    steps={bytes_decode_key(data): (decode_ms, h * w / 1e6)},
+                                    waited_ms=(decode_started - started) * 1000), None
+
+    key = hashlib.sha1(data).hexdigest()
+    return _flights.do(key, lambda: analyze_decoded(decode_image(data)))
+
+def analyze_path(path):
+    with open(path, "rb") as f:
+        return analyze_bytes(f.read())[0]
+
+def reset_analysis_pool():
+    # Los hilos no sobreviven a fork(): cada worker crea sus propios pools.
+    # La admisión también: su candado y sus contadores serían los del maestro
+    global _analysis_pool, _shared_analyzer, _shared_analyzer_lock, _flights
+    global _slot_scheduler, _slot_scheduler_lock, _admission
+    global _market_state, _market_state_lock
+    _analysis_pool = None
+    _slot_scheduler = None
+    _slot_scheduler_lock = threading.Lock()
+    _shared_analyzer = None
+    _shared_analyzer_lock = threading.Lock()
+    _flights = SingleFlight()
+    _admission = AdmissionController()
+    _market_state = None
+    _market_state_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_analysis_pool)
+
+def select_fields(data, paths):
+    # fields=signal.signal,signal.details.m15.trend -> solo esas rutas
+    # (en listas la ruta se aplica a cada elemento)
+    tree = {}
+    for path in paths:
+        node = tree
+        keys = path.split(".")
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+            if node is True:
+                break
+        else:
+            node[keys[-1]] = True
+    return apply_field_tree(data, tree)
+
+def apply_field_tree(data, tree):
+    if tree is True:
+        return data
+    if isinstance(data, list):
+        return [apply_field_tree(item, tree) for item in data]
+    if isinstance(data, dict):
+        return {k: apply_field_tree(data[k], sub) for k, sub in tree.items() if k in data}
+    return data
+
+def respond(payload, status=200, compact=None):
+    """
+    Codifica la respuesta según lo que pide el cliente:
+    - ?compact=1 usa la vista compacta del endpoint (si la tiene)
+    - ?fields=a,b.c filtra campos
+    - Accept: application/msgpack -> MessagePack (si está instalado), si no JSON
+    - Accept-Encoding: gzip -> cuerpo comprimido
+    - ETag / If-None-Match -> 304 si el resultado no cambió (solo GET/HEAD;
+      ETag débil: el mismo resultado con o sin gzip)
+    """
+    if compact is not None and request.args.get("compact", "").lower() in ("1", "true", "yes"):
+        payload = compact
+
+    fields = request.args.get("fields")
+    if fields:
+        payload = select_fields(payload, [f.strip() for f in fields.split(",") if f.strip()])
+
+    mimetype = "application/json"
+    if msgpack is not None:
+        best = request.accept_mimetypes.best_match(("application/json",) + MSGPACK_TYPES)
+        if best in MSGPACK_TYPES:
+            mimetype = best
+
+    if mimetype == "application/json":
+        body = app.json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    else:
+        body = msgpack.packb(payload, use_bin_type=True)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+
+    if status == 200 and request.method in ("GET", "HEAD"):
+        etag = hashlib.sha1(body).hexdigest()
+        headers["ETag"] = f'W/"{etag}"'
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.accept_encodings:
+        body = gzip.compress(body, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(body, status=status, mimetype=mimetype, headers=headers)
+
+def compact_signal(result):
+    return {
+        "signal": result["signal"],
+        "confidence": result["confidence"],
+        "trends": {tf: frame.get("trend") for tf, frame in result["details"].items()}
+    }
+
+def client_key():
+    if CLIENT_HEADER:
+        forwarded = request.headers.get(CLIENT_HEADER, "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.remote_addr or "unknown"
+
+def reject(status, error, retry_after=None):
+    response = respond({"error": error}, status)
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@app.before_request
+def admit():
+    """
+    Control de admisión antes de leer el cuerpo: tamaño (413), cubeta de
+    tokens del cliente (429) y análisis en curso del proceso (429)
+    """
+    if request.endpoint not in ADMISSION_ENDPOINTS:
+        return None
+
+    if not _admission.check_size(request.content_length):
+        return reject(413, f"request body exceeds {_admission.max_body_bytes} bytes")
+
+    wait = _admission.rate_limit(client_key())
+    if wait:
+        return reject(429, "rate limit exceeded", wait)
+
+    if not _admission.acquire():
+        return reject(429, "server busy, retry later", 1)
+    g.admitted = True
+    return None
+
+@app.teardown_request
+def release_admission(exc=None):
+    if g.pop("admitted", False):
+        _admission.release()
+
+@app.teardown_request
+def count_profiled_request(exc=None):
+    session = _profile_session
+    if session is not None and not session["profiler"].done.is_set() \
+            and request.endpoint in ADMISSION_ENDPOINTS:
+        session["profiler"].count_request()
+
+@app.errorhandler(RequestEntityTooLarge)
+def too_large(e):
+    _admission.record("too_large")
+    return reject(413, f"request body exceeds {_admission.max_body_bytes} bytes")
+
+def log_signal(result, message):
+    try:
+        entry = {
+            "timestamp": datetime.now().isoformat(sep=" ", timespec="seconds"),
+            "signal": result.get("signal"),
+            "confidence": result.get("confidence"),
+            "details": result.get("details", {}),
+            "message": message
+        }
+        with open(os.path.join(app.config["UPLOAD_FOLDER"], "signals.log"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
+
 @app.route("/", methods=["GET"])
 def index():
     return render_template_string(HTML_TEMPLATE)
@@ -275,80 +624,422 @@ def status():
     m1_exists = os.path.exists(os.path.join(app.config["UPLOAD_FOLDER"], "m1.png"))
     m5_exists = os.path.exists(os.path.join(app.config["UPLOAD_FOLDER"], "m5.png"))
     m15_exists = os.path.exists(os.path.join(app.config["UPLOAD_FOLDER"], "m15.png"))
-    return jsonify({"m1": m1_exists, "m5": m5_exists, "m15": m15_exists})
+    return respond({"m1": m1_exists, "m5": m5_exists, "m15": m15_exists})
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return respond({
+        "dedup": frame_index().report() if DEDUP_ENABLED else None,
+        "coalescing": _flights.report(),
+        "admission": _admission.report(),
+        "market_state": market_state().report(),
+        "grid": grid_splitter().report(),
+        "refresh": slot_scheduler().report()
+    })
+
+@app.route("/plan", methods=["GET"])
+def plan():
+    """
+    Plan de 24 señales a partir del estado suavizado de M1, M5 y M15
+    La plantilla está memoizada por ventana: las repeticiones solo re-sellan horas
+    """
+    from signal_plan import generate_trading_signals
+
+    state = market_state()
+    smoothed = {tf: state.snapshot(tf) for tf in TIMEFRAMES}
+    missing = [tf for tf, snapshot in smoothed.items() if snapshot is None]
+    if missing:
+        return respond({"error": f"no analyses yet for: {', '.join(missing)}"}, 409)
+
+    try:
+        seed = int(request.args.get("seed", PLAN_SEED))
+    except ValueError:
+        return respond({"error": "seed must be an integer"}, 400)
+
+    signals = generate_trading_signals(smoothed["m1"], smoothed["m5"], smoothed["m15"], seed=seed)
+    return respond({"seed": seed, "signals": signals})
+
+def save_atomically(file, filepath):
+    """
+    Guarda la subida en un temporal de la misma carpeta y lo renombra encima
+    de filepath: quien esté decodificando la captura anterior nunca lee una a medias
+    """
+    folder, name = os.path.split(filepath)
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}-", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            file.save(f)
+        # mkstemp crea el archivo con 0600; las capturas se leen como antes
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
 
 @app.route("/upload", methods=["POST"])
 def upload():
     if "file" not in request.files:
-        return jsonify({"error": "no file part"}), 400
+        return respond({"error": "no file part"}, 400)
 
     file = request.files["file"]
     slot = request.form.get("slot", "m1")
 
     if file.filename == "":
-        return jsonify({"error": "no selected file"}), 400
+        return respond({"error": "no selected file"}, 400)
 
     if not allowed(file.filename):
-        return jsonify({"error": "file type not allowed"}), 400
+        return respond({"error": "file type not allowed"}, 400)
 
     filename = f"{slot}.png"
     filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(filepath)
+    save_atomically(file, filepath)
 
-    m1_path = os.path.join(app.config["UPLOAD_FOLDER"], "m1.png")
-    m5_path = os.path.join(app.config["UPLOAD_FOLDER"], "m5.png")
-    m15_path = os.path.join(app.config["UPLOAD_FOLDER"], "m15.png")
+    scheduler = slot_scheduler()
 
     try:
-        if os.path.exists(m1_path) and os.path.exists(m5_path) and os.path.exists(m15_path):
-            from image_analyzer import analyze_image
+        if all(os.path.exists(path) for path in scheduler.sources.values()):
             # Si tú ya tienes strategy.py / signal_generator.py, déjalos como están:
             # from strategy import trading_strategy
             # from signal_generator import generate_signal
 
-            m1 = analyze_image(m1_path)
-            m5 = analyze_image(m5_path)
-            m15 = analyze_image(m15_path)
+            # Solo se re-analizan las capturas cuyo archivo cambió (la recién
+            # subida, o las que aún no tienen análisis); el resto se reutiliza
+            errors = {}
+            scheduler.refresh(errors=errors)
+            if errors:
+                raise ValueError("; ".join(f"{tf}: {error}" for tf, error in errors.items()))
+            analyses = scheduler.analyses()
+            analyses = {tf: analyses[tf] for tf in TIMEFRAMES}
+
+            # Solo la captura recién subida entra en las medias; las otras
+            # solo se incorporan si su timeframe aún no tiene historial
+            state = market_state()
+            smoothed = {
+                tf: state.update(tf, analysis, only_if_new=(tf != slot))
+                for tf, analysis in analyses.items()
+            }
 
             # Si no tienes strategy.py, aquí puedes devolver diagnóstico simple
             # (si ya lo tienes, reemplaza esto por tu trading_strategy real)
-            result = {
-                "signal": "COMPRA" if str(m15.get("trend","")).lower() == "alcista" else "VENTA",
-                "confidence": int((float(m1.get("strength",50))+float(m5.get("strength",50))+float(m15.get("strength",50))) / 3),
-                "details": {"m1": m1, "m5": m5, "m15": m15}
-            }
+            # La señal sale del estado suavizado; los detalles son los análisis
+            result = combine_signal(smoothed["m1"], smoothed["m5"], smoothed["m15"])
+            result["details"] = analyses
+            result["smoothed"] = smoothed
             message = "✅ Listo. Sube nuevas capturas cuando cambie el mercado."
 
             # Log
-            try:
-                entry = {
-                    "timestamp": datetime.now().isoformat(sep=" ", timespec="seconds"),
-                    "signal": result.get("signal"),
-                    "confidence": result.get("confidence"),
-                    "details": result.get("details", {}),
-                    "message": message
-                }
-                with open(os.path.join(app.config["UPLOAD_FOLDER"], "signals.log"), "a", encoding="utf-8") as f:
-                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-            except Exception:
-                pass
+            log_signal(result, message)
 
-            return jsonify({
+            compact = {"saved": filename}
+            compact.update(compact_signal(result))
+            return respond({
                 "saved": filename,
                 "signal": result,
                 "message": message
-            }), 200
+            }, 200, compact=compact)
 
     except Exception as e:
-        tb = traceback.format_exc()
-        return jsonify({
-            "saved": filename,
-            "error": str(e),
-            "trace": tb
-        }), 500
+        error = {"saved": filename, "error": str(e)}
+        # La traza completa solo en modo desarrollo
+        if app.debug:
+            error["trace"] = traceback.format_exc()
+        return respond(error, 500)
+
+    return respond({"saved": filename}, 200)
+
+@app.route("/analyze", methods=["POST"])
+def analyze():
+    """
+    Analiza varias capturas en una sola petición, en memoria y en paralelo.
+    Cada parte del multipart se etiqueta con su nombre de campo:
+    "m5" o "EURUSD:m5" (símbolo opcional). Devuelve todos los análisis y la
+    señal combinada de cada símbolo que tenga M1, M5 y M15.
+    deadline_ms (campo o cabecera X-Deadline-Ms): presupuesto por imagen; la
+    calidad usada va en analysis.quality
+    """
+    started = time.perf_counter()
+    deadline_ms = request.form.get("deadline_ms") or request.headers.get("X-Deadline-Ms")
+    try:
+        deadline_ms = float(deadline_ms) if deadline_ms else None
+    except ValueError:
+        return respond({"error": "deadline_ms must be a number"}, 400)
+
+    items = []
+    seen = set()
+    for field, file in request.files.items(multi=True):
+        symbol, _, timeframe = field.rpartition(":")
+        symbol = symbol.strip() or None
+        timeframe = timeframe.strip().lower()
+
+        if not timeframe:
+            return respond({"error": f"missing timeframe in field '{field}'"}, 400)
+        if symbol == DEFAULT_SYMBOL:
+            return respond({"error": f"symbol '{DEFAULT_SYMBOL}' is reserved for untagged images"}, 400)
+        if file.filename and not allowed(file.filename):
+            return respond({"error": f"file type not allowed: {file.filename}"}, 400)
+        if (symbol, timeframe) in seen:
+            return respond({"error": f"duplicate image for '{field}'"}, 400)
+        seen.add((symbol, timeframe))
+
+        items.append({"symbol": symbol, "timeframe": timeframe,
+                      "filename": file.filename, "data": file.read()})
+
+    if not items:
+        return respond({"error": "no images"}, 400)
+
+    futures = [analysis_pool().submit(analyze_bytes, item.pop("data"), deadline_ms, started)
+               for item in items]
+
+    analyses = {}
+    for item, future in zip(items, futures):
+        try:
+            item["analysis"], distance = future.result()
+            if distance is not None:
+                item["deduplicated"] = {"distance": distance}
+            analyses[(item["symbol"], item["timeframe"])] = item["analysis"]
+        except Exception as e:
+            item["error"] = str(e)
+
+    signals = {}
+    compact = {}
+    for symbol in dict.fromkeys(item["symbol"] for item in items):
+        key = symbol or DEFAULT_SYMBOL
+        frames = [analyses.get((symbol, tf)) for tf in TIMEFRAMES]
+        if all(frames):
+            result = combine_signal(*frames)
+            log_signal(result, "API /analyze")
+            signals[key] = {
+                "signal": result["signal"],
+                "confidence": result["confidence"]
+            }
+        compact[key] = dict(signals.get(key, {}))
+        compact[key]["trends"] = {
+            tf: frame.get("trend") for (sym, tf), frame in analyses.items() if sym == symbol
+        }
+
+    return respond({"results": items, "signals": signals}, 200, compact={"signals": compact})
+
+@app.route("/grid", methods=["POST"])
+def grid():
+    """
+    Una captura con varios gráficos en cuadrícula. Detecta los paneles (o
+    usa grid=ROWSxCOLS), analiza cada uno en paralelo sobre la misma imagen
+    decodificada y devuelve un análisis por panel.
+    labels: etiquetas en orden de lectura ("EURUSD:m5", "m5" o "EURUSD");
+    los símbolos con M1, M5 y M15 reciben su señal combinada.
+    plans=1: plan de señales de cada símbolo completo y de cada panel suelto
+    """
+    from chart_grid import analyze_panels, panel_plan, parse_grid, parse_labels, uniform_grid
+    from image_analyzer import decode_image
+    from signal_plan import generate_trading_signals
+
+    file = request.files.get("file")
+    if file is None:
+        return respond({"error": "no file part"}, 400)
+    if file.filename and not allowed(file.filename):
+        return respond({"error": f"file type not allowed: {file.filename}"}, 400)
+
+    plans = request.form.get("plans", "").lower() in ("1", "true", "yes")
+    try:
+        seed = int(request.form.get("seed", PLAN_SEED))
+        img = decode_image(file.read())
+        spec = request.form.get("grid")
+        rects = uniform_grid(img.shape, *parse_grid(spec)) if spec else grid_splitter().panels(img)
+    except ValueError as e:
+        return respond({"error": str(e)}, 400)
 
-    return jsonify({"saved": filename}), 200
+    labels = parse_labels(request.form.get("labels"), len(rects))
+    if any(symbol == DEFAULT_SYMBOL and timeframe is not None for _, symbol, timeframe in labels):
+        return respond({"error": f"symbol '{DEFAULT_SYMBOL}' is reserved for untagged panels"}, 400)
+
+    results = analyze_panels(img, rects, analyze=analyze_decoded, executor=analysis_pool())
+
+    panels = []
+    analyses = {}
+    for (rect, result, error), (label, symbol, timeframe) in zip(results, labels):
+        panel = {"label": label, "rect": list(rect)}
+        if error is not None:
+            panel["error"] = str(error)
+        else:
+            panel["analysis"], distance = result
+            if distance is not None:
+                panel["deduplicated"] = {"distance": distance}
+            if timeframe is not None:
+                analyses[(symbol, timeframe)] = panel["analysis"]
+            elif plans:
+                panel["plan"] = panel_plan(panel["analysis"], seed)
+        panels.append(panel)
+
+    signals = {}
+    for symbol in dict.fromkeys(symbol for symbol, _ in analyses):
+        frames = [analyses.get((symbol, tf)) for tf in TIMEFRAMES]
+        if all(frames):
+            result = combine_signal(*frames)
+            log_signal(result, "API /grid")
+            signals[symbol or DEFAULT_SYMBOL] = {"signal": result["signal"], "confidence": result["confidence"]}
+            if plans:
+                signals[symbol or DEFAULT_SYMBOL]["plan"] = generate_trading_signals(*frames, seed=seed)
+
+    compact = {
+        "panels": [{"label": p["label"], "trend": p.get("analysis", {}).get("trend"),
+                    "strength": p.get("analysis", {}).get("strength")} for p in panels],
+        "signals": {key: {"signal": s["signal"], "confidence": s["confidence"]} for key, s in signals.items()}
+    }
+    return respond({"panels": panels, "signals": signals}, 200, compact=compact)
+
+def is_admin():
+    supplied = request.headers.get("X-Admin-Token", "")
+    authorization = request.headers.get("Authorization", "")
+    if not supplied and authorization.startswith("Bearer "):
+        supplied = authorization[len("Bearer "):]
+    return bool(supplied) and hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+def admin_error():
+    """Respuesta de error si la petición no puede usar /admin (None si puede)"""
+    if not ADMIN_TOKEN:
+        return respond({"error": "not found"}, 404)
+    if not is_admin():
+        return respond({"error": "forbidden"}, 403)
+    return None
+
+@app.route("/admin/profile", methods=["POST"])
+def admin_profile():
+    """
+    Empieza a perfilar este proceso por muestreo, en segundo plano, mientras
+    atiende tráfico real. seconds=N (por defecto 10) o requests=N (hasta N
+    peticiones de análisis, con seconds como límite); format=collapsed|chrome|json;
+    interval_ms. Responde 202 al momento con la URL del resultado
+    (DELETE sobre ella termina la sesión antes de tiempo).
+    Con gunicorn solo se perfila el worker que recibe esta petición
+    """
+    global _profile_session
+    from profiler import DEFAULT_INTERVAL_MS, FORMATS, SamplingProfiler
+
+    error = admin_error()
+    if error is not None:
+        return error
+
+    fmt = request.args.get("format", "collapsed")
+    if fmt not in FORMATS:
+        return respond({"error": f"format must be one of: {', '.join(FORMATS)}"}, 400)
+    try:
+        seconds = min(float(request.args.get("seconds", 10)), PROFILE_MAX_SECONDS)
+        max_requests = int(request.args["requests"]) if "requests" in request.args else None
+        interval_ms = max(1.0, float(request.args.get("interval_ms", DEFAULT_INTERVAL_MS)))
+    except ValueError:
+        return respond({"error": "seconds, requests and interval_ms must be numbers"}, 400)
+
+    with _profiler_lock:
+        session = _profile_session
+        if session is not None and not session["profiler"].done.is_set():
+            return respond({"error": "a profiling session is already running", "id": session["id"]}, 409)
+        profiler = SamplingProfiler(interval_ms, keep_timeline=(fmt == "chrome"), max_requests=max_requests)
+        session = _profile_session = {"id": secrets.token_hex(8), "format": fmt,
+                                      "profiler": profiler.start(seconds)}
+
+    return respond({"id": session["id"], "status": "running", "seconds": seconds,
+                    "requests": max_requests, "result": f"/admin/profile/{session['id']}"}, 202)
+
+@app.route("/admin/profile/<session_id>", methods=["GET", "DELETE"])
+def admin_profile_result(session_id):
+    """
+    Resultado de una sesión de /admin/profile: GET (solo lectura) da 202
+    mientras sigue en curso y el perfil en el formato pedido cuando termina;
+    DELETE la termina ya y devuelve el perfil
+    """
+    error = admin_error()
+    if error is not None:
+        return error
+
+    session = _profile_session
+    if session is None or not hmac.compare_digest(session["id"], session_id):
+        return respond({"error": "unknown profiling session"}, 404)
+    profiler = session["profiler"]
+    if request.method == "DELETE":
+        profiler.done.set()
+    if not profiler.done.is_set():
+        return respond({"id": session["id"], "status": "running",
+                        "samples": profiler.samples, "requests": profiler.requests}, 202)
+
+    profiler.stop()
+    fmt = session["format"]
+    if fmt == "json":
+        return respond(profiler.summary())
+    body = profiler.export(fmt)
+    filename = "profile.json" if fmt == "chrome" else "profile.folded"
+    return Response(body, mimetype="application/json" if fmt == "chrome" else "text/plain",
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+# ==================== MODO PRODUCCIÓN ====================
+
+def warm_up():
+    """
+    Importa el analizador y ejecuta un análisis sobre una imagen sintética:
+    carga OpenCV/NumPy/SciPy e inicializa sus cachés antes de atender tráfico
+    """
+    import numpy as np
+    from image_analyzer import analyze_frame
+
+    frame = np.full((240, 480, 3), 255, dtype=np.uint8)
+    frame[np.arange(240), np.arange(0, 480, 2)] = 0
+    analyze_frame(frame)
+
+def run_production(config=None):
+    """
+    Sirve la app con gunicorn (POSIX): módulos y cachés se cargan en el
+    proceso maestro antes de hacer fork (los workers los comparten por
+    copy-on-write), cada worker se calienta al arrancar y SIGTERM drena las
+    peticiones en curso durante graceful_timeout segundos
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("❌ El modo producción requiere gunicorn: pip install gunicorn")
+
+    config = dict(SERVER_CONFIG, **(config or {}))
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{config['host']}:{config['port']}")
+            self.cfg.set("workers", config["workers"])
+            self.cfg.set("threads", config["threads"])
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", config["timeout"])
+            self.cfg.set("graceful_timeout", config["graceful_timeout"])
+            self.cfg.set("backlog", config["backlog"])
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", lambda server, worker: warm_up())
+
+        def load(self):
+            return app
+
+    warm_up()
+    # Las medias de /upload arrancan vacías en cada despliegue
+    market_state().clear()
+    print(f"🚀 Producción en {config['host']}:{config['port']} · "
+          f"{config['workers']} procesos × {config['threads']} hilos")
+    ProductionServer().run()
 
 if __name__ == "__main__":
-    # Mantengo tu configuración local
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trading Signal Analyzer")
+    parser.add_argument("--production", action="store_true",
+                        help="Servir con gunicorn (varios procesos precargados)")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int, help="Procesos")
+    parser.add_argument("--threads", type=int, help="Hilos por proceso")
+    parser.add_argument("--graceful-timeout", type=int)
+    args = parser.parse_args()
+
+    if args.production:
+        overrides = {k: v for k, v in vars(args).items() if v is not None and k != "production"}
+        run_production(overrides)
+    else:
+        # Mantengo tu configuración local
+        market_state().clear()
+        app.run(host=args.host or "0.0.0.0", port=args.port or 5000, debug=True)
@@ -0,0 +1,272 @@
+"""
+Ingesta de grabaciones: vídeo o secuencias de capturas numeradas
+
+En lugar de capturas manuales, analiza sesiones grabadas. La grabación se
+divide en segmentos de tiempo y cada segmento lo decodifica y analiza un
+proceso distinto (decodificación en paralelo, no solo análisis). Dentro del
+segmento solo se decodifican los fotogramas muestreados:
+- cada every_seconds segundos de metraje, y opcionalmente
+- solo si cambian respecto al último analizado (huella perceptual)
+
+Los segmentos en curso están acotados (cada proceso tiene un solo fotograma
+en memoria) y los resultados salen en orden como un flujo de registros con
+marca de tiempo.
+
+    python video_ingest.py sesion.mp4 --every 5 --on-change
+    python video_ingest.py m1=m1.mp4 m5=m5.mp4 m15=capturas_m15/ --out analisis.jsonl
+"""
+import heapq
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import cv2
+
+from frame_dedup import fingerprint, hamming
+from signal_plan import TIMEFRAMES, combine_signal
+
+# Segundos de metraje entre fotogramas analizados
+DEFAULT_EVERY_SECONDS = 5.0
+# Segundos de metraje por segmento (unidad de trabajo de cada proceso)
+DEFAULT_SEGMENT_SECONDS = 120.0
+# Fotogramas por segundo asumidos para secuencias de imágenes
+DEFAULT_SEQUENCE_FPS = 1.0
+# Bits de huella por debajo de los cuales un fotograma "no cambió"
+DEFAULT_CHANGE_DISTANCE = 6
+# Saltos mayores que esto (en fotogramas) usan seek en lugar de grab()
+SEEK_MIN_FRAMES = 120
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def open_recording(source, fps=None):
+    """
+    Describe una grabación sin decodificarla
+    - directorio: imágenes ordenadas por nombre
+    - patrón printf ("frames/%05d.png") o archivo de vídeo: OpenCV
+    frame_count es None si la fuente no lo indica (algunos flujos dan 0)
+    """
+    if os.path.isdir(source):
+        frames = sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if not frames:
+            raise ValueError(f"No images in directory: {source}")
+        return {"source": source, "kind": "sequence", "frames": frames,
+                "frame_count": len(frames), "fps": fps or DEFAULT_SEQUENCE_FPS}
+
+    if "%" not in source and not os.path.exists(source):
+        raise FileNotFoundError(f"Recording not found: {source}")
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Unable to open recording: {source}")
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    native_fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+
+    if "%" in source:
+        native_fps = 0
+    return {"source": source, "kind": "video", "frames": None,
+            "frame_count": frame_count if frame_count > 0 else None, "fps": native_fps or fps or DEFAULT_SEQUENCE_FPS}
+
+
+def plan_segments(recording, every_seconds, segment_seconds):
+    """
+    Divide la grabación en segmentos (inicio, fin) alineados al muestreo
+    Sin frame_count hay un único segmento abierto (fin None) hasta el final
+    """
+    step = max(1, round(every_seconds * recording["fps"]))
+    per_segment = max(step, round(segment_seconds * recording["fps"]) // step * step)
+    count = recording["frame_count"]
+    if count is None:
+        return step, [(0, None)]
+    return step, [(start, min(count, start + per_segment)) for start in range(0, count, per_segment)]
+
+
+def iter_sampled_frames(recording, start, end, step):
+    """(índice, imagen BGR) de los fotogramas muestreados del segmento"""
+    indices = range(start, end, step) if end is not None else itertools.count(start, step)
+    if recording["kind"] == "sequence":
+        for index in indices:
+            img = cv2.imread(recording["frames"][index])
+            if img is not None:
+                yield index, img
+        return
+
+    capture = cv2.VideoCapture(recording["source"])
+    try:
+        position = 0
+        for index in indices:
+            if index - position > SEEK_MIN_FRAMES or index < position:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+                position = index
+            # grab() avanza sin convertir ni copiar los fotogramas descartados
+            while position < index:
+                if not capture.grab():
+                    return
+                position += 1
+            ok, img = capture.read()
+            if not ok:
+                return
+            position += 1
+            yield index, img
+    finally:
+        capture.release()
+
+
+def init_worker():
+    # Un análisis por proceso: los detectores van en serie dentro de cada uno
+    import image_analyzer
+    image_analyzer.PARALLEL_DETECTORS = False
+
+
+def process_segment(recording, start, end, step, change_distance=None):
+    """
+    Decodifica y analiza un segmento (se ejecuta en un proceso del pool)
+    Devuelve (registros, estadísticas)
+    """
+    from image_analyzer import analyze_frame
+
+    records = []
+    stats = {"sampled": 0, "analyzed": 0, "unchanged": 0}
+    last_print = None
+
+    for index, img in iter_sampled_frames(recording, start, end, step):
+        stats["sampled"] += 1
+
+        if change_distance is not None:
+            fp = fingerprint(img)
+            if last_print is not None and hamming(fp, last_print) <= change_distance:
+                stats["unchanged"] += 1
+                continue
+            last_print = fp
+
+        records.append({"frame": index, "analysis": analyze_frame(img)})
+        stats["analyzed"] += 1
+
+    return records, stats
+
+
+def ingest(recording, executor, every_seconds=DEFAULT_EVERY_SECONDS,
+           segment_seconds=DEFAULT_SEGMENT_SECONDS, change_distance=None,
+           max_in_flight=None, stats=None):
+    """
+    Genera en orden los análisis de una grabación
+    Como mucho max_in_flight segmentos pendientes a la vez
+    """
+    step, segments = plan_segments(recording, every_seconds, segment_seconds)
+    max_in_flight = max_in_flight or 2 * (os.cpu_count() or 1)
+    pending = deque()
+    segments = iter(segments)
+
+    def submit_next():
+        segment = next(segments, None)
+        if segment is not None:
+            pending.append(executor.submit(process_segment, recording, *segment, step, change_distance))
+
+    for _ in range(max_in_flight):
+        submit_next()
+
+    while pending:
+        records, segment_stats = pending.popleft().result()
+        submit_next()
+        if stats is not None:
+            for key, value in segment_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        for record in records:
+            record["t"] = round(record["frame"] / recording["fps"], 3)
+            yield record
+
+
+def signal_stream(sources, executor, start_time=None, stats=None, **options):
+    """
+    Mezcla por tiempo los análisis de una o varias grabaciones
+    sources: {timeframe: recording}. Con M1, M5 y M15 añade a cada registro
+    la señal combinada con el último análisis de cada timeframe
+    stats: dict opcional donde se acumulan los contadores de los segmentos
+    """
+    def tagged(timeframe, recording):
+        for record in ingest(recording, executor, stats=stats, **options):
+            yield record["t"], timeframe, record
+
+    streams = [tagged(timeframe, recording) for timeframe, recording in sources.items()]
+
+    latest = {}
+    for t, timeframe, record in heapq.merge(*streams, key=lambda item: (item[0], item[1])):
+        latest[timeframe] = record["analysis"]
+        out = {"t": t, "timeframe": timeframe, "frame": record["frame"], "analysis": record["analysis"]}
+        if start_time is not None:
+            out["timestamp"] = (start_time + timedelta(seconds=t)).isoformat(timespec="seconds")
+        if all(tf in latest for tf in TIMEFRAMES):
+            signal = combine_signal(*(latest[tf] for tf in TIMEFRAMES))
+            out["signal"] = {"signal": signal["signal"], "confidence": signal["confidence"]}
+        yield out
+
+
+def parse_sources(args, fps=None):
+    """"m5=ruta" o solo "ruta" (timeframe "default")"""
+    sources = {}
+    for arg in args:
+        timeframe, sep, path = arg.partition("=")
+        if not sep or os.path.exists(arg):
+            timeframe, path = "default", arg
+        sources[timeframe.strip().lower()] = open_recording(path, fps)
+    return sources
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analiza grabaciones de gráficos (vídeo o secuencias)")
+    parser.add_argument("sources", nargs="+", help="ruta o timeframe=ruta (vídeo, directorio o patrón %%05d)")
+    parser.add_argument("--every", type=float, default=DEFAULT_EVERY_SECONDS,
+                        help="Segundos de metraje entre fotogramas analizados")
+    parser.add_argument("--on-change", action="store_true",
+                        help="Analizar solo fotogramas que cambian respecto al anterior")
+    parser.add_argument("--change-distance", type=int, default=DEFAULT_CHANGE_DISTANCE)
+    parser.add_argument("--segment", type=float, default=DEFAULT_SEGMENT_SECONDS,
+                        help="Segundos de metraje por segmento")
+    parser.add_argument("--fps", type=float,
+                        help="FPS de secuencias de imágenes y vídeos que no lo indican")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-in-flight", type=int, help="Segmentos pendientes como máximo")
+    parser.add_argument("--start", help="Hora ISO del inicio de la grabación")
+    parser.add_argument("--out", help="Archivo JSON Lines (por defecto stdout)")
+    args = parser.parse_args()
+
+    sources = parse_sources(args.sources, args.fps)
+    start_time = datetime.fromisoformat(args.start) if args.start else None
+    # Metraje conocido de antemano; las fuentes sin frame_count cuentan hasta su último registro
+    footage = max((r["frame_count"] / r["fps"] for r in sources.values() if r["frame_count"]), default=0.0)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    started = time.perf_counter()
+    count = 0
+    stats = {}
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+            stream = signal_stream(
+                sources, executor, start_time=start_time, stats=stats,
+                every_seconds=args.every, segment_seconds=args.segment,
+                change_distance=args.change_distance if args.on_change else None,
+                max_in_flight=args.max_in_flight,
+            )
+            for record in stream:
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                count += 1
+                footage = max(footage, record["t"])
+    finally:
+        if args.out:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    realtime = f" ({elapsed / footage:.2%} del tiempo real)" if footage else ""
+    print(f"🎞️ {footage:.0f} s de metraje en {elapsed:.1f} s{realtime} · "
+          f"{stats.get('sampled', 0)} muestreados · {stats.get('analyzed', 0)} analizados · "
+          f"{stats.get('unchanged', 0)} sin cambios · {count} registros", file=sys.stderr)